@@ -0,0 +1,319 @@
+"""
+Benchmark
+Generates a reproducible corpus of synthetic review PDFs and DOCX files and
+times parsing and report generation on it, so changes to the parsers or the
+report writer can be compared before and after.
+
+    python benchmark.py                         # 10, 100 and 1000 students
+    python benchmark.py --sizes 10 100 --json before.json
+"""
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import fitz  # PyMuPDF
+from docx import Document
+
+from essay_processor import SECTION_NAMES, EssayProcessor, EssayReview, StudentFeedback, generate_reports
+
+
+WORDS = ("light pollution harms migrating birds and hides the stars from cities while wasting energy "
+         "the author argues that communities should dim streetlights evidence shows that nocturnal "
+         "animals rely on darkness yet many people assume bright streets are safer").split()
+SYLLABLES = ['Ka', 'Lo', 'Mi', 'Ne', 'Ru', 'So', 'Ta', 'Vi', 'Wen', 'Zo', 'Bel', 'Cor']
+
+PAGE_SIZE = fitz.paper_rect('letter')
+LINE_HEIGHT = 14
+LINES_PER_PAGE = 46
+WRAP = 80
+STAMP_NAME = "corpus.json"
+
+
+def student_names(count):
+    """Distinct, purely alphabetic surnames (filenames put the student before the first underscore)."""
+    names = (''.join(parts) for length in itertools.count(2)
+             for parts in itertools.product(SYLLABLES, repeat=length))
+    return [name.capitalize() for name in itertools.islice(names, count)]
+
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def wrap(text, width=WRAP):
+    """Break text into lines, hyphenating some words like justified PDF output does."""
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            if len(word) > 6 and width - len(line) > 4:
+                cut = width - len(line) - 2
+                line, word = f"{line} {word[:cut]}-", word[cut:]
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    return lines + [line] if line else lines
+
+
+def review_lines(student, title, rng, quotes, appendix_pages):
+    """The (text, font) lines of a review PDF: grading, three sections, then the Document Review appendix."""
+    lines = [(f"{student}_ {title}_review", 'helv'), ("Grading", 'hebo'), (f"{rng.randint(1, 6)}/6", 'helv')]
+    lines += [(line, 'helv') for line in wrap(' '.join(sentence(rng) for _ in range(3)))]
+
+    for name, points in zip(SECTION_NAMES, (4, 1, 1)):
+        lines += [(name, 'hebo'), (f"{rng.randint(0, points)}/{points}", 'helv')]
+        lines += [(line, 'helv') for line in wrap(sentence(rng, 20))]
+        for _ in range(quotes):
+            lines += [(line, 'heit') for line in wrap(f'"{sentence(rng, rng.randint(6, 24))}"')]
+            lines += [(line, 'helv') for line in wrap(sentence(rng, rng.randint(8, 30)))]
+
+    lines.append(("Document Review", 'hebo'))
+    lines += [(line, 'helv') for line in wrap(' '.join(sentence(rng) for _ in range(appendix_pages * 40)))]
+    return lines
+
+
+_fonts = {}
+
+
+def font(name):
+    """Base-14 fonts by PyMuPDF short name (helv, hebo, heit), loaded once."""
+    if name not in _fonts:
+        _fonts[name] = fitz.Font(name)
+    return _fonts[name]
+
+
+def make_review_pdf(path, student, title, rng, quotes=3, appendix_pages=5):
+    lines = review_lines(student, title, rng, quotes, appendix_pages)
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+
+    doc = fitz.open()
+    for number, page_lines in enumerate(pages, 1):
+        page = doc.new_page(width=PAGE_SIZE.width, height=PAGE_SIZE.height)
+        writer = fitz.TextWriter(page.rect)
+        writer.append((72, 40), f"Page {number} of {len(pages)}", font=font('helv'), fontsize=9)
+        for row, (text, fontname) in enumerate(page_lines):
+            writer.append((72, 72 + row * LINE_HEIGHT), text, font=font(fontname), fontsize=11)
+        writer.write_text(page)
+    doc.save(path)
+
+
+def make_review_docx(path, student, title, rng, paragraphs=5, appendix_paragraphs=40):
+    doc = Document()
+    doc.add_paragraph(f"{student}_ {title}_review")
+
+    rows = [['Category', 'Score', 'Comment']] + [
+        [name, str(rng.randint(0, 6)), sentence(rng, 10)] for name in ['Overall', *SECTION_NAMES]]
+    table = doc.add_table(rows=len(rows), cols=3)
+    for cells, row in zip(table.rows, rows):
+        for cell, text in zip(cells.cells, row):
+            cell.text = text
+
+    doc.add_paragraph("Content Review")
+    for _ in range(paragraphs):
+        doc.add_paragraph(' '.join(sentence(rng) for _ in range(rng.randint(3, 7))))
+    doc.add_paragraph("Grammar and Spelling Review")
+    for _ in range(appendix_paragraphs):
+        doc.add_paragraph(sentence(rng, 20))
+    doc.save(path)
+
+
+def generate_corpus(folder, students, quotes=3, appendix_pages=5, seed=0):
+    """
+    Write a matching review PDF and DOCX for each student into folder. The
+    same arguments always give the same files; an existing corpus with the
+    same settings and at least as many students is reused as is.
+    """
+    folder = Path(folder)
+    settings = {'quotes': quotes, 'appendix_pages': appendix_pages, 'seed': seed}
+    stamp = folder / STAMP_NAME
+    if stamp.exists():
+        existing = json.loads(stamp.read_text())
+        if existing.pop('students') >= students and existing == settings:
+            return folder
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for index, student in enumerate(student_names(students)):
+        rng = random.Random(f"{seed}:{index}")
+        title = f"Essay {index % 7 + 1}"
+        make_review_pdf(folder / f"{student}_ {title}_review.pdf", student, title, rng, quotes, appendix_pages)
+        make_review_docx(folder / f"{student}_ {title}_review.docx", student, title, rng)
+
+    stamp.write_text(json.dumps({'students': students, **settings}))
+    return folder
+
+
+def corpus_jobs(folder, students, output_folder, options):
+    """Jobs (see EssayProcessor.build_jobs) for the first `students` of a corpus."""
+    ep = EssayProcessor()
+    ep.load_folder(folder)
+    jobs, _ = ep.build_jobs(output_folder, options)
+    jobs.sort(key=lambda job: job['pdf_name'])
+    return jobs[:students]
+
+
+def time_stages(jobs, output_folder, options, workers=None):
+    """Seconds per stage for jobs, parsed and written one at a time, then the full parallel batch."""
+    ep = EssayProcessor()
+    layout = bool(options.get('layout'))
+    seconds = {}
+
+    start = time.perf_counter()
+    pdf_data = [ep.parse_pdf_feedback(job['pdf_path'], layout=layout) for job in jobs]
+    seconds['parse_pdf_feedback'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    docx_data = [ep.parse_docx_content(job['docx_path']) for job in jobs]
+    seconds['parse_docx_content'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for job, pdf, docx in zip(jobs, pdf_data, docx_data):
+        ep.create_report(job['student_name'], job['essay_title'], pdf, docx, job['output_path'],
+                         template=options.get('template'))
+    seconds['create_report'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    errors = [error for _, _, error in generate_reports(jobs, output_folder, workers=workers) if error]
+    seconds['batch'] = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f"{len(errors)} report(s) failed, e.g. {errors[0]}")
+    return seconds
+
+
+def peak_memory(jobs, options, sample=20):
+    """Peak traced memory in KB per stage for a single file (worst of the first `sample` jobs)."""
+    ep = EssayProcessor()
+    layout = bool(options.get('layout'))
+    peaks = {'parse_pdf_feedback': 0, 'parse_docx_content': 0, 'create_report': 0}
+
+    tracemalloc.start()
+    try:
+        for job in jobs[:sample]:
+            tracemalloc.reset_peak()
+            pdf = ep.parse_pdf_feedback(job['pdf_path'], layout=layout)
+            peaks['parse_pdf_feedback'] = max(peaks['parse_pdf_feedback'], tracemalloc.get_traced_memory()[1])
+
+            tracemalloc.reset_peak()
+            docx = ep.parse_docx_content(job['docx_path'])
+            peaks['parse_docx_content'] = max(peaks['parse_docx_content'], tracemalloc.get_traced_memory()[1])
+
+            tracemalloc.reset_peak()
+            ep.create_report(job['student_name'], job['essay_title'], pdf, docx, job['output_path'],
+                             template=options.get('template'))
+            peaks['create_report'] = max(peaks['create_report'], tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return {stage: peak // 1024 for stage, peak in peaks.items()}
+
+
+def representation_memory(jobs, options):
+    """
+    KB taken by every job's parsed results held at once, as records
+    (StudentFeedback/EssayReview) and as the nested dicts the parsers used to
+    return, plus the size of each as JSON. Both are loaded from JSON while
+    traced, so each count covers all of its containers and strings.
+    """
+    ep = EssayProcessor()
+    layout = bool(options.get('layout'))
+    parsed = [(ep.parse_pdf_feedback(job['pdf_path'], layout=layout), ep.parse_docx_content(job['docx_path']))
+              for job in jobs]
+    texts = {'records': json.dumps(parsed),
+             'dicts': json.dumps([(pdf.to_dict(), docx.to_dict()) for pdf, docx in parsed])}
+    del parsed
+    
+    loaders = {
+        'records': lambda data: [(StudentFeedback.from_json(pdf), EssayReview.from_json(docx)) for pdf, docx in data],
+        'dicts': lambda data: data,
+    }
+    memory = {}
+    for name, text in texts.items():
+        tracemalloc.start()
+        try:
+            held = loaders[name](json.loads(text))
+            memory[name] = tracemalloc.get_traced_memory()[0] // 1024
+        finally:
+            tracemalloc.stop()
+        del held
+    return {'parsed_kb': memory, 'json_kb': {name: len(text.encode()) // 1024 for name, text in texts.items()}}
+
+
+def run_benchmark(sizes, corpus, quotes=3, appendix_pages=5, seed=0, workers=None, options=None):
+    """Time every stage at each corpus size. Returns one result dict per size."""
+    options = dict(options or {})
+    generate_corpus(corpus, max(sizes), quotes, appendix_pages, seed)
+
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="essay_benchmark_") as output_folder:
+            jobs = corpus_jobs(corpus, size, output_folder, options)
+            seconds = time_stages(jobs, output_folder, options, workers)
+            memory = peak_memory(jobs, options)
+            representations = representation_memory(jobs, options)
+
+        results.append({
+            'students': size,
+            'seconds': {stage: round(value, 4) for stage, value in seconds.items()},
+            'files_per_second': {stage: round(size / value, 1) for stage, value in seconds.items() if value},
+            'peak_kb_per_file': memory,
+            **representations,
+        })
+    return results
+
+
+def print_results(results):
+    print(f"{'students':>8}  {'stage':<20}{'seconds':>10}{'ms/file':>10}{'files/s':>10}{'peak KB':>10}")
+    for result in results:
+        size = result['students']
+        for stage, seconds in result['seconds'].items():
+            peak = result['peak_kb_per_file'].get(stage, '')
+            print(f"{size:>8}  {stage:<20}{seconds:>10.3f}{seconds * 1000 / size:>10.2f}"
+                  f"{result['files_per_second'].get(stage, 0):>10.1f}{peak:>10}")
+    
+    print(f"\n{'students':>8}  {'parsed results':<20}{'KB held':>10}{'KB JSON':>10}")
+    for result in results:
+        for name in ('dicts', 'records'):
+            print(f"{result['students']:>8}  {name:<20}{result['parsed_kb'][name]:>10}{result['json_kb'][name]:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time parsing and report generation on a synthetic corpus.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help="Class sizes to time (default: 10 100 1000)")
+    parser.add_argument('--corpus', default=Path(tempfile.gettempdir()) / "essay_benchmark_corpus",
+                        help="Where to generate (and reuse) the synthetic corpus")
+    parser.add_argument('--quotes', type=int, default=3, help="Quotes per feedback section")
+    parser.add_argument('--appendix-pages', type=int, default=5,
+                        help="Pages of Document Review text after the feedback")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus random seed")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes for the batch stage")
+    parser.add_argument('--layout', action='store_true', help="Use layout-aware PDF parsing")
+    parser.add_argument('--template', help="Report template .docx")
+    parser.add_argument('--fast-writer', action='store_true', help="Use the fast writer in the batch stage")
+    parser.add_argument('--json', help="Also save the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {'layout': args.layout, 'template': args.template, 'fast_writer': args.fast_writer}
+
+    print(f"Generating corpus of {max(args.sizes)} students in {args.corpus}...")
+    results = run_benchmark(args.sizes, args.corpus, args.quotes, args.appendix_pages, args.seed,
+                            args.workers, options)
+    print_results(results)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({'options': options, 'results': results}, indent=2))
+        print(f"Saved results to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
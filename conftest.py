@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+from docx import Document
+
+from essay_processor import EssayReview, QuoteFeedback, RubricRow, Section, StudentFeedback
+
+PDF_DATA = StudentFeedback('4/6', 'Clear argument.', (
+    Section('Evidence and Commentary', '3/4', 'Relevant.', (
+        QuoteFeedback('"Birds lose their way."', 'Explain more & connect <this>.'),
+        QuoteFeedback('"Stars vanish."', ''))),
+    Section('Thesis', '1/1', 'Defensible.', (QuoteFeedback('"Light pollution\tharms."', 'Good.'),)),
+))
+DOCX_DATA = EssayReview(
+    (RubricRow('Thesis', '1', 'Defensible'), RubricRow('Overall', '4', 'Line one\nline two'),
+     RubricRow('Sophistication', '0', ''), RubricRow('Evidence and Commentary', '3', 'Relevant')),
+    ('First paragraph of the essay.', '  Indented second paragraph.'),
+)
+
+
+def _write_inputs(folder, student):
+    import fitz
+    pdf = fitz.open()
+    page = pdf.new_page()
+    for i, line in enumerate(["Grading", "4/6", "Clear argument.", "Thesis", "1/1", '"A quote."', "Good."]):
+        page.insert_text((72, 72 + 20 * i), line)
+    pdf.save(folder / f"{student}_ Essay_review.pdf")
+
+    doc = Document()
+    doc.add_table(rows=2, cols=3).cell(1, 0).text = 'Thesis'
+    doc.add_paragraph('Content Review')
+    doc.add_paragraph(f'Essay by {student}.')
+    doc.save(folder / f"{student}_ Essay_review.docx")
+
+
+def _describe_report(path):
+    doc = Document(path)
+    paragraphs = [(p.style.name, p.text, [r.italic for r in p.runs]) for p in doc.paragraphs]
+    tables = [[[(c.text, c.paragraphs[0].style.name, c.width) for c in row.cells] for row in table.rows]
+              for table in doc.tables]
+    return paragraphs, tables
+
+
+def _misbehaving_task(job):
+    """A worker task that hangs, crashes or raises depending on the job's pdf_name."""
+    if job['pdf_name'] == 'hang.pdf':
+        time.sleep(60)
+    if job['pdf_name'] == 'crash.pdf':
+        os._exit(3)
+    if job['pdf_name'] == 'raise.pdf':
+        raise ValueError('bad xref')
+    return {'status': 'written', 'output_name': job['pdf_name']}
+
+
+@pytest.fixture
+def pdf_data():
+    """Parsed feedback PDF with two sections, including quotes with XML special characters and tabs."""
+    return PDF_DATA
+
+
+@pytest.fixture
+def docx_data():
+    """Parsed DOCX with rubric rows out of report order and a multi-line cell."""
+    return DOCX_DATA
+
+
+@pytest.fixture
+def write_inputs():
+    """write_inputs(folder, student) saves a minimal review PDF and DOCX pair for the student."""
+    return _write_inputs
+
+
+@pytest.fixture
+def describe_report():
+    """describe_report(path) summarizes a report's paragraphs and tables for comparing writers."""
+    return _describe_report
+
+
+@pytest.fixture
+def misbehaving_task():
+    """A picklable worker task: hang.pdf hangs, crash.pdf kills its process, raise.pdf raises."""
+    return _misbehaving_task
@@ -3,592 +3,4333 @@ Essay Processor
 Combines PDF feedback and DOCX grading data into formatted reports.
 """
 
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+import argparse
+import base64
+import bisect
+import contextlib
+import copy
+import csv
+import functools
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import multiprocessing
+import multiprocessing.connection
 import os
+import posixpath
+import queue
 import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import tracemalloc
+import zipfile
+from collections import OrderedDict, defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from pathlib import Path
+from typing import NamedTuple
 
-# PDF and DOCX handling
-import fitz  # PyMuPDF
-from docx import Document
-from docx.shared import Pt, Inches, Twips
+# Heavy dependencies are imported where they are first used, so each entry
+# point only loads what it needs: parsing loads lxml (DOCX) and PyMuPDF
+# (PDF), building reports loads python-docx, and only the window loads Tk
+# (see load_tk). test_startup.py keeps `import essay_processor` cheap.
+tk = ttk = filedialog = messagebox = None
+
+
+def load_tk():
+    """Import Tk into the module namespace for the window; batch, watch and scripting never call this."""
+    global tk, ttk, filedialog, messagebox
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+
+
+# Bump whenever parse_pdf_feedback/parse_docx_content output changes, so
+# cached results from older parsers are ignored
+PARSER_VERSION = 2
+
+# Bump whenever create_report's layout changes, so incremental runs rebuild
+# every report
+REPORT_FORMAT_VERSION = 2
+
+MANIFEST_NAME = ".report_manifest.json"
+
+# Everything after these headings (grammar review, AI scan, ...) is ignored
+PDF_STOP_RE = re.compile(r'Document Review|Spelling and Grammar', re.IGNORECASE)
+
+DEFAULT_CACHE_DIR = Path.home() / ".essay_processor" / "cache"
+DEFAULT_CACHE_SIZE = 200 * 1024 * 1024
+DEFAULT_RESULTS_DB = Path.home() / ".essay_processor" / "results.sqlite3"
+
+
+class ArchiveMember(namedtuple('ArchiveMember', ['archive', 'name'])):
+    """An input file inside a .zip archive, read straight from the archive."""
+    
+    def __str__(self):
+        return f"{self.archive}/{self.name}"
+
+
+def read_input(source):
+    """Bytes of an input file: a path, an ArchiveMember, a binary file object or the bytes themselves."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, ArchiveMember):
+        with zipfile.ZipFile(source.archive) as archive:
+            return archive.read(source.name)
+    if hasattr(source, 'read'):
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def file_hash(source):
+    """SHA-256 of a file's contents (any input read_input accepts)."""
+    if not isinstance(source, (str, os.PathLike)):
+        return hashlib.sha256(read_input(source)).hexdigest()
+    
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_pdf(source):
+    """Open a PDF from a path, or from anything else read_input accepts without extracting it to disk."""
+    import fitz  # PyMuPDF
+    
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    return fitz.open(stream=read_input(source), filetype='pdf')
+
+
+def input_source(path):
+    """Job form of an input: a path string, or the ArchiveMember itself."""
+    return path if isinstance(path, ArchiveMember) else str(path)
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed PDF/DOCX results, one JSON file per entry, keyed
+    by file content hash and parser version. Reads refresh an entry's mtime so
+    prune() can evict least-recently-used entries once the cache is too big.
+    Safe to share between worker processes: entries are written atomically.
+    """
+    
+    def __init__(self, folder=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+    
+    def _entry(self, kind, content_hash):
+        key = hashlib.sha256(f"{kind}:{PARSER_VERSION}:{content_hash}".encode()).hexdigest()
+        return self.folder / f"{key}.json"
+    
+    def get(self, kind, content_hash, record=None):
+        """The cached result, rebuilt with record.from_json if given, or None."""
+        entry = self._entry(kind, content_hash)
+        try:
+            with open(entry, encoding='utf-8') as f:
+                data = json.load(f)
+            data = record.from_json(data) if record else data
+            os.utime(entry)
+            return data
+        except (OSError, ValueError, TypeError):
+            return None
+    
+    def put(self, kind, content_hash, data):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        entry = self._entry(kind, content_hash)
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, entry)
+    
+    def parse(self, kind, path, parser, content_hash=None, record=None):
+        """
+        Return parser(path), reusing the cached result when the file is
+        unchanged. path may be anything file_hash accepts; record is the
+        record type parser returns (see StudentFeedback), if any.
+        """
+        content_hash = content_hash or file_hash(path)
+        data = self.get(kind, content_hash, record)
+        if data is None:
+            data = parser(path)
+            self.put(kind, content_hash, data)
+        return data
+    
+    def prune(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        try:
+            entries = [(e.stat().st_mtime, e.stat().st_size, e) for e in self.folder.glob('*.json')]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+                total -= size
+            except OSError:
+                pass
+    
+    def clear(self):
+        """Delete every cached entry. Returns the number removed."""
+        removed = 0
+        for entry in itertools.chain(self.folder.glob('*.json'), self.folder.glob('*.tmp')):
+            try:
+                entry.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+TIMING_REPORT_NAME = "timing_report"
+PROFILE_NAME = "batch_profile"
+TIMED_STAGES = ['extract_pdf_text', 'parse_pdf_feedback', 'parse_docx_content', 'create_report', 'save']
+
+
+class StageTimer:
+    """
+    Wall time and peak traced memory per named stage, for one file. Stages
+    may nest (parse_pdf_feedback includes extract_pdf_text) and repeat
+    (extraction is timed line by line); repeats add up. Memory comes from
+    tracemalloc, which must be started by the caller, and is the peak above
+    what was allocated when the stage began. on_stage, if given, is called
+    with a stage's name as it starts, and with the enclosing stage's name
+    when a nested one ends.
+    """
+    
+    def __init__(self, on_stage=None):
+        self.seconds = defaultdict(float)
+        self.peak_bytes = defaultdict(int)
+        self.on_stage = on_stage
+        self._open = []     # [name, start time, memory at start, peak so far]
+    
+    def _fold_peak(self):
+        if tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            for stage in self._open:
+                stage[3] = max(stage[3], peak)
+            tracemalloc.reset_peak()
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._fold_peak()
+        current = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        self._open.append([name, time.perf_counter(), current, current])
+        if self.on_stage:
+            self.on_stage(name)
+        try:
+            yield
+        finally:
+            self._fold_peak()
+            name, start, base, peak = self._open.pop()
+            self.seconds[name] += time.perf_counter() - start
+            self.peak_bytes[name] = max(self.peak_bytes[name], peak - base)
+            if self.on_stage and self._open:
+                self.on_stage(self._open[-1][0])
+    
+    def iterate(self, name, iterable):
+        """Yield from iterable, counting only the time spent producing items."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+    
+    def summary(self):
+        return {name: {'seconds': round(self.seconds[name], 6), 'peak_kb': self.peak_bytes[name] // 1024}
+                for name in self.seconds}
+
+
+# In an isolated worker (see run_isolated), a shared buffer the current
+# job's stage is published to, so the batch can tell where a job that
+# timed out or crashed the worker was
+_stage_slot = None
+
+
+def _publish_stage(name):
+    _stage_slot.value = name.encode()
+
+
+@contextlib.contextmanager
+def job_timer(options):
+    """
+    Context for one job, giving its StageTimer, or None if nothing needs it:
+    the timing option or running in an isolated worker. With the timing
+    option, tracemalloc runs for the job's duration unless it was already on.
+    """
+    on_stage = _publish_stage if _stage_slot is not None else None
+    if not options.get('timing'):
+        yield StageTimer(on_stage) if on_stage else None
+        return
+    
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        yield StageTimer(on_stage)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def timed_stage(name):
+    """Time an EssayProcessor method as a stage when the processor has a timer."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.timer is None:
+                return method(self, *args, **kwargs)
+            with self.timer.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_timing_report(records, output_folder, slowest=10):
+    """
+    Write timing_report.json and timing_report.csv into the output folder.
+    records are per-file dicts: pdf_name, status, error, seconds and the
+    StageTimer summary under 'stages'. The JSON also has per-stage totals
+    and the slowest files; the CSV has one row per file.
+    Returns the JSON path.
+    """
+    output_folder = Path(output_folder)
+    records = sorted(records, key=lambda record: record['seconds'], reverse=True)
+    
+    totals = {}
+    for stage in TIMED_STAGES:
+        timed = [record['stages'][stage] for record in records if stage in record['stages']]
+        if timed:
+            totals[stage] = {'files': len(timed),
+                             'seconds': round(sum(t['seconds'] for t in timed), 6),
+                             'max_peak_kb': max(t['peak_kb'] for t in timed)}
+    
+    report = {
+        'files': len(records),
+        'errors': sum(1 for record in records if record['error']),
+        'seconds': round(sum(record['seconds'] for record in records), 6),
+        'stages': totals,
+        'slowest': [{'pdf_name': record['pdf_name'], 'seconds': record['seconds']} for record in records[:slowest]],
+        'per_file': records,
+    }
+    json_path = output_folder / f"{TIMING_REPORT_NAME}.json"
+    json_path.write_text(json.dumps(report, indent=2), encoding='utf-8')
+    
+    with open(output_folder / f"{TIMING_REPORT_NAME}.csv", 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['pdf_name', 'status', 'error', 'seconds']
+                        + [f"{stage}_{field}" for stage in TIMED_STAGES for field in ('seconds', 'peak_kb')])
+        for record in records:
+            stages = record['stages']
+            writer.writerow([record['pdf_name'], record['status'], record['error'] or '', record['seconds']]
+                            + [stages.get(stage, {}).get(field, '') for stage in TIMED_STAGES
+                               for field in ('seconds', 'peak_kb')])
+    
+    return json_path
+
+
+ERROR_LOG_NAME = "error_log.json"
+
+
+class JobFailure(str):
+    """
+    The error run_batch yields for a failed job: its message ("<pdf name>:
+    what went wrong"), so it prints and joins like any string, plus what the
+    error log records: kind ('error', 'timeout', 'memory' or 'crashed'),
+    the stage the job was in, how long it ran and the traceback.
+    """
+    
+    def __new__(cls, message, kind='error', stage=None, seconds=None, details=''):
+        failure = super().__new__(cls, message)
+        failure.kind = kind
+        failure.stage = stage
+        failure.seconds = seconds
+        failure.details = details
+        return failure
+
+
+def job_failure(job, error, stage=None, seconds=None):
+    """JobFailure for a job whose task raised error."""
+    return JobFailure(f"{job['pdf_name']}: {str(error)}", 'error', stage,
+                      None if seconds is None else round(seconds, 3), ''.join(traceback.format_exception(error)))
+
+
+def write_error_log(failures, output_folder):
+    """
+    Write error_log.json into the output folder, one record per failed job
+    from (job, error) pairs, which `batch --retry-failures` reads back.
+    Without failures a previous log is removed instead, since those reports
+    now exist. Returns the log's path, or None.
+    """
+    path = Path(output_folder) / ERROR_LOG_NAME
+    if not failures:
+        path.unlink(missing_ok=True)
+        return None
+    
+    records = [{
+        'pdf_name': job['pdf_name'],
+        'student_name': job['student_name'],
+        'essay_title': job['essay_title'],
+        'output_name': job['output_name'],
+        'kind': getattr(error, 'kind', 'error'),
+        'stage': getattr(error, 'stage', None),
+        'seconds': getattr(error, 'seconds', None),
+        'error': str(error),
+        'traceback': getattr(error, 'details', ''),
+    } for job, error in failures]
+    path.write_text(json.dumps({'failed': len(records), 'failures': records}, indent=2), encoding='utf-8')
+    return path
+
+
+def read_error_log(output_folder):
+    """The failure records of an output folder's error log (empty if it has none)."""
+    path = Path(output_folder) / ERROR_LOG_NAME
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding='utf-8'))['failures']
+
+
+def report_format_key(options=None):
+    """Identifies everything besides the inputs that shapes a report's layout."""
+    options = options or {}
+    key = str(REPORT_FORMAT_VERSION)
+    if options.get('layout'):
+        key += "+layout"
+    if options.get('template'):
+        key += "+template:" + file_hash(options['template'])
+    return key
+
+
+class ReportManifest:
+    """
+    Records, per generated report in an output folder, the hashes of the
+    inputs and the report format it was built from. Lets incremental runs
+    skip reports that are still current and remove ones whose inputs are gone.
+    """
+    
+    def __init__(self, folder):
+        self.path = Path(folder) / MANIFEST_NAME
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.reports = json.load(f).get('reports', {})
+        except (OSError, ValueError):
+            self.reports = {}
+    
+    @staticmethod
+    def _entry(job):
+        return {
+            'student_name': job['student_name'],
+            'essay_title': job['essay_title'],
+            'pdf_hash': job['pdf_hash'],
+            'docx_hash': job['docx_hash'],
+            'format': report_format_key(job.get('options')),
+        }
+    
+    def is_current(self, job):
+        entry = dict(self.reports.get(job['output_name'], {}))
+        # A report built before the similarity check was asked for is rebuilt to get its signature
+        if entry.pop('essay_signature', None) is None and job.get('options', {}).get('similarity') is not None:
+            return False
+        return entry == self._entry(job) and os.path.exists(job['output_path'])
+    
+    def record(self, job, signature=None):
+        """Record a report just built; signature is its essay_signature, if computed."""
+        entry = self._entry(job)
+        if signature is not None:
+            entry['essay_signature'] = base64.b64encode(signature).decode('ascii')
+        self.reports[job['output_name']] = entry
+    
+    def essay_signatures(self):
+        """(info, signature) for every report with an essay signature, as find_similar_essays takes them."""
+        return [({'output_name': name, 'student_name': entry['student_name'], 'essay_title': entry['essay_title']},
+                 base64.b64decode(entry['essay_signature']))
+                for name, entry in sorted(self.reports.items()) if entry.get('essay_signature')]
+    
+    def remove_orphans(self, jobs):
+        """Delete reports this manifest created that no job produces any more. Returns their names."""
+        wanted = {job['output_name'] for job in jobs}
+        return self.remove([name for name in self.reports if name not in wanted])
+    
+    def remove(self, names):
+        """Delete the named reports, where this manifest created them. Returns the names deleted."""
+        removed = [name for name in names if name in self.reports]
+        for name in removed:
+            try:
+                os.remove(self.path.parent / name)
+            except FileNotFoundError:
+                pass
+            del self.reports[name]
+        return removed
+    
+    def save(self):
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'reports': self.reports}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def grade_summary(pdf_data, docx_data):
+    """
+    What the results store keeps of a student's parsed files: the overall
+    grade, each section's grade and quote count, and the rubric rows.
+    Small and picklable, so workers return it alongside their result.
+    """
+    return {
+        'overall_grade': pdf_data.overall_grade,
+        'sections': [(section.name, section.grade, len(section.quotes)) for section in pdf_data.sections],
+        'rubric': [tuple(row) for row in docx_data.rubric],
+    }
+
+
+def grade_points(grade):
+    """(points, out_of) of a grade like '4/6', or (None, None) if it isn't one."""
+    if not GRADE_RE.match(grade or ''):
+        return None, None
+    points, out_of = grade.split('/')
+    return float(points), float(out_of)
+
+
+def default_class_name(job):
+    """A job's class for the results store: its class_name option, else the name of its PDF folder or .zip."""
+    class_name = job.get('options', {}).get('class_name')
+    if class_name:
+        return class_name
+    path = job['pdf_path']
+    if isinstance(path, ArchiveMember):
+        return Path(path.archive).stem
+    return Path(path).parent.name
+
+
+RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    class_name TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    student TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    points REAL,
+    out_of REAL,
+    quotes INTEGER NOT NULL,
+    report_path TEXT,
+    pdf_hash TEXT,
+    docx_hash TEXT,
+    updated TEXT NOT NULL,
+    UNIQUE (class_name, assignment, student)
+);
+CREATE INDEX IF NOT EXISTS results_by_assignment ON results (assignment, points);
+CREATE TABLE IF NOT EXISTS section_grades (
+    result_id INTEGER NOT NULL REFERENCES results (id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    grade TEXT NOT NULL,
+    points REAL,
+    out_of REAL,
+    quotes INTEGER NOT NULL,
+    PRIMARY KEY (result_id, section)
+);
+CREATE INDEX IF NOT EXISTS section_grades_by_section ON section_grades (section, points);
+CREATE TABLE IF NOT EXISTS rubric_rows (
+    result_id INTEGER NOT NULL REFERENCES results (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    score TEXT NOT NULL,
+    comment TEXT NOT NULL,
+    PRIMARY KEY (result_id, position)
+);
+"""
+
+
+class ResultsStore:
+    """
+    SQLite database of every report's grades (see grade_summary), one row per
+    class, assignment (essay title) and student, so class and assignment
+    statistics come from indexed SQL queries instead of re-parsing files.
+    Generating a report again replaces that student's row. Changes are
+    committed by close(), so a whole batch is one transaction; a store used
+    from several threads (threads=True; callers serialize access) should
+    commit() after each report instead.
+    """
+    
+    def __init__(self, path=DEFAULT_RESULTS_DB, threads=False):
+        import sqlite3
+        
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=not threads)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(RESULTS_SCHEMA)
+    
+    @classmethod
+    def for_jobs(cls, jobs):
+        """The store named by the jobs' results_db option, or None when results aren't recorded."""
+        path = jobs[0].get('options', {}).get('results_db') if jobs else None
+        return cls(path) if path else None
+    
+    def record(self, job, grades, report_path=None):
+        """Insert or replace a student's grades for the job's class and assignment."""
+        points, out_of = grade_points(grades['overall_grade'])
+        key = (default_class_name(job), job['essay_title'], job['student_name'])
+        self.db.execute(
+            """INSERT INTO results (class_name, assignment, student, grade, points, out_of, quotes,
+                                    report_path, pdf_hash, docx_hash, updated)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (class_name, assignment, student) DO UPDATE SET
+                   grade = excluded.grade, points = excluded.points, out_of = excluded.out_of,
+                   quotes = excluded.quotes, report_path = excluded.report_path, pdf_hash = excluded.pdf_hash,
+                   docx_hash = excluded.docx_hash, updated = excluded.updated""",
+            (*key, grades['overall_grade'], points, out_of, sum(count for _, _, count in grades['sections']),
+             str(report_path or job['output_path']), job.get('pdf_hash'), job.get('docx_hash'),
+             datetime.now().isoformat(timespec='seconds')))
+        result_id = self.db.execute(
+            'SELECT id FROM results WHERE class_name = ? AND assignment = ? AND student = ?', key).fetchone()[0]
+        
+        self.db.execute('DELETE FROM section_grades WHERE result_id = ?', (result_id,))
+        self.db.executemany('INSERT INTO section_grades VALUES (?, ?, ?, ?, ?, ?)', [
+            (result_id, name, grade, *grade_points(grade), count) for name, grade, count in grades['sections']])
+        self.db.execute('DELETE FROM rubric_rows WHERE result_id = ?', (result_id,))
+        self.db.executemany('INSERT INTO rubric_rows VALUES (?, ?, ?, ?, ?)', [
+            (result_id, position, *row) for position, row in enumerate(grades['rubric'])])
+    
+    def commit(self):
+        self.db.commit()
+    
+    def close(self):
+        self.db.commit()
+        self.db.close()
+    
+    @staticmethod
+    def _where(params, class_name=None, assignment=None):
+        """WHERE clause limiting results r to a class and/or assignment; appends to params."""
+        filters = []
+        for column, value in (('r.class_name', class_name), ('r.assignment', assignment)):
+            if value is not None:
+                filters.append(f'{column} = ?')
+                params.append(value)
+        return f"WHERE {' AND '.join(filters)}" if filters else ''
+    
+    def _grouped(self, select, group_by, section=None, class_name=None, assignment=None):
+        """
+        Run SELECT select, grouped by class, assignment and group_by. {g} in
+        either stands for the table whose grade columns (grade, points,
+        out_of) to use: the overall grade, or that section's grade.
+        """
+        params = []
+        source = 'results r'
+        if section:
+            source += ' JOIN section_grades g ON g.result_id = r.id AND g.section = ?'
+            params.append(section)
+        table = 'g' if section else 'r'
+        columns = select.format(g=table)
+        group = ', '.join(['r.class_name', 'r.assignment', *group_by]).format(g=table)
+        sql = (f"SELECT r.class_name, r.assignment, {columns} FROM {source} "
+               f"{self._where(params, class_name, assignment)} GROUP BY {group} ORDER BY {group}")
+        return [dict(row) for row in self.db.execute(sql, params)]
+    
+    def statistics(self, section=None, class_name=None, assignment=None):
+        """Per class and assignment: students and the mean/min/max points of the overall or a section grade."""
+        return self._grouped('COUNT(*) AS students, AVG({g}.points) AS mean, MIN({g}.points) AS min, '
+                             'MAX({g}.points) AS max, MAX({g}.out_of) AS out_of', [], section, class_name, assignment)
+    
+    def distribution(self, section=None, class_name=None, assignment=None):
+        """Per class and assignment, how many students got each overall (or section) grade, lowest first."""
+        return self._grouped('{g}.points AS points, {g}.grade AS grade, COUNT(*) AS students',
+                             ['{g}.points', '{g}.grade'], section, class_name, assignment)
+    
+    def students(self, class_name=None, assignment=None):
+        """Every student's overall grade and section grades, one dict per student with a key per section."""
+        params = list(SECTION_NAMES)
+        sections = ', '.join(f'MAX(CASE WHEN g.section = ? THEN g.grade END) AS "{name}"' for name in SECTION_NAMES)
+        sql = (f"SELECT r.class_name, r.assignment, r.student, r.grade, {sections} FROM results r "
+               f"LEFT JOIN section_grades g ON g.result_id = r.id {self._where(params, class_name, assignment)} "
+               f"GROUP BY r.id ORDER BY r.class_name, r.assignment, r.student")
+        return [dict(row) for row in self.db.execute(sql, params)]
+
+
+SIMILARITY_REPORT_NAME = "similar_essays"
+DEFAULT_SIMILARITY_THRESHOLD = 0.5
+SHINGLE_WORDS = 5           # words per shingle
+SIGNATURE_SIZE = 128        # MinHash values per essay
+_SIGNATURE_FORMAT = f'<{SIGNATURE_SIZE}I'
+WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def essay_shingles(paragraphs):
+    """
+    Hashes of every run of SHINGLE_WORDS words within each paragraph (a
+    shorter paragraph is one shingle). Words are lower-cased and stripped of
+    punctuation, so retyping or reformatting a passage doesn't hide it, and
+    the hashes are the same in every process.
+    """
+    hashes = set()
+    for paragraph in paragraphs:
+        words = WORD_RE.findall(paragraph.lower())
+        for start in range(max(len(words) - SHINGLE_WORDS, 0) + 1 if words else 0):
+            shingle = ' '.join(words[start:start + SHINGLE_WORDS]).encode()
+            hashes.add(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'little'))
+    return hashes
+
+
+def essay_signature(paragraphs):
+    """
+    MinHash signature of an essay's shingles, by one-permutation hashing:
+    each shingle hash goes into one of SIGNATURE_SIZE bins by its high bits
+    and each bin keeps the smallest low bits (an empty bin borrows the next
+    full bin's value, salted by the distance). The share of equal values in
+    two signatures estimates the Jaccard similarity of the two essays'
+    shingles. Returned packed (512 bytes) to keep worker results and the
+    manifest small; b'' for an essay without words.
+    """
+    bins = [None] * SIGNATURE_SIZE
+    for shingle in essay_shingles(paragraphs):
+        index, value = (shingle >> 32) % SIGNATURE_SIZE, shingle & 0xFFFFFFFF
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    
+    full = [index for index, value in enumerate(bins) if value is not None]
+    if not full:
+        return b''
+    signature = []
+    for index, value in enumerate(bins):
+        if value is None:
+            source = full[bisect.bisect(full, index) % len(full)]
+            value = (bins[source] + ((source - index) % SIGNATURE_SIZE) * 0x9E3779B1) & 0xFFFFFFFF
+        signature.append(value)
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def lsh_rows(threshold, size=SIGNATURE_SIZE):
+    """
+    Signature values per LSH band: the most (so the fewest chance
+    candidates) for which essays a little less similar than threshold are
+    still likely to share a band, i.e. (1 / bands) ** (1 / rows) stays
+    below 85% of threshold.
+    """
+    rows = 1
+    for candidate in range(1, size + 1):
+        if (1 / (size // candidate)) ** (1 / candidate) <= threshold * 0.85:
+            rows = candidate
+    return rows
+
+
+def find_similar_essays(essays, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """
+    Pairs of essays with an estimated similarity of at least threshold, as
+    (similarity, info_a, info_b), most similar first. essays are (info,
+    signature) pairs, info being a dict with at least 'output_name'.
+    Rather than comparing every pair, signatures are cut into bands and
+    indexed by each band's values (LSH); only essays sharing a band are
+    compared, so the work grows with the class size, not its square.
+    """
+    essays = sorted(((info, struct.unpack(_SIGNATURE_FORMAT, signature)) for info, signature in essays
+                     if signature), key=lambda essay: essay[0]['output_name'])
+    rows = lsh_rows(threshold)
+    
+    candidates = set()
+    for band in range(0, SIGNATURE_SIZE // rows * rows, rows):
+        buckets = defaultdict(list)
+        for number, (_, values) in enumerate(essays):
+            buckets[values[band:band + rows]].append(number)
+        for bucket in buckets.values():
+            candidates.update(itertools.combinations(bucket, 2))
+    
+    pairs = []
+    for a, b in candidates:
+        similarity = sum(x == y for x, y in zip(essays[a][1], essays[b][1])) / SIGNATURE_SIZE
+        if similarity >= threshold:
+            pairs.append((similarity, essays[a][0], essays[b][0]))
+    pairs.sort(key=lambda pair: (-pair[0], pair[1]['output_name'], pair[2]['output_name']))
+    return pairs
+
+
+def write_similarity_report(pairs, output_folder, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """
+    Write similar_essays.csv (one row per flagged pair, most similar first)
+    and similar_essays.json into the output folder. Returns the CSV path.
+    """
+    output_folder = Path(output_folder)
+    records = [{'similarity': round(similarity, 2), 'a': a, 'b': b} for similarity, a, b in pairs]
+    (output_folder / f"{SIMILARITY_REPORT_NAME}.json").write_text(
+        json.dumps({'threshold': threshold, 'pairs': records}, indent=2), encoding='utf-8')
+    
+    csv_path = output_folder / f"{SIMILARITY_REPORT_NAME}.csv"
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['similarity', 'student_a', 'essay_a', 'report_a', 'student_b', 'essay_b', 'report_b'])
+        for record in records:
+            writer.writerow([record['similarity']]
+                            + [record[side][key] for side in 'ab'
+                               for key in ('student_name', 'essay_title', 'output_name')])
+    return csv_path
+
+
+def flag_similar_essays(output_folder, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    """
+    Compare every essay with a signature in the folder's report manifest
+    (so reports kept from earlier runs count too) and write the similarity
+    report. Returns (pairs, CSV path).
+    """
+    pairs = find_similar_essays(ReportManifest(output_folder).essay_signatures(), threshold)
+    return pairs, write_similarity_report(pairs, output_folder, threshold)
+
+
+# Paragraph styles every report template must define
+STYLE_HEADING = 'Report Heading'
+STYLE_TABLE_HEADING = 'Report Table Heading'
+STYLE_SECTION_HEADING = 'Report Section Heading'
+STYLE_QUOTE = 'Report Quote'
+STYLE_FIRST_QUOTE = 'Report First Quote'
+STYLE_FEEDBACK = 'Report Feedback'
+STYLE_TABLE_TEXT = 'Report Table Text'
+STYLE_TABLE_TEXT_LAST = 'Report Table Text Last'
+REPORT_STYLES = [STYLE_HEADING, STYLE_TABLE_HEADING, STYLE_SECTION_HEADING, STYLE_QUOTE,
+                 STYLE_FIRST_QUOTE, STYLE_FEEDBACK, STYLE_TABLE_TEXT, STYLE_TABLE_TEXT_LAST]
+
+# Loaded templates by path (None = built-in), kept for the life of the process
+_report_templates = {}
+
+
+def build_default_template():
+    """
+    The built-in report template: Calibri 12pt body, 14pt bold headings,
+    italic quotes, indented feedback and 10pt table text, plus a one-row
+    rubric table whose row is cloned for every table row of a report.
+    Save it with `python essay_processor.py write-template` to edit in Word.
+    """
+    from docx import Document
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml import OxmlElement
+    from docx.shared import Inches, Pt
+    
+    doc = Document()
+    styles = doc.styles
+    
+    normal = styles['Normal']
+    normal.font.name = 'Calibri'
+    normal.font.size = Pt(12)
+    
+    def add_style(name, base):
+        style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = base
+        style.quick_style = True
+        return style
+    
+    heading = add_style(STYLE_HEADING, normal)
+    heading.font.size = Pt(14)
+    heading.font.bold = True
+    
+    table_heading = add_style(STYLE_TABLE_HEADING, heading)
+    table_heading.paragraph_format.keep_with_next = True
+    table_heading.paragraph_format.keep_together = True
+    
+    section_heading = add_style(STYLE_SECTION_HEADING, heading)
+    section_heading.paragraph_format.space_before = Pt(12)
+    section_heading.paragraph_format.space_after = Pt(0)
+    
+    quote = add_style(STYLE_QUOTE, normal)
+    quote.font.italic = True
+    quote.paragraph_format.space_before = Pt(12)
+    quote.paragraph_format.space_after = Pt(0)
+    
+    first_quote = add_style(STYLE_FIRST_QUOTE, quote)
+    first_quote.paragraph_format.space_before = Pt(6)
+    
+    feedback = add_style(STYLE_FEEDBACK, normal)
+    feedback.paragraph_format.left_indent = Inches(0.5)
+    feedback.paragraph_format.space_before = Pt(2)
+    feedback.paragraph_format.space_after = Pt(0)
+    
+    table_text = add_style(STYLE_TABLE_TEXT, normal)
+    table_text.font.size = Pt(10)
+    table_text.paragraph_format.keep_together = True
+    table_text.paragraph_format.keep_with_next = True
+    
+    table_text_last = add_style(STYLE_TABLE_TEXT_LAST, table_text)
+    table_text_last.paragraph_format.keep_with_next = False
+    
+    # Rubric table prototype. Total page width ~6.5 inches (8.5 - 1" margins
+    # each side): first two columns narrow (1.2 inches each), third 4.1 inches
+    table = doc.add_table(rows=1, cols=3)
+    table.style = 'Table Grid'
+    table.autofit = False
+    
+    row = table.rows[0]
+    # Keep row together (prevents row from splitting across pages)
+    row._tr.get_or_add_trPr().append(OxmlElement('w:cantSplit'))
+    for cell, width in zip(row.cells, [Inches(1.2), Inches(1.2), Inches(4.1)]):
+        cell.width = width
+        cell.paragraphs[0].style = table_text
+    
+    _slim_template(doc)
+    return doc
+
+
+def _slim_template(doc):
+    """
+    Drop what python-docx's stock template carries but reports never use: the
+    stylesWithEffects copy, unused style definitions, custom XML and the
+    thumbnail. Every report is opened from and saved with its template, so
+    this makes each one faster to build and much smaller on disk.
+    """
+    from docx.oxml.ns import qn
+    
+    for rId, rel in list(doc.part.rels.items()):
+        if rel.reltype.endswith(('/stylesWithEffects', '/customXml')):
+            doc.part.drop_rel(rId)
+    
+    package_rels = doc.part.package.rels
+    for rId, rel in list(package_rels.items()):
+        if rel.reltype.endswith('/thumbnail'):
+            package_rels.pop(rId)
+    
+    styles = doc.styles.element
+    by_id = {style.get(qn('w:styleId')): style for style in styles.findall(qn('w:style'))}
+    wanted = [doc.styles[name].style_id for name in (*REPORT_STYLES, 'Table Grid')]
+    wanted += [style_id for style_id, style in by_id.items() if style.get(qn('w:default')) == '1']
+    
+    # Keep the styles these are based on or linked to
+    keep = set()
+    while wanted:
+        style_id = wanted.pop()
+        if style_id in keep or style_id not in by_id:
+            continue
+        keep.add(style_id)
+        for ref in ('w:basedOn', 'w:link', 'w:next'):
+            element = by_id[style_id].find(qn(ref))
+            if element is not None:
+                wanted.append(element.get(qn('w:val')))
+    
+    for style_id, style in by_id.items():
+        if style_id not in keep:
+            styles.remove(style)
+
+
+def load_report_template(path=None):
+    """
+    Return (template_bytes, table_prototype, style_ids) for a report
+    template, loading it only once per process. template_bytes is the
+    template with an empty body, ready to be opened per report;
+    table_prototype is the template's first table (the rubric table) whose
+    last row is the row to clone; style_ids maps REPORT_STYLES names to the
+    template's style ids. Templates without a table use the built-in one.
+    """
+    key = str(path) if path else None
+    if key in _report_templates:
+        return _report_templates[key]
+    
+    from docx import Document
+    
+    doc = Document(path) if path else build_default_template()
+    
+    missing = [name for name in REPORT_STYLES if name not in doc.styles]
+    if missing:
+        raise ValueError(f"Report template {path} is missing styles: {', '.join(missing)}")
+    style_ids = {name: doc.styles[name].style_id for name in REPORT_STYLES}
+    
+    body = doc.element.body
+    if body.tbl_lst:
+        table_prototype = copy.deepcopy(body.tbl_lst[0])
+    else:
+        table_prototype = load_report_template()[1]
+    body.clear_content()
+    
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    _report_templates[key] = (buffer.getvalue(), table_prototype, style_ids)
+    return _report_templates[key]
+
+
+def order_table_rows(rows):
+    """Reorder rubric rows: Overall, Thesis, Evidence and Commentary, Sophistication, then the rest."""
+    table_order = ['overall', 'thesis', 'evidence', 'sophistication']
+    ordered = []
+    
+    for order_key in table_order:
+        for row in rows:
+            if row and row[0].lower().startswith(order_key):
+                ordered.append(row)
+                break
+    
+    # Add any rows that didn't match (fallback)
+    for row in rows:
+        if row not in ordered:
+            ordered.append(row)
+    return ordered
+
+
+def report_date(now=None):
+    """Date as printed on reports, e.g. 17 February 2026."""
+    now = now or datetime.now()
+    return f"{now.day} {now.strftime('%B')} {now.year}"
+
+
+# Fixed timestamp for zip entries so identical reports are identical files
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+# Characters XML 1.0 cannot contain
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def escape(text):
+    """Escape &, < and > for XML text (as xml.sax.saxutils.escape, which imports urllib)."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _run_xml(text, line_break=False):
+    """A w:r element for text; tabs and newlines become w:tab/w:br as in python-docx."""
+    parts = ['<w:r>']
+    for piece in re.split(r'(\t|\r\n|\n|\r)', INVALID_XML_RE.sub('', text)):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\n', '\r', '\r\n'):
+            parts.append('<w:br/>')
+        elif piece:
+            parts.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+    if line_break:
+        parts.append('<w:br/>')
+    parts.append('</w:r>')
+    return ''.join(parts)
+
+
+def _paragraph_xml(text='', style_id=None):
+    ppr = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+    run = _run_xml(text) if text else ''
+    return f'<w:p>{ppr}{run}</w:p>'
+
+
+def iter_report_body_xml(student_name, essay_title, pdf_data, docx_data, template=None, date=None):
+    """
+    Yield the body XML of a report (everything inside w:body except the
+    section properties) in chunks. Produces the same paragraphs, styles and
+    table as create_report, without building a python-docx object model.
+    """
+    from docx.oxml import OxmlElement
+    from lxml import etree
+    
+    _, table_prototype, style_ids = load_report_template(template)
+    
+    yield _paragraph_xml(f"Name: {student_name}")
+    yield _paragraph_xml(f"Essay: {essay_title}")
+    yield _paragraph_xml(f"Date: {date or report_date()}")
+    yield _paragraph_xml()
+    
+    yield _paragraph_xml("ESSAY", style_ids[STYLE_HEADING])
+    for para_text in docx_data.essay:
+        yield f'<w:p>{_run_xml(para_text, line_break=True)}</w:p>'
+    yield _paragraph_xml()
+    yield _paragraph_xml()
+    
+    yield _paragraph_xml("AP RUBRIC", style_ids[STYLE_TABLE_HEADING])
+    if docx_data.rubric:
+        table_data = order_table_rows(docx_data.rubric)
+        
+        tbl = copy.deepcopy(table_prototype)
+        row_prototype = tbl.tr_lst[-1]
+        tbl.remove(row_prototype)
+        for i, row_data in enumerate(table_data):
+            tr = copy.deepcopy(row_prototype)
+            for tc, cell_text in zip(tr.tc_lst, row_data):
+                p = tc.p_lst[0]
+                if i == len(table_data) - 1:
+                    p.style = style_ids[STYLE_TABLE_TEXT_LAST]
+                r = OxmlElement('w:r')
+                r.text = INVALID_XML_RE.sub('', cell_text)
+                p.append(r)
+            tbl.append(tr)
+        yield etree.tostring(tbl, encoding='unicode')
+    yield _paragraph_xml()
+    yield _paragraph_xml()
+    
+    if pdf_data.overall_grade:
+        yield _paragraph_xml(f"OVERALL: {pdf_data.overall_grade}", style_ids[STYLE_HEADING])
+        yield _paragraph_xml()
+    
+    sections_by_name = {section.name: section for section in pdf_data.sections}
+    for sec_name in ['Thesis', 'Evidence and Commentary', 'Sophistication']:
+        section = sections_by_name.get(sec_name)
+        if not section:
+            continue
+        
+        yield _paragraph_xml(f"{section.name}: {section.grade}", style_ids[STYLE_SECTION_HEADING])
+        first_quote = True
+        for item in section.quotes:
+            yield _paragraph_xml(item.quote, style_ids[STYLE_FIRST_QUOTE if first_quote else STYLE_QUOTE])
+            first_quote = False
+            if item.feedback:
+                yield _paragraph_xml(item.feedback, style_ids[STYLE_FEEDBACK])
+        yield _paragraph_xml()
+
+
+def write_docx_stream(output, body_chunks, template=None):
+    """
+    Write a .docx to output (path or binary file) from body XML chunks. All
+    other parts are copied from the report template, and word/document.xml
+    is streamed into the zip as the chunks arrive. Entries get a fixed
+    timestamp, so the same chunks always give the same bytes.
+    """
+    template_bytes = load_report_template(template)[0]
+    
+    with zipfile.ZipFile(io.BytesIO(template_bytes)) as source, \
+            zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            info = zipfile.ZipInfo(item.filename, date_time=ZIP_TIMESTAMP)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            
+            if item.filename != 'word/document.xml':
+                target.writestr(info, source.read(item))
+                continue
+            
+            # The template body is empty apart from its section properties,
+            # so the report body goes right before them
+            document = source.read(item).decode('utf-8')
+            split = document.find('<w:sectPr')
+            if split == -1:
+                split = document.find('</w:body>')
+            
+            with target.open(info, 'w') as f:
+                f.write(document[:split].encode('utf-8'))
+                for chunk in body_chunks:
+                    f.write(chunk.encode('utf-8'))
+                f.write(document[split:].encode('utf-8'))
+
+
+def write_report_xml(student_name, essay_title, pdf_data, docx_data, output_path, template=None, date=None):
+    """Fast alternative to create_report: streams the report's OOXML straight into the .docx zip."""
+    write_docx_stream(output_path,
+                      iter_report_body_xml(student_name, essay_title, pdf_data, docx_data, template, date),
+                      template)
+
+
+PAGE_BREAK_XML = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+# Report formatting for PDF output, mirroring the built-in template's styles
+REPORT_CSS = """
+body { font-family: sans-serif; font-size: 12pt; }
+p { margin: 0 0 8pt 0; }
+.heading { font-size: 14pt; font-weight: bold; }
+.section-heading { font-size: 14pt; font-weight: bold; margin: 12pt 0 0 0; }
+.quote { font-style: italic; margin: 12pt 0 0 0; }
+.first-quote { font-style: italic; margin: 6pt 0 0 0; }
+.feedback { margin: 2pt 0 0 36pt; }
+table { border-collapse: collapse; }
+td { border: 1px solid black; font-size: 10pt; padding: 2pt; vertical-align: top; }
+"""
+# 1.2", 1.2" and 4.1" columns as in the template, less cell padding and borders
+RUBRIC_COLUMN_WIDTHS = ['80pt', '80pt', '280pt']
+
+
+def _html_text(text):
+    return escape(INVALID_XML_RE.sub('', text)).replace('\n', '<br/>')
+
+
+def report_html(student_name, essay_title, pdf_data, docx_data, date=None):
+    """
+    One report as HTML for PDF rendering: the same paragraphs, rubric table
+    and feedback as create_report, with REPORT_CSS standing in for the
+    template's styles.
+    """
+    def p(text='', css_class=None):
+        attr = f' class="{css_class}"' if css_class else ''
+        return f'<p{attr}>{_html_text(text) if text else "&#160;"}</p>'
+    
+    parts = [p(f"Name: {student_name}"), p(f"Essay: {essay_title}"), p(f"Date: {date or report_date()}"), p()]
+    
+    parts.append(p("ESSAY", 'heading'))
+    parts.extend(p(para_text) for para_text in docx_data.essay)
+    parts += [p(), p()]
+    
+    parts.append(p("AP RUBRIC", 'heading'))
+    if docx_data.rubric:
+        parts.append('<table>')
+        for row_data in order_table_rows(docx_data.rubric):
+            cells = ''.join(f'<td style="width:{width}">{_html_text(text)}</td>'
+                            for text, width in zip(row_data, RUBRIC_COLUMN_WIDTHS))
+            parts.append(f'<tr>{cells}</tr>')
+        parts.append('</table>')
+    parts += [p(), p()]
+    
+    if pdf_data.overall_grade:
+        parts += [p(f"OVERALL: {pdf_data.overall_grade}", 'heading'), p()]
+    
+    sections_by_name = {section.name: section for section in pdf_data.sections}
+    for sec_name in ['Thesis', 'Evidence and Commentary', 'Sophistication']:
+        section = sections_by_name.get(sec_name)
+        if not section:
+            continue
+        
+        parts.append(p(f"{section.name}: {section.grade}", 'section-heading'))
+        for i, item in enumerate(section.quotes):
+            parts.append(p(item.quote, 'quote' if i else 'first-quote'))
+            if item.feedback:
+                parts.append(p(item.feedback, 'feedback'))
+        parts.append(p())
+    
+    return ''.join(parts)
+
+
+class PdfReportWriter:
+    """
+    Renders HTML reports (see report_html) into one letter-size PDF with 1"
+    margins, each report starting on a new page. Pages are written out as
+    each report is added, so only the current report is held in memory.
+    """
+    
+    def __init__(self, path):
+        import fitz  # PyMuPDF
+        
+        self.page = fitz.paper_rect('letter')
+        self.where = self.page + (72, 72, -72, -72)
+        self.writer = fitz.DocumentWriter(str(path))
+    
+    def add(self, html):
+        import fitz  # PyMuPDF
+        
+        story = fitz.Story(html, user_css=REPORT_CSS)
+        more = True
+        while more:
+            device = self.writer.begin_page(self.page)
+            more, _ = story.place(self.where)
+            story.draw(device)
+            self.writer.end_page()
+    
+    def close(self):
+        self.writer.close()
+
+
+def write_class_report(jobs, docx_path, pdf_path=None, workers=None, cancel=None, template=None,
+                       on_result=None):
+    """
+    Combined output: every student's report in one class .docx, each
+    starting on a new page, in job order. Students are parsed in parallel
+    (see run_batch) and each report is streamed into the file as soon as it
+    is its turn, so the whole class never sits in memory at once. With
+    pdf_path, a PDF rendering is written alongside in the same pass.
+    on_result(job, error) is called as each student is added or fails.
+    Returns the number of students in the document.
+    """
+    date = report_date()
+    pdf = PdfReportWriter(pdf_path) if pdf_path else None
+    store = ResultsStore.for_jobs(jobs)
+    written = 0
+    
+    def body():
+        nonlocal written
+        for job, data, error in run_batch(jobs, workers, cancel, task=parse_student, ordered=True):
+            if not error:
+                pdf_data, docx_data = data
+                if written:
+                    yield PAGE_BREAK_XML
+                yield from iter_report_body_xml(job['student_name'], job['essay_title'], pdf_data, docx_data,
+                                                template, date)
+                if pdf:
+                    pdf.add(report_html(job['student_name'], job['essay_title'], pdf_data, docx_data, date))
+                if store:
+                    store.record(job, grade_summary(pdf_data, docx_data), docx_path)
+                written += 1
+            if on_result:
+                on_result(job, error)
+    
+    try:
+        write_docx_stream(docx_path, body(), template)
+    finally:
+        if pdf:
+            pdf.close()
+        if store:
+            store.close()
+    return written
+
+
+def normalize_key(text):
+    """Case- and whitespace-insensitive key used to match filenames."""
+    return ' '.join(text.split()).casefold()
+
+
+class MatchIndex:
+    """
+    Pairs PDFs with DOCX files by normalized student name (and essay title
+    when a student has several DOCX files). Filenames are parsed once, when
+    they are added, so matching a whole batch is a single pass.
+    """
+    
+    def __init__(self):
+        self.pdfs = {}                              # pdf name -> (student, title, path)
+        self.docx = {}                              # docx name -> (student, title, path)
+        self.docx_by_student = defaultdict(set)     # student key -> docx names
+    
+    def add_pdf(self, name, path, student_name, essay_title):
+        self.pdfs[name] = (student_name, essay_title, path)
+    
+    def add_docx(self, name, path, student_name, essay_title):
+        # Re-adding a name replaces the old entry
+        if name in self.docx:
+            self.docx_by_student[normalize_key(self.docx[name][0])].discard(name)
+        self.docx[name] = (student_name, essay_title, path)
+        self.docx_by_student[normalize_key(student_name)].add(name)
+    
+    def find_docx(self, student_name, essay_title):
+        """
+        Return (docx_name, candidates). docx_name is None when there is no
+        DOCX for the student, or when several remain after narrowing by title.
+        """
+        candidates = sorted(self.docx_by_student.get(normalize_key(student_name), ()))
+        if len(candidates) <= 1:
+            return (candidates[0] if candidates else None), candidates
+        
+        title_key = normalize_key(essay_title)
+        same_title = [name for name in candidates if normalize_key(self.docx[name][1]) == title_key]
+        if len(same_title) == 1:
+            return same_title[0], candidates
+        return None, same_title or candidates
+    
+    def match(self):
+        """
+        Match every PDF in one pass. Returns a dict with:
+          pairs           list of (pdf_name, docx_name or None)
+          unmatched_pdfs  PDF names with no DOCX for that student
+          unmatched_docx  DOCX names no PDF was paired with
+          ambiguous       {pdf_name: [docx names]} where the match could not be decided
+        """
+        result = {'pairs': [], 'unmatched_pdfs': [], 'unmatched_docx': [], 'ambiguous': {}}
+        used = set()
+        
+        for pdf_name, (student_name, essay_title, _) in self.pdfs.items():
+            docx_name, candidates = self.find_docx(student_name, essay_title)
+            if docx_name:
+                used.add(docx_name)
+            elif candidates:
+                result['ambiguous'][pdf_name] = candidates
+                used.update(candidates)
+            else:
+                result['unmatched_pdfs'].append(pdf_name)
+            result['pairs'].append((pdf_name, docx_name))
+        
+        result['unmatched_docx'] = sorted(name for name in self.docx if name not in used)
+        return result
+    
+    def warnings(self, match=None):
+        """Human-readable problems from a match() result."""
+        match = match or self.match()
+        warnings = []
+        for pdf_name in match['unmatched_pdfs']:
+            warnings.append(f"No matching DOCX for {self.pdfs[pdf_name][0]}")
+        for pdf_name, candidates in match['ambiguous'].items():
+            warnings.append(f"Several DOCX files for {self.pdfs[pdf_name][0]} ({', '.join(candidates)}); none used")
+        for docx_name in match['unmatched_docx']:
+            warnings.append(f"No matching PDF for {docx_name}")
+        return warnings
+
+
+# Section headers we care about (in the order they appear in the PDF)
+SECTION_NAMES = ['Evidence and Commentary', 'Sophistication', 'Thesis']
+SECTION_BY_KEY = {name.lower(): name for name in SECTION_NAMES}
+
+GRADE_RE = re.compile(r'^\d+/\d+$')
+QUOTE_OPENERS = ('"', '\u201c')
+QUOTE_CLOSERS = ('"', '\u201d')
+
+# PyMuPDF span flags
+FONT_ITALIC = 2
+FONT_BOLD = 16
+PAGE_HEADER_RE = re.compile(r'^Page \d+ of \d+$')
+FILENAME_HEADER_RE = re.compile(r'^[A-Za-z]+_\s+.*_review$', re.IGNORECASE)
+
+
+# Parsed results. Records are typed, immutable tuples: far smaller than the
+# equivalent dicts when a whole batch is held in memory, cheap to pickle to
+# worker processes, and json.dumps writes them as plain nested arrays, which
+# from_json turns back into records (the parse cache stores them that way).
+# Short values that repeat across a class (grades, rubric categories and
+# scores) are interned so each is stored once.
+
+class QuoteFeedback(NamedTuple):
+    """A quote from the essay and the reviewer's feedback on it."""
+    quote: str
+    feedback: str = ''
+
+
+class Section(NamedTuple):
+    """One graded section of the feedback PDF (see SECTION_NAMES)."""
+    name: str
+    grade: str = ''
+    overview: str = ''
+    quotes: tuple[QuoteFeedback, ...] = ()
+
+
+class StudentFeedback(NamedTuple):
+    """What parse_pdf_feedback returns: the overall grade and overview, then the sections in PDF order."""
+    overall_grade: str = ''
+    overall_overview: str = ''
+    sections: tuple[Section, ...] = ()
+    
+    @classmethod
+    def from_json(cls, data):
+        overall_grade, overall_overview, sections = data
+        return cls(sys.intern(overall_grade), overall_overview, tuple(
+            Section(name, sys.intern(grade), overview, tuple(QuoteFeedback(*quote) for quote in quotes))
+            for name, grade, overview, quotes in sections))
+    
+    def to_dict(self):
+        """The nested dicts parse_pdf_feedback returned before these records."""
+        return {'overall_grade': self.overall_grade, 'overall_overview': self.overall_overview,
+                'sections': [{**section._asdict(), 'quotes': [quote._asdict() for quote in section.quotes]}
+                             for section in self.sections]}
+
+
+class RubricRow(NamedTuple):
+    """A row of the DOCX grading table."""
+    category: str
+    score: str = ''
+    comment: str = ''
+    
+    @classmethod
+    def from_cells(cls, cells):
+        """A row from its cell texts; cells past the third are dropped, missing ones are empty."""
+        category, score, comment = (list(cells[:3]) + ['', '', ''])[:3]
+        return cls(sys.intern(category), sys.intern(score), comment)
+
+
+class EssayReview(NamedTuple):
+    """What parse_docx_content returns: the grading table rows (header skipped) and the essay paragraphs."""
+    rubric: tuple[RubricRow, ...] = ()
+    essay: tuple[str, ...] = ()
+    
+    @classmethod
+    def from_json(cls, data):
+        rubric, essay = data
+        return cls(tuple(RubricRow.from_cells(row) for row in rubric), tuple(essay))
+    
+    def to_dict(self):
+        """The dict parse_docx_content returned before these records."""
+        return {'table_data': [list(row) for row in self.rubric], 'essay': list(self.essay)}
+
+
+def join_lines(lines):
+    """Join lines, removing end-of-line hyphens."""
+    if not lines:
+        return ''
+    
+    parts = [lines[0]]
+    for line in lines[1:]:
+        # If previous line ends with hyphen and this line starts with lowercase
+        if parts[-1].endswith('-') and line and line[0].islower():
+            # Remove hyphen and join without space
+            parts[-1] = parts[-1][:-1]
+        else:
+            # Normal join with space
+            parts.append(' ')
+        parts.append(line)
+    return ''.join(parts)
+
+
+def is_quote_complete(line):
+    """Check if a line ends a quote (ends with closing quote mark)."""
+    return line.rstrip().endswith('"')
+
+
+class FeedbackParser:
+    """
+    Single-pass parser for the feedback part of a review PDF.
+    
+    Lines are fed one at a time (feed/feed_lines) and result() returns:
+        StudentFeedback('3/6', '...', sections=(
+            Section('Thesis', '1/1', '...', quotes=(QuoteFeedback('"..."', '...'),)),))
+    
+    The overall grade comes from the line after "Grading", its overview runs
+    up to the next section header. Each section starts at its header, takes
+    a grade line, overview lines until the first line starting with a quote
+    mark, then quote/feedback pairs: a quote runs until a line ends with a
+    closing quote mark and its feedback runs until the next quote.
+    """
+    
+    def __init__(self):
+        self.overall_grade = ''
+        self.overall_overview = ''
+        self.sections = []
+        
+        # Overall grade: seek -> grade -> overview -> done
+        self._overall_state = 'seek'
+        self._overall_lines = []
+        
+        # Section being collected (None before the first header)
+        self._section = None
+    
+    def feed_lines(self, lines):
+        for line in lines:
+            self.feed(line)
+        return self
+    
+    def feed(self, line):
+        line = line.strip()
+        
+        # Skip empty lines and page headers like "Page 1 of 5" or filename repeats
+        if not line or PAGE_HEADER_RE.match(line):
+            return
+        if '_' in line and FILENAME_HEADER_RE.match(line):
+            return
+        
+        self._feed_overall(line)
+        
+        section_name = SECTION_BY_KEY.get(line.lower())
+        if section_name:
+            self._start_section(section_name)
+        elif self._section:
+            self._feed_section(line)
+    
+    def feed_block(self, kind, text):
+        """
+        Feed one paragraph already classified from the PDF layout (see
+        EssayProcessor.iter_pdf_blocks). kind is 'heading', 'grade', 'quote',
+        'quote_cont' (a quote carried over from the previous block, e.g.
+        across a page break) or 'text'. Quote boundaries come from the
+        layout, so no closing-quote guessing is needed.
+        """
+        if kind == 'heading':
+            if text.lower() == 'grading':
+                if self._overall_state == 'seek':
+                    self._overall_state = 'grade'
+            else:
+                if self._overall_state in ('grade', 'overview'):
+                    self._end_overall()
+                self._start_section(SECTION_BY_KEY[text.lower()])
+            return
+        
+        if self._section is None:
+            if self._overall_state == 'grade':
+                if kind == 'grade':
+                    self.overall_grade = sys.intern(text)
+                    self._overall_state = 'overview'
+                else:
+                    self._overall_state = 'done'
+            elif self._overall_state == 'overview':
+                self._overall_lines.append(text)
+            return
+        
+        section = self._section
+        section['empty'] = False
+        
+        if kind == 'grade' and section['state'] == 'grade':
+            section['grade'] = text
+            section['state'] = 'overview'
+        elif kind in ('quote', 'quote_cont'):
+            section['state'] = 'quotes'
+            if kind == 'quote_cont' and section['quote'] and not section['feedback']:
+                section['quote'].append(text)
+            else:
+                self._end_quote()
+                section['quote'] = [text]
+            section['quote_complete'] = True
+        elif section['state'] != 'quotes':
+            section['state'] = 'overview'
+            section['overview'].append(text)
+        elif section['quote']:
+            section['feedback'].append(text)
+    
+    def _start_section(self, name):
+        self._end_section()
+        self._section = {
+            'name': name,
+            'state': 'grade',
+            'grade': '',
+            'overview': [],
+            'quotes': [],
+            'quote': [],
+            'feedback': [],
+            'quote_complete': False,
+            'empty': True,
+        }
+    
+    def _feed_overall(self, line):
+        state = self._overall_state
+        if state == 'seek':
+            if line.lower() == 'grading':
+                self._overall_state = 'grade'
+        elif state == 'grade':
+            # The grade must be the line right after "Grading"
+            if GRADE_RE.match(line):
+                self.overall_grade = sys.intern(line)
+                self._overall_state = 'overview'
+            else:
+                self._overall_state = 'done'
+        elif state == 'overview':
+            if line in SECTION_NAMES:
+                self._end_overall()
+            else:
+                self._overall_lines.append(line)
+    
+    def _end_overall(self):
+        if self._overall_state == 'overview':
+            self.overall_overview = join_lines(self._overall_lines)
+        self._overall_state = 'done'
+    
+    def _feed_section(self, line):
+        section = self._section
+        section['empty'] = False
+        
+        if section['state'] == 'grade':
+            section['state'] = 'overview'
+            if GRADE_RE.match(line):
+                section['grade'] = line
+                return
+        
+        if section['state'] == 'overview':
+            if not line.startswith('"'):
+                section['overview'].append(line)
+                return
+            section['state'] = 'quotes'
+        
+        if section['quote'] and not section['quote_complete']:
+            # Continuation of a quote that hasn't closed yet
+            section['quote'].append(line)
+            section['quote_complete'] = is_quote_complete(line)
+        elif line.startswith('"'):
+            self._end_quote()
+            section['quote'] = [line]
+            section['quote_complete'] = is_quote_complete(line)
+        elif section['quote']:
+            # Quote is done, this is feedback
+            section['feedback'].append(line)
+    
+    def _end_quote(self):
+        section = self._section
+        if section['quote']:
+            section['quotes'].append(QuoteFeedback(join_lines(section['quote']), join_lines(section['feedback'])))
+        section['quote'] = []
+        section['feedback'] = []
+    
+    def _end_section(self):
+        section = self._section
+        if not section or section['empty']:
+            return
+        
+        self._end_quote()
+        self.sections.append(Section(section['name'], sys.intern(section['grade']),
+                                     join_lines(section['overview']), tuple(section['quotes'])))
+        self._section = None
+    
+    def result(self):
+        """Finish any open overview/section and return the parsed data."""
+        self._end_overall()
+        self._end_section()
+        return StudentFeedback(self.overall_grade, self.overall_overview, tuple(self.sections))
+
+
+def parse_feedback_lines(lines):
+    """Parse an iterable of feedback text lines (see FeedbackParser)."""
+    return FeedbackParser().feed_lines(lines).result()
+
+
+# DOCX parsing: the essay ends at the first paragraph containing one of these
+DOCX_STOP_MARKERS = [marker.lower() for marker in ['Grammar and Spelling Review', 'Scan Results', 'AI Detection']]
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_BODY, W_P, W_TBL, W_TR, W_TC, W_R = (W_NS + tag for tag in ('body', 'p', 'tbl', 'tr', 'tc', 'r'))
+W_HYPERLINK, W_T, W_TAB, W_BR, W_CR = (W_NS + tag for tag in ('hyperlink', 't', 'tab', 'br', 'cr'))
+W_PTAB, W_NO_BREAK_HYPHEN = W_NS + 'ptab', W_NS + 'noBreakHyphen'
+W_TCPR, W_TRPR, W_GRID_SPAN, W_GRID_BEFORE, W_VMERGE, W_VAL = (
+    W_NS + tag for tag in ('tcPr', 'trPr', 'gridSpan', 'gridBefore', 'vMerge', 'val'))
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+
+def _docx_main_part(package):
+    """Name of the main document part in an open .docx zip (normally word/document.xml)."""
+    from lxml import etree
+    
+    try:
+        rels = etree.fromstring(package.read('_rels/.rels'))
+        for rel in rels:
+            if rel.get('Type') == OFFICE_DOCUMENT_REL:
+                return rel.get('Target').lstrip('/')
+    except (KeyError, etree.XMLSyntaxError):
+        pass
+    return 'word/document.xml'
+
+
+def iter_docx_body(source):
+    """
+    Yield the top-level paragraphs (w:p) and tables (w:tbl) of a .docx body
+    as lxml elements, streaming word/document.xml. Each element is cleared
+    once the next one is requested, so memory stays flat; stop early to skip
+    reading the rest of the document. source is anything read_input accepts.
+    """
+    from lxml import etree
+    
+    # Paths and binary file objects go to zipfile as they are
+    if isinstance(source, (bytes, bytearray, memoryview, ArchiveMember)):
+        source = io.BytesIO(read_input(source))
+    
+    with zipfile.ZipFile(source) as package, package.open(_docx_main_part(package)) as xml:
+        for _, elem in etree.iterparse(xml, events=('end',), tag=(W_P, W_TBL)):
+            parent = elem.getparent()
+            if parent is None or parent.tag != W_BODY:
+                continue
+            
+            yield elem
+            
+            # Drop body content already handled
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+def _run_text(r):
+    """Text of a w:r element, as python-docx's Run.text gives it."""
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or '')
+        elif tag in (W_TAB, W_PTAB):
+            parts.append('\t')
+        elif tag == W_BR:
+            # Only line breaks are text; page and column breaks are not
+            if child.get(W_NS + 'type', 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag == W_CR:
+            parts.append('\n')
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append('-')
+    return ''.join(parts)
+
+
+def _paragraph_text(p):
+    """Text of a w:p element, as python-docx's Paragraph.text gives it."""
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_run_text(r) for r in child if r.tag == W_R)
+    return ''.join(parts)
+
+
+def _table_rows(tbl):
+    """
+    Cell texts of each row of a w:tbl element, as python-docx's row.cells
+    gives them: a cell spanning several grid columns repeats, and a
+    vertically merged cell takes the text of the cell it continues.
+    """
+    rows = []
+    grid = []       # per row: {grid offset: cell text}
+    for tr in tbl:
+        if tr.tag != W_TR:
+            continue
+        
+        trPr = tr.find(W_TRPR)
+        grid_before = trPr.find(W_GRID_BEFORE) if trPr is not None else None
+        offset = int(grid_before.get(W_VAL, 0)) if grid_before is not None else 0
+        
+        cells = []
+        row_grid = {}
+        for tc in tr:
+            if tc.tag != W_TC:
+                continue
+            
+            tcPr = tc.find(W_TCPR)
+            span, vmerge = 1, None
+            if tcPr is not None:
+                grid_span = tcPr.find(W_GRID_SPAN)
+                if grid_span is not None:
+                    span = int(grid_span.get(W_VAL, 1))
+                vmerge_elem = tcPr.find(W_VMERGE)
+                if vmerge_elem is not None:
+                    vmerge = vmerge_elem.get(W_VAL, 'continue')
+            
+            if vmerge == 'continue' and grid:
+                text = grid[-1].get(offset, '')
+            else:
+                text = '\n'.join(_paragraph_text(p) for p in tc if p.tag == W_P)
+            
+            row_grid[offset] = text
+            cells.extend([text] * span)
+            offset += span
+        
+        grid.append(row_grid)
+        rows.append(cells)
+    return rows
+
+
+# Preview pane: rendered width of PDF pages, DOCX paragraphs shown, previews kept
+PREVIEW_WIDTH = 520
+PREVIEW_PARAGRAPHS = 300
+PREVIEW_CACHE_SIZE = 16
+
+
+def render_preview(source, width=PREVIEW_WIDTH, max_paragraphs=PREVIEW_PARAGRAPHS):
+    """
+    Preview of an input or report file: ('image', png bytes, caption) with
+    a PDF's first page, or ('text', text, caption) with a DOCX's paragraphs
+    and table rows. source is anything read_input accepts, named .pdf/.docx.
+    """
+    if str(source).lower().endswith('.pdf'):
+        import fitz  # PyMuPDF
+        
+        with open_pdf(source) as doc:
+            page = doc[0]
+            zoom = width / page.rect.width
+            png = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes('png')
+            return 'image', png, f"Page 1 of {doc.page_count}"
+    
+    lines = []
+    with contextlib.closing(iter_docx_body(source)) as body:
+        for elem in body:
+            if elem.tag == W_P:
+                lines.append(_paragraph_text(elem))
+            else:
+                lines.extend(' | '.join(row) for row in _table_rows(elem))
+            if len(lines) >= max_paragraphs:
+                return 'text', '\n'.join(lines), f"First {max_paragraphs} paragraphs"
+    return 'text', '\n'.join(lines), f"{len(lines)} paragraphs"
+
+
+def preview_key(source):
+    """Cache key for a preview: the file plus its modification time, so edited files re-render."""
+    path = source.archive if isinstance(source, ArchiveMember) else source
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    return str(source), mtime
+
+
+class LRUCache:
+    """A small mapping that forgets the least recently used entry once full."""
+    
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+    
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+    
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class VirtualList:
+    """
+    Listbox replacement that only draws the rows in view, so lists of
+    thousands of files stay responsive. Names are kept in order with a set
+    alongside for constant-time duplicate checks; redraws triggered while
+    adding many names are coalesced into one. on_select(name) is called
+    when a row is clicked or reached with the arrow keys. Pack or grid its
+    frame.
+    """
+    
+    ROW_HEIGHT = 20
+    
+    def __init__(self, parent, height=8, on_select=None, font=("Segoe UI", 10)):
+        self.frame = ttk.Frame(parent)
+        self.items = []
+        self.names = set()
+        self.selection = None
+        self.on_select = on_select
+        self.font = font
+        self._redraw_pending = False
+        
+        self.canvas = tk.Canvas(self.frame, height=height * self.ROW_HEIGHT, bg='white', takefocus=True,
+                                highlightthickness=1, yscrollincrement=self.ROW_HEIGHT)
+        scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._scroll)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.canvas.bind('<Configure>', lambda e: self._redraw())
+        self.canvas.bind('<Button-1>', self._click)
+        self.canvas.bind('<MouseWheel>', lambda e: self._scroll('scroll', -e.delta // 120, 'units'))
+        self.canvas.bind('<Button-4>', lambda e: self._scroll('scroll', -1, 'units'))
+        self.canvas.bind('<Button-5>', lambda e: self._scroll('scroll', 1, 'units'))
+        self.canvas.bind('<Up>', lambda e: self._move(-1))
+        self.canvas.bind('<Down>', lambda e: self._move(1))
+    
+    def __contains__(self, name):
+        return name in self.names
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def add(self, name):
+        """Append name unless it is already listed. Returns True if it was added."""
+        if name in self.names:
+            return False
+        self.names.add(name)
+        self.items.append(name)
+        self._schedule_redraw()
+        return True
+    
+    def clear(self):
+        self.items = []
+        self.names = set()
+        self.selection = None
+        self._schedule_redraw()
+    
+    def select(self, index):
+        self.selection = index
+        self.canvas.focus_set()
+        
+        # Scroll just enough to bring the row into view
+        top = int(self.canvas.canvasy(0)) // self.ROW_HEIGHT
+        visible = max(self.canvas.winfo_height() // self.ROW_HEIGHT, 1)
+        if index < top:
+            self.canvas.yview_scroll(index - top, 'units')
+        elif index >= top + visible:
+            self.canvas.yview_scroll(index - top - visible + 1, 'units')
+        self._redraw()
+        
+        if self.on_select:
+            self.on_select(self.items[index])
+    
+    def _schedule_redraw(self):
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.frame.after_idle(self._redraw)
+    
+    def _redraw(self):
+        self._redraw_pending = False
+        canvas = self.canvas
+        width = canvas.winfo_width()
+        canvas.configure(scrollregion=(0, 0, width, max(len(self.items) * self.ROW_HEIGHT, canvas.winfo_height())))
+        
+        canvas.delete('row')
+        first = int(canvas.canvasy(0)) // self.ROW_HEIGHT
+        last = min(int(canvas.canvasy(canvas.winfo_height())) // self.ROW_HEIGHT + 1, len(self.items) - 1)
+        for index in range(first, last + 1):
+            y = index * self.ROW_HEIGHT
+            color = 'black'
+            if index == self.selection:
+                canvas.create_rectangle(0, y, width, y + self.ROW_HEIGHT, fill='#0078d7', outline='', tags='row')
+                color = 'white'
+            canvas.create_text(4, y + self.ROW_HEIGHT // 2, anchor=tk.W, text=self.items[index], font=self.font,
+                               fill=color, tags='row')
+    
+    def _scroll(self, *args):
+        self.canvas.yview(*args)
+        self._redraw()
+    
+    def _click(self, event):
+        index = int(self.canvas.canvasy(event.y)) // self.ROW_HEIGHT
+        if 0 <= index < len(self.items):
+            self.select(index)
+    
+    def _move(self, step):
+        if self.items:
+            current = self.selection if self.selection is not None else -step
+            self.select(min(max(current + step, 0), len(self.items) - 1))
+
+
+class PreviewPane:
+    """
+    Shows the selected file: a PDF's first page or a DOCX's text. Rendering
+    runs on a background thread, which skips straight to the latest request
+    when several are queued, and recent previews are kept in a small LRU
+    cache so going back to a file is instant. Pack or grid its frame.
+    """
+    
+    def __init__(self, parent, cache_size=PREVIEW_CACHE_SIZE):
+        self.frame = ttk.LabelFrame(parent, text="Preview", padding="5")
+        self.cache = LRUCache(cache_size)
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.current = None
+        self.image = None       # Tk drops images nothing refers to
+        self.worker = None
+        self.polling = False    # whether a _poll is scheduled
+        
+        self.caption_var = tk.StringVar(value="Click a file to preview it")
+        ttk.Label(self.frame, textvariable=self.caption_var).pack(fill=tk.X)
+        
+        self.text = tk.Text(self.frame, wrap=tk.WORD, state=tk.DISABLED, font=("Segoe UI", 10), relief=tk.FLAT)
+        scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.text.yview)
+        self.text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    
+    def show(self, source):
+        key = preview_key(source)
+        self.current = key
+        
+        preview = self.cache.get(key)
+        if preview:
+            self._display(preview)
+            return
+        
+        self.caption_var.set(f"Loading {os.path.basename(str(source))}...")
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._render_worker, daemon=True)
+            self.worker.start()
+        self.requests.put((key, source))
+        if not self.polling:
+            self.polling = True
+            self.frame.after(50, self._poll)
+    
+    def _render_worker(self):
+        """Runs off the Tk thread. Never touches widgets, only the queues."""
+        while True:
+            key, source = self.requests.get()
+            # Only the newest request matters when the user clicks through quickly
+            while not self.requests.empty():
+                key, source = self.requests.get_nowait()
+            try:
+                preview = render_preview(source)
+            except Exception as e:
+                preview = ('text', '', f"Can't preview {os.path.basename(str(source))}: {e}")
+            self.results.put((key, preview))
+    
+    def _poll(self):
+        while True:
+            try:
+                key, preview = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.cache.put(key, preview)
+            if key == self.current:
+                self._display(preview)
+        
+        self.polling = self.cache.get(self.current) is None
+        if self.polling:
+            self.frame.after(50, self._poll)
+    
+    def _display(self, preview):
+        kind, content, caption = preview
+        self.caption_var.set(caption)
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        if kind == 'image':
+            self.image = tk.PhotoImage(data=base64.b64encode(content))
+            self.text.image_create(tk.END, image=self.image)
+        else:
+            self.text.insert(tk.END, content)
+        self.text.configure(state=tk.DISABLED)
 
 
 class EssayProcessor:
-    def __init__(self, root):
+    timer = None    # StageTimer while a timed job runs
+    
+    def __init__(self, root=None):
         self.root = root
+        
+        # Data storage
+        self.pdf_files = {}
+        self.docx_files = {}
+        self.output_files = {}
+        self.output_folder = None
+        self.match_index = MatchIndex()
+        self.cache = ParseCache()
+        self.template_path = None
+        
+        # Background batch state
+        self.results_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.batch_total = 0
+        self.batch_processed = 0
+        self.batch_errors = []
+        self.batch_done = 0
+        self.failed_pdfs = []       # per-student reports that failed, offered for a retry
+        self.error_log = None
+        self.similar_essays = None  # (pairs, CSV path) when the similarity check ran
+        
+        # Without a root window the processor is headless (batch/CLI use)
+        if root is None:
+            return
+        
+        load_tk()
         self.root.title("AP English Rubric Guide")
-        self.root.geometry("400x750")
+        self.root.geometry("960x750")
         self.root.configure(bg="#f0f0f0")
         
-        # Data storage
-        self.pdf_files = {}
-        self.docx_files = {}
-        self.output_files = {}
-        self.output_folder = None
+        self.setup_ui()
+    
+    def setup_ui(self):
+        menubar = tk.Menu(self.root)
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="Load Zip Archive...", command=self.load_zip)
+        tools_menu.add_separator()
+        self.layout_var = tk.BooleanVar(value=False)
+        tools_menu.add_checkbutton(label="Layout-Aware PDF Parsing", variable=self.layout_var)
+        self.timing_var = tk.BooleanVar(value=False)
+        tools_menu.add_checkbutton(label="Record Timing Report", variable=self.timing_var)
+        self.similarity_var = tk.BooleanVar(value=False)
+        tools_menu.add_checkbutton(label="Flag Similar Essays", variable=self.similarity_var)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Report Template...", command=self.choose_template)
+        tools_menu.add_command(label="Use Built-in Template", command=self.reset_template)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Clear Parse Cache", command=self.clear_cache)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Combined Class Report...", command=self.process_combined)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        self.root.config(menu=menubar)
+        
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # File lists on the left, preview of the selected file on the right
+        self.preview = PreviewPane(main_frame)
+        self.preview.frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(10, 0))
+        lists_frame = ttk.Frame(main_frame, width=380)
+        lists_frame.pack(side=tk.LEFT, fill=tk.Y)
+        lists_frame.pack_propagate(False)
+        
+        # PDF section
+        pdf_frame = ttk.LabelFrame(lists_frame, text="PDF Files", padding="5")
+        pdf_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        self.pdf_list = VirtualList(pdf_frame, height=8, on_select=lambda name: self.preview.show(self.pdf_files[name]))
+        self.pdf_list.frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(pdf_frame, text="Load PDFs", command=self.load_pdfs).pack(fill=tk.X, pady=(5, 0))
+        
+        # DOCX section
+        docx_frame = ttk.LabelFrame(lists_frame, text="DOCX Files", padding="5")
+        docx_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        self.docx_list = VirtualList(docx_frame, height=8, on_select=lambda name: self.preview.show(self.docx_files[name]))
+        self.docx_list.frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(docx_frame, text="Load DOCX", command=self.load_docx).pack(fill=tk.X, pady=(5, 0))
+        
+        # Output section
+        output_frame = ttk.LabelFrame(lists_frame, text="Generated Reports", padding="5")
+        output_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.output_list = VirtualList(output_frame, height=6,
+                                       on_select=lambda name: self.preview.show(self.output_files[name]))
+        self.output_list.frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Process / Cancel buttons with progress bar
+        button_frame = ttk.Frame(lists_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        self.process_button = ttk.Button(button_frame, text="Process All", command=self.process_all)
+        self.process_button.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        self.update_button = ttk.Button(button_frame, text="Update Folder...", command=self.update_folder)
+        self.update_button.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+        
+        self.progress = ttk.Progressbar(lists_frame, mode='determinate')
+        self.progress.pack(fill=tk.X, pady=(5, 0))
+        
+        # Status bar
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W).pack(fill=tk.X, side=tk.BOTTOM, padx=5, pady=5)
+    
+    def load_pdfs(self):
+        files = filedialog.askopenfilenames(title="Select PDF Files", filetypes=[("PDF Files", "*.pdf")])
+        for f in files:
+            self.pdf_list.add(self.add_pdf(f))
+        self.status_var.set(f"Loaded {len(files)} PDF file(s)" + self.match_summary())
+    
+    def load_docx(self):
+        files = filedialog.askopenfilenames(title="Select DOCX Files", filetypes=[("Word Documents", "*.docx")])
+        for f in files:
+            self.docx_list.add(self.add_docx(f))
+        self.status_var.set(f"Loaded {len(files)} DOCX file(s)" + self.match_summary())
+    
+    def load_zip(self):
+        """Load the PDFs and DOCX files of a .zip (e.g. an LMS download) without extracting it."""
+        path = filedialog.askopenfilename(title="Select Zip Archive", filetypes=[("Zip Archives", "*.zip")])
+        if not path:
+            return
+        
+        before = len(self.pdf_files) + len(self.docx_files)
+        try:
+            self.load_folder(path)
+        except zipfile.BadZipFile as e:
+            messagebox.showerror("Error", f"Could not read {os.path.basename(path)}: {e}")
+            return
+        
+        for file_list, files in ((self.pdf_list, self.pdf_files), (self.docx_list, self.docx_files)):
+            for name in files:
+                file_list.add(name)
+        
+        loaded = len(self.pdf_files) + len(self.docx_files) - before
+        self.status_var.set(f"Loaded {loaded} file(s) from {os.path.basename(path)}" + self.match_summary())
+    
+    def add_pdf(self, path):
+        """Register a PDF (path or ArchiveMember) and index it for matching. Returns its file name."""
+        name = os.path.basename(str(path))
+        self.pdf_files[name] = path
+        self.match_index.add_pdf(name, path, *self.parse_filename(name))
+        return name
+    
+    def add_docx(self, path):
+        """Register a DOCX (path or ArchiveMember) and index it for matching. Returns its file name."""
+        name = os.path.basename(str(path))
+        self.docx_files[name] = path
+        self.match_index.add_docx(name, path, *self.parse_filename(name))
+        return name
+    
+    def choose_template(self):
+        path = filedialog.askopenfilename(title="Select Report Template", filetypes=[("Word Documents", "*.docx")])
+        if not path:
+            return
+        try:
+            load_report_template(path)
+        except Exception as e:
+            messagebox.showerror("Invalid Template", str(e))
+            return
+        self.template_path = path
+        self.status_var.set(f"Using report template {os.path.basename(path)}")
+    
+    def reset_template(self):
+        self.template_path = None
+        self.status_var.set("Using built-in report template")
+    
+    def clear_cache(self):
+        removed = self.cache.clear()
+        self.status_var.set(f"Cleared {removed} cached parse result(s)")
+    
+    def match_summary(self):
+        """Short status-bar suffix describing matching problems, if any."""
+        if not self.pdf_files or not self.docx_files:
+            return ""
+        match = self.match_index.match()
+        problems = []
+        if match['unmatched_pdfs']:
+            problems.append(f"{len(match['unmatched_pdfs'])} PDF(s) without DOCX")
+        if match['unmatched_docx']:
+            problems.append(f"{len(match['unmatched_docx'])} DOCX without PDF")
+        if match['ambiguous']:
+            problems.append(f"{len(match['ambiguous'])} ambiguous")
+        return f" ({', '.join(problems)})" if problems else ""
+    
+    def extract_pdf_text(self, path):
+        try:
+            with open_pdf(path) as doc:
+                return "".join(page.get_text() for page in doc)
+        except Exception as e:
+            return f"Error: {e}"
+    
+    def iter_pdf_lines(self, path):
+        """
+        Yield the PDF's text lines page by page, stopping at "Document Review"
+        / "Spelling and Grammar" so the pages after it are never extracted.
+        Lines come out exactly as splitting extract_pdf_text() would give them.
+        """
+        try:
+            with open_pdf(path) as doc:
+                # A page's text may not end in a newline, in which case its last
+                # line continues on the next page
+                pending = ""
+                for page in doc:
+                    text = pending + page.get_text()
+                    stop = PDF_STOP_RE.search(text)
+                    if stop:
+                        yield from text[:stop.start()].split('\n')
+                        return
+                    lines = text.split('\n')
+                    pending = lines.pop()
+                    yield from lines
+                yield pending
+        except Exception as e:
+            yield f"Error: {e}"
+    
+    def parse_filename(self, filename):
+        """Extract student name and essay title from filename."""
+        base = os.path.splitext(filename)[0]
+        parts = re.split(r'_\s*', base)
+        
+        if len(parts) >= 2:
+            student_name = parts[0].strip()
+            title_parts = parts[1:-1] if len(parts) > 2 else [parts[1]]
+            essay_title = ' '.join(title_parts).strip()
+            essay_title = re.sub(r'\s*review\s*$', '', essay_title, flags=re.IGNORECASE)
+            essay_title = essay_title.title()
+            return student_name, essay_title
+        
+        return base, "Unknown"
+    
+    def iter_pdf_blocks(self, path):
+        """
+        Yield (kind, text) paragraphs of the feedback part, classified from
+        PyMuPDF span metadata instead of from the text alone:
+          heading     "Grading" or a section name, set bold or larger than body text
+          grade       a "3/4" line
+          quote       italic text, or text opening with a quote mark
+          quote_cont  italic text continuing the previous quote (e.g. across a page)
+          text        overview and feedback
+        Within a text block, italic and upright lines are split into separate
+        paragraphs so a quote and its feedback never run together. Stops at
+        "Document Review" / "Spelling and Grammar".
+        """
+        with open_pdf(path) as doc:
+            previous = None
+            quote_open = False
+            for page in doc:
+                blocks = [b for b in page.get_text("dict")['blocks'] if b.get('type', 0) == 0]
+                
+                # Body text size: the size covering the most characters on the page.
+                # A page with no bold text and a single size has no styling to go on,
+                # so headings are then recognized by name alone; likewise without
+                # any italics, quotes can only be told apart by their quote marks.
+                sizes = defaultdict(int)
+                flags = 0
+                for block in blocks:
+                    for line in block['lines']:
+                        for span in line['spans']:
+                            sizes[round(span['size'], 1)] += len(span['text'].strip())
+                            flags |= span['flags']
+                body_size = max(sizes, key=sizes.get) if sizes else 0
+                styled = bool(flags & FONT_BOLD) or len(sizes) > 1
+                has_italic = bool(flags & FONT_ITALIC)
+                
+                for block in blocks:
+                    paragraphs = []     # [italic, emphasized, standalone, [line texts]]
+                    for line in block['lines']:
+                        spans = [span for span in line['spans'] if span['text'].strip()]
+                        text = ''.join(span['text'] for span in line['spans']).strip()
+                        if not spans or PAGE_HEADER_RE.match(text) or FILENAME_HEADER_RE.match(text):
+                            continue
+                        
+                        chars = sum(len(span['text']) for span in spans)
+                        italic = 2 * sum(len(span['text']) for span in spans if span['flags'] & FONT_ITALIC) > chars
+                        emphasized = not styled or all(
+                            span['flags'] & FONT_BOLD or round(span['size'], 1) > body_size for span in spans)
+                        
+                        # Headings and grades are paragraphs of their own even when
+                        # PyMuPDF puts them in the same block as the text that follows
+                        key = text.lower()
+                        standalone = key == 'grading' or key in SECTION_BY_KEY or bool(GRADE_RE.match(text))
+                        
+                        # A line opening a quote starts a new paragraph unless the previous
+                        # quote is still open. Without italics on the page, quote marks are
+                        # all there is: the quote runs until a line ends with a closing mark.
+                        starts_quote = text.startswith(QUOTE_OPENERS) and not quote_open
+                        if not has_italic:
+                            italic = quote_open or starts_quote
+                        quote_open = italic and not text.endswith(QUOTE_CLOSERS)
+                        
+                        if (paragraphs and not standalone and not starts_quote and not paragraphs[-1][2]
+                                and paragraphs[-1][0] == italic):
+                            paragraphs[-1][1] = paragraphs[-1][1] and emphasized
+                            paragraphs[-1][3].append(text)
+                        else:
+                            paragraphs.append([italic, emphasized, standalone, [text]])
+                    
+                    for italic, emphasized, _, lines in paragraphs:
+                        text = join_lines(lines)
+                        stop = PDF_STOP_RE.search(text)
+                        if stop:
+                            text = text[:stop.start()].strip()
+                        
+                        if text:
+                            kind = self._classify_block(text, italic, emphasized, has_italic, previous)
+                            previous = (kind, text)
+                            yield kind, text
+                        
+                        if stop:
+                            return
+    
+    def _classify_block(self, text, italic, emphasized, has_italic, previous):
+        key = text.lower()
+        if emphasized and (key == 'grading' or key in SECTION_BY_KEY):
+            return 'heading'
+        if GRADE_RE.match(text):
+            return 'grade'
+        
+        opens_quote = text.startswith(QUOTE_OPENERS)
+        after_quote = previous is not None and previous[0] in ('quote', 'quote_cont')
+        if after_quote and not opens_quote:
+            # Italic text right after a quote continues it. Without italics on
+            # the page, fall back to whether the previous quote was closed.
+            if italic or (not has_italic and not previous[1].endswith(QUOTE_CLOSERS)):
+                return 'quote_cont'
+        if italic or opens_quote:
+            return 'quote'
+        return 'text'
+    
+    @timed_stage('parse_pdf_feedback')
+    def parse_pdf_feedback(self, path, layout=False):
+        """
+        Parse PDF to extract the 3 sections: Evidence and Commentary, Sophistication, Thesis.
+        Each section has: grade, overview, and quote/feedback pairs.
+        With layout=True, structure comes from fonts and text blocks
+        (iter_pdf_blocks) rather than from the plain text lines.
+        """
+        source = self.iter_pdf_blocks(path) if layout else self.iter_pdf_lines(path)
+        if self.timer:
+            source = self.timer.iterate('extract_pdf_text', source)
+        
+        if layout:
+            parser = FeedbackParser()
+            for kind, text in source:
+                parser.feed_block(kind, text)
+            return parser.result()
+        
+        # Pages are read lazily and reading stops at the Document Review section
+        return parse_feedback_lines(source)
+    
+    @timed_stage('parse_docx_content')
+    def parse_docx_content(self, path):
+        """
+        Parse DOCX to extract grading table and essay content.
+        
+        word/document.xml is streamed rather than loading the whole document:
+        only the first table and the paragraphs up to the first stop marker
+        are built, and reading stops as soon as both are done, so appendices
+        after the essay (scan results, AI detection, images) are never read.
+        """
+        rubric = ()
+        
+        # Find essay content (after "Content Review" header)
+        essay_lines = []
+        in_content_review = False
+        essay_done = False
+        table_done = False
         
-        self.setup_ui()
+        with contextlib.closing(iter_docx_body(path)) as body:
+            for elem in body:
+                if elem.tag == W_TBL and not table_done:
+                    # Extract grading table (skip header row per info.md: "4 row 3 column table")
+                    rubric = tuple(RubricRow.from_cells([text.strip() for text in row])
+                                   for row in _table_rows(elem)[1:])
+                    table_done = True
+                elif elem.tag == W_P and not essay_done:
+                    para_text = _paragraph_text(elem)
+                    text = para_text.strip().lower()
+                    
+                    if any(marker in text for marker in DOCX_STOP_MARKERS):
+                        essay_done = True
+                    elif 'content review' in text:
+                        in_content_review = True
+                    elif in_content_review and text:
+                        essay_lines.append(para_text)
+                
+                if essay_done and table_done:
+                    break
+        
+        return EssayReview(rubric, tuple(essay_lines))  # Essay kept as a list of paragraphs
     
-    def setup_ui(self):
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
+    def create_output_folder(self):
+        desktop = Path.home() / "Desktop"
+        date_str = datetime.now().strftime("%d_%b_%Y")
+        folder_name = f"report_data_{date_str}"
+        folder_path = desktop / folder_name
         
-        # PDF section
-        pdf_frame = ttk.LabelFrame(main_frame, text="PDF Files", padding="5")
-        pdf_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        counter = 1
+        while folder_path.exists():
+            counter += 1
+            folder_path = desktop / f"{folder_name}_{counter}"
+        
+        folder_path.mkdir(parents=True, exist_ok=True)
+        return folder_path
+    
+    @timed_stage('create_report')
+    def create_report(self, student_name, essay_title, pdf_data, docx_data, output_path, template=None):
+        """
+        Generate the formatted report document exactly as specified in info.md.
+        All formatting comes from the named styles of the report template (see
+        load_report_template); this only adds text and style references.
+        """
+        from docx import Document
         
-        self.pdf_listbox = tk.Listbox(pdf_frame, height=8, font=("Segoe UI", 10))
-        self.pdf_listbox.pack(fill=tk.BOTH, expand=True)
+        template_bytes, table_prototype, style_ids = load_report_template(template)
+        doc = Document(io.BytesIO(template_bytes))
         
-        ttk.Button(pdf_frame, text="Load PDFs", command=self.load_pdfs).pack(fill=tk.X, pady=(5, 0))
+        def add_paragraph(text='', style=None):
+            # Refer to styles by id; python-docx's lookup by name rescans all styles
+            paragraph = doc.add_paragraph(text)
+            if style:
+                paragraph._p.style = style_ids[style]
+            return paragraph
         
-        # DOCX section
-        docx_frame = ttk.LabelFrame(main_frame, text="DOCX Files", padding="5")
-        docx_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        # Name line (student name from filename)
+        add_paragraph(f"Name: {student_name}")
         
-        self.docx_listbox = tk.Listbox(docx_frame, height=8, font=("Segoe UI", 10))
-        self.docx_listbox.pack(fill=tk.BOTH, expand=True)
+        # Essay line
+        add_paragraph(f"Essay: {essay_title}")
         
-        ttk.Button(docx_frame, text="Load DOCX", command=self.load_docx).pack(fill=tk.X, pady=(5, 0))
+        # Date line (format: 17 February 2026)
+        add_paragraph(f"Date: {report_date()}")
         
-        # Output section
-        output_frame = ttk.LabelFrame(main_frame, text="Generated Reports", padding="5")
-        output_frame.pack(fill=tk.BOTH, expand=True)
+        # One blank line (CR)
+        add_paragraph()
         
-        self.output_listbox = tk.Listbox(output_frame, height=6, font=("Segoe UI", 10))
-        self.output_listbox.pack(fill=tk.BOTH, expand=True)
+        # ===== ESSAY SECTION FIRST =====
+        add_paragraph("ESSAY", style=STYLE_HEADING)
         
-        ttk.Button(main_frame, text="Process All", command=self.process_all).pack(fill=tk.X, pady=(10, 0))
+        # Essay content (preserved exactly, paragraph by paragraph with soft return after each)
+        if docx_data.essay:
+            for para_text in docx_data.essay:
+                add_paragraph().add_run(para_text).add_break()
         
-        # Status bar
-        self.status_var = tk.StringVar(value="Ready")
-        ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W).pack(fill=tk.X, side=tk.BOTTOM, padx=5, pady=5)
+        # Two blank lines after essay
+        add_paragraph()
+        add_paragraph()
+        
+        # ===== TABLE SECTION =====
+        # AP Rubric heading - its style keeps it on the same page as the table
+        add_paragraph("AP RUBRIC", style=STYLE_TABLE_HEADING)
+        
+        # Table from DOCX (4 rows, 3 columns), cloned from the template's table
+        if docx_data.rubric:
+            table_data = order_table_rows(docx_data.rubric)
+            
+            tbl = copy.deepcopy(table_prototype)
+            row_prototype = tbl.tr_lst[-1]
+            tbl.remove(row_prototype)
+            first_row = len(tbl.tr_lst)     # rows above the prototype (e.g. a header) are kept
+            for _ in table_data:
+                tbl.append(copy.deepcopy(row_prototype))
+            doc.element.body._insert_tbl(tbl)
+            
+            table = doc.tables[-1]
+            num_cols = len(table.columns)
+            for i, row_data in enumerate(table_data):
+                cells = table.rows[first_row + i].cells
+                for j, cell_text in enumerate(row_data[:num_cols]):
+                    paragraph = cells[j].paragraphs[0]
+                    paragraph.add_run(cell_text)
+                    # Rows keep with the next one so the table stays together; the last row doesn't
+                    if i == len(table_data) - 1:
+                        paragraph._p.style = style_ids[STYLE_TABLE_TEXT_LAST]
+        
+        # Two blank lines after table
+        add_paragraph()
+        add_paragraph()
+        
+        # ===== QUOTES AND FEEDBACK SECTION =====
+        # Order: Overall, Thesis, Evidence and Commentary, Sophistication
+        section_order = ['Overall', 'Thesis', 'Evidence and Commentary', 'Sophistication']
+        
+        # Build a dict for easy lookup
+        sections_by_name = {}
+        for section in pdf_data.sections:
+            sections_by_name[section.name] = section
+        
+        # Overall Grade section (heading only - overview is in table)
+        if pdf_data.overall_grade:
+            add_paragraph(f"OVERALL: {pdf_data.overall_grade}", style=STYLE_HEADING)
+            
+            # Blank paragraph after overall section
+            add_paragraph()
+        
+        # Remaining sections in order: Thesis, Evidence and Commentary, Sophistication
+        for sec_name in section_order[1:]:  # Skip 'Overall' as it's handled above
+            section = sections_by_name.get(sec_name)
+            if not section:
+                continue
+            
+            # Section heading with grade
+            add_paragraph(f"{section.name}: {section.grade}", style=STYLE_SECTION_HEADING)
+            
+            # Skip overview (redundant with table) - go straight to quotes and feedback
+            first_quote = True
+            for item in section.quotes:
+                # Quote paragraph in italics (first one sits closer to the heading)
+                add_paragraph(item.quote, style=STYLE_FIRST_QUOTE if first_quote else STYLE_QUOTE)
+                first_quote = False
+                
+                # Feedback as indented block paragraph (tight spacing)
+                if item.feedback:
+                    add_paragraph(item.feedback, style=STYLE_FEEDBACK)
+            
+            # Paragraph break between sections
+            add_paragraph()
+        
+        with self.timer.stage('save') if self.timer else contextlib.nullcontext():
+            doc.save(output_path)
     
-    def load_pdfs(self):
-        files = filedialog.askopenfilenames(title="Select PDF Files", filetypes=[("PDF Files", "*.pdf")])
-        for f in files:
-            name = os.path.basename(f)
-            self.pdf_files[name] = f
-            if name not in self.pdf_listbox.get(0, tk.END):
-                self.pdf_listbox.insert(tk.END, name)
-        self.status_var.set(f"Loaded {len(files)} PDF file(s)")
+    def load_folder(self, pdf_dir, docx_dir=None):
+        """
+        Load every PDF and DOCX from folders (headless counterpart of the Load
+        buttons). Either may also be a .zip archive, whose files are then read
+        from the archive directly instead of being extracted first.
+        """
+        self._load_files(pdf_dir, '.pdf', self.add_pdf)
+        self._load_files(docx_dir or pdf_dir, '.docx', self.add_docx)
     
-    def load_docx(self):
-        files = filedialog.askopenfilenames(title="Select DOCX Files", filetypes=[("Word Documents", "*.docx")])
-        for f in files:
-            name = os.path.basename(f)
-            self.docx_files[name] = f
-            if name not in self.docx_listbox.get(0, tk.END):
-                self.docx_listbox.insert(tk.END, name)
-        self.status_var.set(f"Loaded {len(files)} DOCX file(s)")
+    def _load_files(self, source, suffix, add):
+        if os.path.isfile(source):
+            with zipfile.ZipFile(source) as archive:
+                members = sorted(info.filename for info in archive.infolist() if not info.is_dir())
+            # Skip the resource forks macOS adds to archives it creates
+            files = [(posixpath.basename(member), ArchiveMember(str(source), member))
+                     for member in members if not member.startswith('__MACOSX/')]
+        else:
+            files = [(name, os.path.join(source, name)) for name in sorted(os.listdir(source))]
+        
+        for name, path in files:
+            # Skip Word lock files like "~$ylor_ Light pollution_review.docx"
+            if name.lower().endswith(suffix) and not name.startswith('~$'):
+                add(path)
     
-    def extract_pdf_text(self, path):
+    def build_jobs(self, output_folder, options=None):
+        """
+        Match each loaded PDF to its DOCX and describe the report to write.
+        Returns (jobs, warnings); each job is a plain dict for process_student.
+        options are run-wide settings copied into every job (e.g. cache_dir).
+        """
+        options = dict(options or {})
+        match = self.match_index.match()
+        warnings = self.match_index.warnings(match)
+        
+        # A student with several PDFs (different assignments) gets the title in
+        # the report name so the reports don't overwrite each other
+        pdfs_per_student = defaultdict(int)
+        for student_name, _, _ in self.match_index.pdfs.values():
+            pdfs_per_student[normalize_key(student_name)] += 1
+        
+        jobs = []
+        for pdf_name, docx_name in match['pairs']:
+            student_name, essay_title, pdf_path = self.match_index.pdfs[pdf_name]
+            docx_path = self.docx_files[docx_name] if docx_name else None
+            
+            if pdfs_per_student[normalize_key(student_name)] > 1:
+                output_name = f"{student_name}_{essay_title}_report.docx"
+            else:
+                output_name = f"{student_name}_report.docx"
+            
+            jobs.append({
+                'pdf_name': pdf_name,
+                'pdf_path': input_source(pdf_path),
+                'docx_path': input_source(docx_path) if docx_path else None,
+                'student_name': student_name,
+                'essay_title': essay_title,
+                'output_name': output_name,
+                'output_path': str(Path(output_folder) / output_name),
+                'options': options,
+            })
+        
+        return jobs, warnings
+    
+    def process_all(self):
+        if not self.pdf_files:
+            messagebox.showwarning("No Files", "Please load PDF files first.")
+            return
+        
+        self.start_batch(self.create_output_folder())
+    
+    def update_folder(self):
+        """Incrementally refresh an existing report folder."""
+        if not self.pdf_files:
+            messagebox.showwarning("No Files", "Please load PDF files first.")
+            return
+        
+        folder = filedialog.askdirectory(title="Select Report Folder to Update")
+        if folder:
+            self.start_batch(Path(folder), incremental=True)
+    
+    def process_combined(self):
+        """Write every report into one class document (optionally with a PDF copy)."""
+        if not self.pdf_files:
+            messagebox.showwarning("No Files", "Please load PDF files first.")
+            return
+        
+        docx_path = filedialog.asksaveasfilename(title="Save Class Report As", defaultextension=".docx",
+                                                 initialfile="class_report.docx",
+                                                 filetypes=[("Word files", "*.docx")])
+        if not docx_path:
+            return
+        
+        pdf_path = None
+        if messagebox.askyesno("Class Report", "Also save a PDF copy of the class report?"):
+            pdf_path = str(Path(docx_path).with_suffix('.pdf'))
+        
+        self.start_batch(Path(docx_path).parent, combined=(docx_path, pdf_path))
+    
+    def start_batch(self, output_folder, incremental=False, combined=None, only=None):
+        """Start generating reports in the background; only limits it to those PDF names."""
+        self.output_folder = output_folder
+        self.output_list.clear()
+        self.output_files.clear()
+        
+        options = {'cache_dir': str(self.cache.folder), 'layout': self.layout_var.get(),
+                   'template': self.template_path, 'timing': self.timing_var.get(),
+                   'results_db': str(DEFAULT_RESULTS_DB), 'timeout': DEFAULT_JOB_TIMEOUT,
+                   'memory_limit': DEFAULT_MEMORY_LIMIT_MB,
+                   'similarity': DEFAULT_SIMILARITY_THRESHOLD if self.similarity_var.get() and not combined else None}
+        jobs, self.batch_errors = self.build_jobs(self.output_folder, options)
+        if only is not None:
+            jobs = [job for job in jobs if job['pdf_name'] in only]
+        self.failed_pdfs = []
+        self.error_log = None
+        self.similar_essays = None
+        self.batch_total = len(jobs)
+        self.batch_processed = 0
+        self.batch_done = 0
+        
+        self.progress.configure(maximum=max(len(jobs), 1), value=0)
+        self.process_button.configure(state=tk.DISABLED)
+        self.update_button.configure(state=tk.DISABLED)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.status_var.set(f"Processing 0 of {len(jobs)}...")
+        
+        # Parse and write on a background thread; results come back through the queue
+        self.cancel_event.clear()
+        worker = threading.Thread(target=self._batch_worker, args=(jobs, incremental, combined), daemon=True)
+        worker.start()
+        self.root.after(100, self._poll_results)
+    
+    def cancel_processing(self):
+        """Stop scheduling new reports; ones already in progress still finish."""
+        self.cancel_event.set()
+        self.cancel_button.configure(state=tk.DISABLED)
+        self.status_var.set("Cancelling...")
+    
+    def _batch_worker(self, jobs, incremental, combined=None):
+        """Runs off the Tk thread. Never touches widgets, only the queue."""
+        failures = []
         try:
-            doc = fitz.open(path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
+            if combined:
+                docx_path, pdf_path = combined
+                
+                def added(job, error):
+                    if error:
+                        failures.append((job, error))
+                    self.results_queue.put(('result', None if error else {'status': 'added'}, error))
+                
+                write_class_report(jobs, docx_path, pdf_path, cancel=self.cancel_event,
+                                   template=self.template_path, on_result=added)
+                for path in filter(None, combined):
+                    self.results_queue.put(('result', {'status': 'class', 'output_name': Path(path).name,
+                                                       'output_path': path}, None))
+            else:
+                timings = []
+                for job, result, error in generate_reports(jobs, self.output_folder, incremental,
+                                                           cancel=self.cancel_event):
+                    if job is not None and job['options'].get('timing'):
+                        timings.append(timing_record(job, result, error))
+                    if error:
+                        failures.append((job, error))
+                    self.results_queue.put(('result', result, error))
+                if timings:
+                    write_timing_report(timings, self.output_folder)
+                if jobs and jobs[0]['options'].get('similarity') is not None:
+                    self.similar_essays = flag_similar_essays(self.output_folder, jobs[0]['options']['similarity'])
+                self.failed_pdfs = [job['pdf_name'] for job, _ in failures]
+            self.error_log = write_error_log(failures, self.output_folder)
         except Exception as e:
-            return f"Error: {e}"
+            self.results_queue.put(('result', None, str(e)))
+        self.cache.prune()
+        self.results_queue.put(('done', None, None))
     
-    def parse_filename(self, filename):
-        """Extract student name and essay title from filename."""
-        base = os.path.splitext(filename)[0]
-        parts = re.split(r'_\s*', base)
+    def _poll_results(self):
+        """Apply finished reports to the UI as they arrive."""
+        while True:
+            try:
+                kind, result, error = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            if kind == 'done':
+                self._finish_batch()
+                return
+            
+            if error:
+                self.batch_errors.append(error)
+            elif result['status'] == 'removed':
+                continue
+            elif result['status'] == 'class':
+                # The combined document itself; its students were already counted
+                self.output_files[result['output_name']] = result['output_path']
+                self.output_list.add(result['output_name'])
+                continue
+            elif result['status'] == 'added':
+                self.batch_processed += 1
+            else:
+                self.output_files[result['output_name']] = result['output_path']
+                self.output_list.add(result['output_name'])
+                self.batch_processed += 1
+            
+            self.batch_done += 1
+            self.progress.configure(value=self.batch_done)
+            if not self.cancel_event.is_set():
+                self.status_var.set(f"Processing {self.batch_done} of {self.batch_total}...")
         
-        if len(parts) >= 2:
-            student_name = parts[0].strip()
-            title_parts = parts[1:-1] if len(parts) > 2 else [parts[1]]
-            essay_title = ' '.join(title_parts).strip()
-            essay_title = re.sub(r'\s*review\s*$', '', essay_title, flags=re.IGNORECASE)
-            essay_title = essay_title.title()
-            return student_name, essay_title
+        self.root.after(100, self._poll_results)
+    
+    def _finish_batch(self):
+        self.process_button.configure(state=tk.NORMAL)
+        self.update_button.configure(state=tk.NORMAL)
+        self.cancel_button.configure(state=tk.DISABLED)
         
-        return base, "Unknown"
+        processed = self.batch_processed
+        errors = self.batch_errors
+        
+        if self.cancel_event.is_set():
+            title = "Cancelled"
+            status = f"Cancelled after {processed} of {self.batch_total} file(s). Saved to {self.output_folder}"
+        else:
+            title = "Complete"
+            status = f"Processed {processed} file(s). Saved to {self.output_folder}"
+        self.status_var.set(status)
+        
+        msg = f"Generated {processed} report(s).\n\nSaved to:\n{self.output_folder}"
+        if errors:
+            msg += "\n\nWarnings:\n" + "\n".join(errors[:5])
+            if len(errors) > 5:
+                msg += f"\n...and {len(errors) - 5} more"
+        if self.error_log:
+            msg += f"\n\nFull details of the failed reports are in:\n{self.error_log}"
+        if self.similar_essays:
+            pairs, path = self.similar_essays
+            msg += f"\n\n{len(pairs)} pair(s) of similar essays flagged, listed in:\n{path}"
+        
+        if self.failed_pdfs and not self.cancel_event.is_set():
+            if messagebox.askyesno(title, f"{msg}\n\nRetry the {len(self.failed_pdfs)} failed report(s)?"):
+                self.start_batch(self.output_folder, only=set(self.failed_pdfs))
+            return
+        messagebox.showinfo(title, msg)
+
+
+def parse_student(job, timer=None, pdf_bytes=None, docx_bytes=None):
+    """
+    Parse one student's PDF/DOCX pair (through the parse cache if the job's
+    options name one). Returns (pdf_data, docx_data); runs in worker processes.
+    The files are read from their paths unless their bytes are passed in.
+    """
+    if timer is None and _stage_slot is not None:
+        timer = StageTimer(_publish_stage)
+    ep = EssayProcessor()
+    ep.timer = timer
+    options = job.get('options', {})
+    
+    layout = bool(options.get('layout'))
+    parse_pdf = lambda path: ep.parse_pdf_feedback(path, layout=layout)
+    parse_docx = ep.parse_docx_content
+    
+    if options.get('cache_dir'):
+        cache = ParseCache(options['cache_dir'])
+        pdf_kind = 'pdf-layout' if layout else 'pdf'
+        parse_pdf = lambda path, parser=parse_pdf: cache.parse(pdf_kind, path, parser, job.get('pdf_hash'),
+                                                               StudentFeedback)
+        parse_docx = lambda path: cache.parse('docx', path, ep.parse_docx_content, job.get('docx_hash'),
+                                              EssayReview)
+    
+    # Archive members are read once here rather than once to hash and once to parse
+    if pdf_bytes is None and isinstance(job['pdf_path'], ArchiveMember):
+        pdf_bytes = read_input(job['pdf_path'])
+    if docx_bytes is None and isinstance(job['docx_path'], ArchiveMember):
+        docx_bytes = read_input(job['docx_path'])
+    
+    pdf_data = parse_pdf(job['pdf_path'] if pdf_bytes is None else pdf_bytes)
+    
+    docx_data = EssayReview()
+    if job['docx_path']:
+        docx_data = parse_docx(job['docx_path'] if docx_bytes is None else docx_bytes)
+    
+    return pdf_data, docx_data
+
+
+def build_report(job, pdf_data, docx_data):
+    """Build a student's report from parsed data and return the .docx bytes."""
+    options = job.get('options', {})
+    output = io.BytesIO()
+    if options.get('fast_writer'):
+        write_report_xml(job['student_name'], job['essay_title'], pdf_data, docx_data, output,
+                         template=options.get('template'))
+    else:
+        EssayProcessor().create_report(job['student_name'], job['essay_title'], pdf_data, docx_data, output,
+                                       template=options.get('template'))
+    return output.getvalue()
+
+
+def report_extras(job, pdf_data, docx_data):
+    """
+    What the job's options ask workers to send back besides the report:
+    'grades' for the results database and the essay's 'essay_signature'
+    for the similarity check.
+    """
+    options = job.get('options', {})
+    extras = {}
+    if options.get('results_db'):
+        extras['grades'] = grade_summary(pdf_data, docx_data)
+    if options.get('similarity') is not None:
+        extras['essay_signature'] = essay_signature(docx_data.essay)
+    return extras
+
+
+def render_student(job):
+    """Like process_student, but returns the report's bytes instead of writing a file."""
+    with job_timer(job.get('options', {})) as timer:
+        pdf_data, docx_data = parse_student(job, timer)
+        with timer.stage('create_report') if timer else contextlib.nullcontext():
+            content = build_report(job, pdf_data, docx_data)
+    result = {
+        'status': 'written',
+        'output_name': job['output_name'],
+        'output_path': job['output_path'],
+        'content': content,
+    }
+    result.update(report_extras(job, pdf_data, docx_data))
+    return result
+
+
+def process_student(job):
+    """
+    Parse one student's PDF/DOCX pair and write their report.
+    Runs inside worker processes, so it takes and returns plain dicts.
+    """
+    options = job.get('options', {})
+    
+    # With the timing option, stage times and memory peaks go back in the result
+    with job_timer(options) as timer:
+        start = time.perf_counter()
+        
+        ep = EssayProcessor()
+        ep.timer = timer
+        pdf_data, docx_data = parse_student(job, timer)
+        
+        if options.get('fast_writer'):
+            with timer.stage('create_report') if timer else contextlib.nullcontext():
+                write_report_xml(job['student_name'], job['essay_title'], pdf_data, docx_data, job['output_path'],
+                                 template=options.get('template'))
+        else:
+            ep.create_report(job['student_name'], job['essay_title'], pdf_data, docx_data, job['output_path'],
+                             template=options.get('template'))
+    
+    result = {
+        'status': 'written',
+        'output_name': job['output_name'],
+        'output_path': job['output_path'],
+    }
+    if options.get('timing'):
+        result['seconds'] = round(time.perf_counter() - start, 6)
+        result['stages'] = timer.summary()
+    result.update(report_extras(job, pdf_data, docx_data))
+    return result
+
+
+def run_batch(jobs, workers=None, cancel=None, task=process_student, ordered=False):
+    """
+    Process jobs and yield (job, result, error) as each report finishes.
+    workers=1 runs in-process; otherwise jobs are spread over a process pool
+    (defaults to one worker per CPU) and results arrive in completion order,
+    or in job order with ordered=True (still only a few jobs ahead, so
+    results never pile up waiting for a slow one).
+    Setting the optional cancel Event stops new jobs from being scheduled;
+    jobs already handed to a worker still finish and are yielded.
+    task is the module-level function run on each job (picklable).
+    If the jobs' options set a timeout or memory_limit, they run through
+    run_isolated instead (even with workers=1), so those can be enforced.
+    Errors are JobFailures.
+    """
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+    
+    options = jobs[0].get('options', {}) if jobs else {}
+    if options.get('timeout') or options.get('memory_limit'):
+        yield from run_isolated(jobs, workers, cancel, task, ordered, options.get('timeout'),
+                                options.get('memory_limit'))
+        return
+    
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            if cancelled():
+                return
+            start = time.perf_counter()
+            try:
+                yield job, task(job), None
+            except Exception as e:
+                yield job, None, job_failure(job, e, seconds=time.perf_counter() - start)
+        return
+    
+    workers = workers or os.cpu_count() or 1
+    pending = iter(jobs)
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only keep a couple of jobs queued per worker so a cancel takes effect quickly
+        running = {pool.submit(task, job): job for job in itertools.islice(pending, workers * 2)}
+        
+        while running:
+            if ordered:
+                done = [next(iter(running))]    # dicts keep submission order
+                wait(done)
+            else:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    yield job, future.result(), None
+                except Exception as e:
+                    yield job, None, job_failure(job, e)
+                
+                if not cancelled():
+                    next_job = next(pending, None)
+                    if next_job is not None:
+                        running[pool.submit(task, next_job)] = next_job
+
+
+DEFAULT_JOB_TIMEOUT = 120           # seconds one student's report may take
+DEFAULT_MEMORY_LIMIT_MB = 1024      # address space per worker process
+
+
+def isolated_worker(conn, task, memory_limit, stage_slot, initializer=None, initargs=()):
+    """
+    Worker process of run_isolated and IsolatedPool: runs task on each job
+    received on conn and sends back ('ok', result), ('error', (message,
+    traceback)) or ('memory', None), until it receives None. memory_limit
+    (MB) caps the process's address space where the OS supports it (not on
+    Windows). With an initializer, it is run first and ('ready', pid) sent.
+    """
+    global _stage_slot
+    _stage_slot = stage_slot
+    
+    if memory_limit:
+        try:
+            import resource
+        except ImportError:
+            resource = None
+        if resource is not None:
+            limit = memory_limit * 1024 * 1024
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    
+    if initializer:
+        initializer(*initargs)
+        conn.send(('ready', os.getpid()))
+    
+    while (job := conn.recv()) is not None:
+        stage_slot.value = b''
+        try:
+            conn.send(('ok', task(job)))
+        except MemoryError:
+            conn.send(('memory', None))
+        except Exception as e:
+            conn.send(('error', (str(e), traceback.format_exc())))
+
+
+class IsolatedWorker:
+    """An isolated worker process and the job it is running, if any."""
+    
+    def __init__(self, context, task, memory_limit=None, initializer=None, initargs=()):
+        self.memory_limit = memory_limit
+        self.stage = context.Array('c', 64, lock=False)
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=isolated_worker, daemon=True,
+                                       args=(child, task, memory_limit, self.stage, initializer, initargs))
+        self.process.start()
+        child.close()
+        self.job = self.index = self.started = None
+    
+    def wait_ready(self):
+        """Wait for the initializer to finish; raises RuntimeError if the worker died in it."""
+        try:
+            self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join()
+            raise RuntimeError(f"Worker process failed to start (exit code {self.process.exitcode})")
+    
+    def submit(self, index, job):
+        self.index, self.job, self.started = index, job, time.monotonic()
+        self.conn.send(job)
+    
+    def outcome(self):
+        """
+        (result, error) of the submitted job, once conn is readable. A
+        worker that crashed is no longer alive afterwards and must be
+        replaced; one that raised (even MemoryError) can take another job.
+        """
+        try:
+            status, value = self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join()
+            return None, self.failure('crashed', f"worker process crashed (exit code {self.process.exitcode}) "
+                                                 f"during {self.current_stage()}")
+        if status == 'ok':
+            return value, None
+        if status == 'memory':
+            return None, self.failure('memory', f"ran out of memory (limit {self.memory_limit} MB) "
+                                                f"during {self.current_stage()}")
+        return None, self.failure('error', *value)
+    
+    def timed_out(self, timeout):
+        """The JobFailure for a job still running after timeout seconds; kills the worker."""
+        error = self.failure('timeout', f"timed out after {timeout:g} s during {self.current_stage()}")
+        self.kill()
+        return error
+    
+    def failure(self, kind, message, details=''):
+        return JobFailure(f"{self.job['pdf_name']}: {message}", kind, self.current_stage(), self.elapsed(), details)
+    
+    def current_stage(self):
+        return self.stage.value.decode() or 'start'
+    
+    def elapsed(self):
+        return round(time.monotonic() - self.started, 3)
+    
+    def alive(self):
+        return self.process.is_alive()
+    
+    def stop(self):
+        """Ask an idle worker to exit, killing it if it doesn't."""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+    
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+
+def run_isolated(jobs, workers=None, cancel=None, task=process_student, ordered=False, timeout=None,
+                 memory_limit=None):
+    """
+    run_batch with every job isolated: each worker process runs one job at
+    a time, a job still running after timeout seconds has its worker killed
+    and replaced, and workers' memory is capped at memory_limit MB. A job
+    that hangs, runs out of memory or crashes its worker (e.g. inside
+    PyMuPDF) fails on its own with a JobFailure giving the kind, stage and
+    duration, and the batch carries on, so no input can hold it up for
+    longer than the timeout. Yields (job, result, error) like run_batch.
+    """
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+    
+    context = multiprocessing.get_context()
+    pending = deque(enumerate(jobs))
+    idle = [IsolatedWorker(context, task, memory_limit)
+            for _ in range(min(workers or os.cpu_count() or 1, len(jobs)))]
+    slots = len(idle)
+    busy = {}           # connection -> worker
+    finished = {}       # index -> (job, result, error), held back for ordered results
+    next_index = 0
+    
+    def release(worker):
+        if worker.alive():
+            idle.append(worker)
+            return
+        worker.kill()
+        if pending and not cancelled():
+            idle.append(IsolatedWorker(context, task, memory_limit))
+    
+    try:
+        while True:
+            # Ordered runs only start jobs a few places past the oldest one not yet yielded
+            while idle and pending and not cancelled() and (not ordered or pending[0][0] < next_index + slots * 2):
+                worker = idle.pop()
+                worker.submit(*pending.popleft())
+                busy[worker.conn] = worker
+            if not busy:
+                return
+            
+            wait_for = None
+            if timeout:
+                wait_for = max(0.0, min(worker.started for worker in busy.values()) + timeout - time.monotonic())
+            
+            outcomes = []
+            for conn in multiprocessing.connection.wait(list(busy), wait_for):
+                worker = busy.pop(conn)
+                outcomes.append((worker.index, (worker.job, *worker.outcome())))
+                release(worker)
+            
+            if timeout:
+                now = time.monotonic()
+                for conn, worker in list(busy.items()):
+                    if now - worker.started >= timeout:
+                        del busy[conn]
+                        outcomes.append((worker.index, (worker.job, None, worker.timed_out(timeout))))
+                        release(worker)
+            
+            for index, outcome in outcomes:
+                if not ordered:
+                    yield outcome
+                    continue
+                finished[index] = outcome
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+    finally:
+        for worker in idle:
+            worker.stop()
+        for worker in busy.values():
+            worker.kill()
+
+
+class IsolatedPool:
+    """
+    Long-lived, warmed-up isolated workers shared by several threads (the
+    report server's requests). run() borrows an idle worker for one job, so
+    a job that hangs past the timeout or crashes its worker only fails
+    itself: that worker is killed and a fresh one started (and warmed by
+    initializer) in its place, and the pool keeps serving.
+    """
+    
+    def __init__(self, size, task, timeout=None, memory_limit=None, initializer=None, initargs=()):
+        self.task = task
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.initializer, self.initargs = initializer, initargs
+        self.context = multiprocessing.get_context()
+        self.idle = queue.Queue()
+        self.busy = set()
+        self.lock = threading.Lock()
+        self.closed = False
+        
+        # Start them all before waiting, so they warm up side by side
+        workers = [self._new_worker(ready=False) for _ in range(size)]
+        for worker in workers:
+            if self.initializer:
+                worker.wait_ready()
+            self.idle.put(worker)
+    
+    def _new_worker(self, ready=True):
+        worker = IsolatedWorker(self.context, self.task, self.memory_limit, self.initializer, self.initargs)
+        if ready and self.initializer:
+            worker.wait_ready()
+        return worker
+    
+    def run(self, job):
+        """Run task on job in the next free worker and return (result, error), like one run_batch result."""
+        worker = self.idle.get()
+        try:
+            if not worker.alive():      # died while idle, or its replacement couldn't be started
+                worker.kill()
+                worker = self._new_worker()
+            with self.lock:
+                self.busy.add(worker)
+            worker.submit(0, job)
+            if worker.conn.poll(self.timeout):
+                return worker.outcome()
+            return None, worker.timed_out(self.timeout)
+        finally:
+            with self.lock:
+                self.busy.discard(worker)
+            self._release(worker)
+    
+    def _release(self, worker):
+        """
+        Put a worker back, replacing it first if it died. Never raises, so a
+        job's own outcome isn't masked: if the replacement fails to start,
+        the dead worker goes back instead and the next run() retries.
+        """
+        if self.closed:
+            worker.stop()
+            return
+        if not worker.alive():
+            worker.kill()
+            try:
+                worker = self._new_worker()
+            except (OSError, RuntimeError):
+                pass
+        self.idle.put(worker)
+    
+    def close(self):
+        """Stop the idle workers and kill the busy ones (their jobs fail as crashed)."""
+        self.closed = True
+        with self.lock:
+            busy = list(self.busy)
+        for worker in busy:
+            if worker.process.is_alive():
+                worker.process.kill()
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+# Threads for the pipeline's read and write stages; enough to keep several
+# requests in flight on a network share
+PIPELINE_IO_THREADS = 4
+
+_PIPELINE_DONE = object()
+
+
+def _write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def run_call(call):
+    """IsolatedPool task for the pipeline: call['call'] is a (function, args) pair to run."""
+    function, args = call['call']
+    return function(*args)
+
+
+class IsolatedJobError(Exception):
+    """A pipeline job that failed in an isolated worker; failure is its JobFailure."""
     
-    def _join_lines(self, lines):
-        """Join lines, removing end-of-line hyphens."""
-        if not lines:
-            return ''
-        
-        result = lines[0]
-        for i in range(1, len(lines)):
-            line = lines[i]
-            # If previous line ends with hyphen and this line starts with lowercase
-            if result.endswith('-') and line and line[0].islower():
-                # Remove hyphen and join without space
-                result = result[:-1] + line
-            else:
-                # Normal join with space
-                result = result + ' ' + line
+    def __init__(self, failure):
+        super().__init__(failure)
+        self.failure = failure
+
+
+async def pipeline_results(jobs, workers=None, cancel=None, queue_size=None):
+    """
+    Asynchronous counterpart of run_batch. Each report goes through four
+    stages joined by bounded queues: read the input bytes (thread pool),
+    parse them and build the report (process pool, one stage each), and
+    write the file (thread pool). Stages overlap, so reading and writing
+    hide behind parsing, and a full queue pauses the stage feeding it, so
+    only about queue_size files per stage are ever held in memory.
+    Yields (job, result, error) in completion order. Setting cancel drops
+    jobs not yet parsed; ones already parsed are still written. Jobs
+    without a pdf_hash/docx_hash get them from the bytes read. If the jobs'
+    options set a timeout or memory_limit, parsing and building run in an
+    IsolatedPool instead of a process pool, so each is held to them (the
+    timeout applies to the two separately).
+    """
+    import asyncio
+    
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or workers * 2
+    
+    to_read, to_parse, to_build, to_write, results = (asyncio.Queue(queue_size) for _ in range(5))
+    
+    async def read(job):
+        pdf_bytes = await loop.run_in_executor(io_pool, read_input, job['pdf_path'])
+        docx_bytes = None
+        if job['docx_path']:
+            docx_bytes = await loop.run_in_executor(io_pool, read_input, job['docx_path'])
+        if 'pdf_hash' not in job:
+            job['pdf_hash'] = hashlib.sha256(pdf_bytes).hexdigest()
+            job['docx_hash'] = hashlib.sha256(docx_bytes).hexdigest() if docx_bytes is not None else None
+        return job, pdf_bytes, docx_bytes
+    
+    async def on_cpu(job, function, *args):
+        if isolated is None:
+            return await loop.run_in_executor(cpu_pool, function, *args)
+        result, error = await loop.run_in_executor(cpu_pool, isolated.run,
+                                                   {'pdf_name': job['pdf_name'], 'call': (function, args)})
+        if error:
+            raise IsolatedJobError(error)
         return result
     
-    def _is_quote_complete(self, line):
-        """Check if a line ends a quote (ends with closing quote mark)."""
-        line = line.rstrip()
-        # Quote is complete if it ends with " or " (possibly followed by punctuation)
-        if line.endswith('"') or line.endswith('"'):
-            return True
-        if line.endswith('."') or line.endswith(',"') or line.endswith('?"'):
-            return True
-        if line.endswith('."') or line.endswith(',"') or line.endswith('?"'):
-            return True
-        return False
+    async def parse(job, pdf_bytes, docx_bytes):
+        data = await on_cpu(job, functools.partial(parse_student, job, pdf_bytes=pdf_bytes, docx_bytes=docx_bytes))
+        return job, data
+    
+    async def build(job, data):
+        return job, await on_cpu(job, build_report, job, *data), report_extras(job, *data)
     
-    def parse_pdf_feedback(self, path):
+    async def write(job, content, extras):
+        await loop.run_in_executor(io_pool, _write_bytes, job['output_path'], content)
+        result = {'status': 'written', 'output_name': job['output_name'], 'output_path': job['output_path']}
+        result.update(extras)
+        return job, result, None
+    
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+    
+    async def stage(work, inbox, outbox, tasks, consumers, cancellable=False):
         """
-        Parse PDF to extract the 3 sections: Evidence and Commentary, Sophistication, Thesis.
-        Each section has: grade, overview, and quote/feedback pairs.
+        Run `tasks` copies of work over inbox; failures go straight to
+        results. Once cancelled, a cancellable stage drops what is queued.
         """
-        text = self.extract_pdf_text(path)
-        
-        # Stop at Document Review section
-        main_text = re.split(r'Document Review|Spelling and Grammar', text, flags=re.IGNORECASE)[0]
-        
-        lines = main_text.split('\n')
-        
-        # Filter out page headers and empty lines, but keep track of content
-        cleaned_lines = []
-        for line in lines:
-            stripped = line.strip()
-            # Skip page headers like "Page 1 of 5" or filename repeats
-            if re.match(r'^Page \d+ of \d+$', stripped):
-                continue
-            if re.match(r'^[A-Za-z]+_\s+.*_review$', stripped, re.IGNORECASE):
-                continue
-            if stripped:
-                cleaned_lines.append(stripped)
-        
-        lines = cleaned_lines
-        
-        # Section headers we care about (in order they appear)
-        section_names = ['Evidence and Commentary', 'Sophistication', 'Thesis']
-        
-        data = {
-            'overall_grade': '',
-            'overall_overview': '',
-            'sections': []
-        }
+        async def worker():
+            while (item := await inbox.get()) is not _PIPELINE_DONE:
+                job = item[0]
+                if cancellable and cancelled():
+                    continue
+                try:
+                    output = await work(*item)
+                except IsolatedJobError as e:
+                    await results.put((job, None, e.failure))
+                except Exception as e:
+                    await results.put((job, None, job_failure(job, e)))
+                else:
+                    await outbox.put(output)
         
-        # First, extract the overall grade (comes before "Evidence and Commentary")
-        # Look for "Grading" header followed by grade and overview
-        for i, line in enumerate(lines):
-            if line.lower() == 'grading':
-                # Next line should be the grade
-                if i + 1 < len(lines) and re.match(r'^\d+/\d+$', lines[i + 1]):
-                    data['overall_grade'] = lines[i + 1]
-                    # Collect overview until we hit a section header
-                    overview_lines = []
-                    j = i + 2
-                    while j < len(lines):
-                        if lines[j] in section_names:
-                            break
-                        overview_lines.append(lines[j])
-                        j += 1
-                    data['overall_overview'] = self._join_lines(overview_lines)
+        await asyncio.gather(*(worker() for _ in range(tasks)))
+        for _ in range(consumers):
+            await outbox.put(_PIPELINE_DONE)
+    
+    async def feed():
+        for job in jobs:
+            if cancelled():
                 break
+            await to_read.put((job,))
+        for _ in range(PIPELINE_IO_THREADS):
+            await to_read.put(_PIPELINE_DONE)
+    
+    io_pool = ThreadPoolExecutor(PIPELINE_IO_THREADS)
+    options = jobs[0].get('options', {}) if jobs else {}
+    isolated = None
+    if options.get('timeout') or options.get('memory_limit'):
+        # Threads wait on the isolated workers, one per worker
+        isolated = IsolatedPool(workers, run_call, options.get('timeout'), options.get('memory_limit'))
+        cpu_pool = ThreadPoolExecutor(workers)
+    else:
+        cpu_pool = ProcessPoolExecutor(max_workers=workers)
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in [
+        feed(),
+        stage(read, to_read, to_parse, PIPELINE_IO_THREADS, workers, cancellable=True),
+        stage(parse, to_parse, to_build, workers, workers, cancellable=True),
+        stage(build, to_build, to_write, workers, PIPELINE_IO_THREADS),
+        stage(write, to_write, results, PIPELINE_IO_THREADS, 1),
+    ]]
+    try:
+        while (item := await results.get()) is not _PIPELINE_DONE:
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        io_pool.shutdown(cancel_futures=True)
+        if isolated:
+            isolated.close()
+        cpu_pool.shutdown(cancel_futures=True)
+
+
+def run_pipeline(jobs, workers=None, cancel=None, queue_size=None):
+    """
+    pipeline_results as a plain generator, a drop-in for run_batch. The
+    event loop only runs while the caller waits for the next result, so a
+    slow consumer pauses the whole pipeline rather than letting it run ahead.
+    """
+    import asyncio
+    
+    loop = asyncio.new_event_loop()
+    results = pipeline_results(jobs, workers, cancel, queue_size)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.close()
+
+
+def generate_reports(jobs, output_folder, incremental=False, workers=None, cancel=None, remove_orphans=True,
+                     pipeline=False):
+    """
+    run_batch plus the output folder's manifest. Yields (job, result, error)
+    like run_batch; result['status'] is 'written', or for incremental runs
+    'unchanged' (inputs and format match the manifest, report kept) or
+    'removed' (an orphaned report was deleted; job is None). Pass
+    remove_orphans=False when jobs are only some of the folder's reports.
+    pipeline=True runs the reports through run_pipeline instead of run_batch.
+    With the results_db option, each new report's grades go into that
+    ResultsStore; with the similarity option, its essay signature goes into
+    the manifest for flag_similar_essays.
+    """
+    manifest = ReportManifest(output_folder)
+    store = ResultsStore.for_jobs(jobs)
+    
+    # The pipeline hashes the bytes it reads anyway; incremental runs need
+    # the hashes up front to tell which reports are stale
+    for job in jobs:
+        if incremental or not pipeline:
+            job['pdf_hash'] = file_hash(job['pdf_path'])
+            job['docx_hash'] = file_hash(job['docx_path']) if job['docx_path'] else None
+        else:
+            job.pop('pdf_hash', None)
+            job.pop('docx_hash', None)
+    
+    stale = jobs
+    if incremental:
+        for name in manifest.remove_orphans(jobs) if remove_orphans else []:
+            yield None, {'status': 'removed', 'output_name': name,
+                         'output_path': str(Path(output_folder) / name)}, None
         
-        # Find where each section starts
-        section_indices = []
-        for i, line in enumerate(lines):
-            for sec_name in section_names:
-                if sec_name.lower() == line.lower():
-                    section_indices.append((i, sec_name))
-                    break
-        
-        # Parse each section
-        for idx, (start_idx, sec_name) in enumerate(section_indices):
-            # Find end of this section (start of next section or end)
-            if idx + 1 < len(section_indices):
-                end_idx = section_indices[idx + 1][0]
+        stale = []
+        for job in jobs:
+            if manifest.is_current(job):
+                yield job, {'status': 'unchanged', 'output_name': job['output_name'],
+                            'output_path': job['output_path']}, None
             else:
-                end_idx = len(lines)
-            
-            section_lines = lines[start_idx + 1:end_idx]
-            
-            if not section_lines:
-                continue
-            
-            # First line should be the grade (e.g., "3/4")
-            grade = ""
-            overview_lines = []
-            quotes = []
-            
-            i = 0
-            
-            # Get grade
-            if section_lines and re.match(r'^\d+/\d+$', section_lines[0]):
-                grade = section_lines[0]
-                i = 1
-            
-            # Collect overview until we hit a quote
-            while i < len(section_lines):
-                line = section_lines[i]
-                if line.startswith('"') or line.startswith('"'):
-                    break
-                overview_lines.append(line)
-                i += 1
-            
-            overview = self._join_lines(overview_lines)
-            
-            # Now parse quote/feedback pairs
-            # Strategy: A quote starts with " and ends when a line ends with " or ."
-            # Then feedback continues until the next line starting with "
-            current_quote_lines = []
-            current_feedback_lines = []
-            in_quote = False
-            quote_complete = False
-            
-            while i < len(section_lines):
-                line = section_lines[i]
-                
-                starts_with_quote = line.startswith('"') or line.startswith('"')
-                
-                # If we're in an incomplete quote, this line is a continuation
-                if in_quote and not quote_complete:
-                    current_quote_lines.append(line)
-                    quote_complete = self._is_quote_complete(line)
-                # If this starts a new quote
-                elif starts_with_quote:
-                    # Save previous quote/feedback if exists
-                    if current_quote_lines:
-                        quotes.append({
-                            'quote': self._join_lines(current_quote_lines),
-                            'feedback': self._join_lines(current_feedback_lines)
-                        })
-                    current_quote_lines = [line]
-                    current_feedback_lines = []
-                    in_quote = True
-                    quote_complete = self._is_quote_complete(line)
-                elif in_quote and quote_complete:
-                    # Quote is done, this is feedback
-                    current_feedback_lines.append(line)
-                
-                i += 1
-            
-            # Save last quote/feedback
-            if current_quote_lines:
-                quotes.append({
-                    'quote': self._join_lines(current_quote_lines),
-                    'feedback': self._join_lines(current_feedback_lines)
-                })
-            
-            data['sections'].append({
-                'name': sec_name,
-                'grade': grade,
-                'overview': overview,
-                'quotes': quotes
-            })
-        
-        return data
+                stale.append(job)
     
-    def parse_docx_content(self, path):
-        """Parse DOCX to extract grading table and essay content."""
-        doc = Document(path)
+    try:
+        runner = run_pipeline if pipeline else run_batch
+        for job, result, error in runner(stale, workers, cancel):
+            if not error:
+                manifest.record(job, result.pop('essay_signature', None))
+                if store:
+                    store.record(job, result.pop('grades'))
+            yield job, result, error
+    finally:
+        manifest.save()
+        if store:
+            store.close()
+
+
+DEFAULT_WATCH_INTERVAL = 2.0
+DEFAULT_SETTLE_TIME = 5.0
+
+
+class FolderWatcher:
+    """
+    Polls input folders for review PDFs and DOCX files (polling works on any
+    file system, network shares included). A file only counts once its size
+    and modification time have stayed the same for `settle` seconds, so
+    files still being copied or exported are left alone until complete.
+    """
+    
+    def __init__(self, pdf_dir, docx_dir=None, settle=DEFAULT_SETTLE_TIME):
+        self.folders = {'.pdf': Path(pdf_dir), '.docx': Path(docx_dir or pdf_dir)}
+        self.settle = settle
+        self.seen = {}      # path -> (size, mtime_ns, time first seen with that size/mtime)
+        self.done = {}      # output name -> input signature it was last generated from
+        self.complete = True    # whether the last scan could list every folder
+    
+    def scan(self, now=None):
+        """Poll the folders. Returns the stable files as {path: (size, mtime_ns)}."""
+        now = time.monotonic() if now is None else now
+        current = {}
+        self.complete = True
+        for suffix, folder in self.folders.items():
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                self.complete = False
+                continue
+            for entry in entries:
+                # Skip Word lock files like "~$ylor_ Light pollution_review.docx"
+                if entry.name.lower().endswith(suffix) and not entry.name.startswith('~$'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    current[entry.path] = (stat.st_size, stat.st_mtime_ns)
         
-        data = {
-            'table_data': [],
-            'essay': ""
-        }
+        stable = {}
+        for path, signature in current.items():
+            previous = self.seen.get(path)
+            if previous is None or previous[:2] != signature:
+                self.seen[path] = (*signature, now)
+            elif now - previous[2] >= self.settle:
+                stable[path] = signature
         
-        # Extract grading table (skip header row per info.md: "4 row 3 column table")
-        if doc.tables:
-            table = doc.tables[0]
-            for i, row in enumerate(table.rows):
-                # Skip header row
-                if i == 0:
-                    continue
-                row_data = [cell.text.strip() for cell in row.cells]
-                data['table_data'].append(row_data)
+        for path in set(self.seen) - set(current):
+            del self.seen[path]
+        return stable
+    
+    def ready_jobs(self, output_folder, options=None, now=None):
+        """
+        Jobs for complete PDF/DOCX pairs among the stable files whose inputs
+        are new or changed since they were last handed out (see
+        EssayProcessor.build_jobs). PDFs still waiting for their DOCX are
+        not included. Returns (jobs, waiting pdf names, retired report
+        names); a report is retired when no file in the folders would
+        produce it any more, e.g. its PDF was renamed, or the student's
+        second PDF arrived and their reports are now named by essay title.
+        """
+        stable = self.scan(now)
         
-        # Find essay content (after "Content Review" header)
-        essay_lines = []
-        in_content_review = False
-        stop_markers = ['Grammar and Spelling Review', 'Scan Results', 'AI Detection']
+        # Reports are named from every file present, settled or not, so a
+        # report's name doesn't change again once the files settle
+        ep = EssayProcessor()
+        for path in sorted(self.seen):
+            if path.lower().endswith('.pdf'):
+                ep.add_pdf(path)
+            else:
+                ep.add_docx(path)
         
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            
-            if any(marker.lower() in text.lower() for marker in stop_markers):
-                break
-            
-            if 'content review' in text.lower():
-                in_content_review = True
+        jobs, _ = ep.build_jobs(output_folder, options)
+        ready, waiting = [], []
+        for job in jobs:
+            if job['pdf_path'] not in stable:
                 continue
-            
-            if in_content_review and text:
-                essay_lines.append(para.text)
+            if job['docx_path'] is None:
+                waiting.append(job['pdf_name'])
+                continue
+            if job['docx_path'] not in stable:
+                continue
+            signature = (stable[job['pdf_path']], stable[job['docx_path']])
+            if self.done.get(job['output_name']) != signature:
+                self.done[job['output_name']] = signature
+                ready.append(job)
         
-        data['essay'] = essay_lines  # Keep as list of paragraphs
+        # An unreachable folder looks empty; its reports are not retired for that
+        retired = []
+        if self.complete:
+            named = {job['output_name'] for job in jobs}
+            retired = [name for name in self.done if name not in named]
+            for name in retired:
+                del self.done[name]
+        return ready, waiting, retired
+
+
+def watch_folders(watcher, output_folder, options=None, interval=DEFAULT_WATCH_INTERVAL, workers=None,
+                  stop=None):
+    """
+    Generate reports as their input pairs become complete, until the
+    optional stop Event is set. Yields (job, result, error) like
+    generate_reports; reports already current in the folder's manifest come
+    back as 'unchanged' on the first scan instead of being rebuilt, and
+    reports the watcher retired come back as 'removed' once deleted.
+    A failed pair is retried when one of its files changes. With the
+    similarity option, the similarity report is refreshed after each scan
+    that changed the reports.
+    """
+    while True:
+        jobs, _, retired = watcher.ready_jobs(output_folder, options)
+        if retired:
+            manifest = ReportManifest(output_folder)
+            removed = manifest.remove(retired)
+            manifest.save()
+            for name in removed:
+                yield None, {'status': 'removed', 'output_name': name,
+                             'output_path': str(Path(output_folder) / name)}, None
+        if jobs:
+            yield from generate_reports(jobs, output_folder, incremental=True, workers=workers,
+                                        cancel=stop, remove_orphans=False)
+        if (jobs or retired) and (options or {}).get('similarity') is not None:
+            flag_similar_essays(output_folder, options['similarity'])
         
-        return data
+        if stop is None:
+            time.sleep(interval)
+        elif stop.wait(interval):
+            return
+
+
+def cli_report_options(args):
+    """Report options and parse cache (or None) from the shared batch/watch arguments."""
+    cache = None
+    if not args.no_cache:
+        cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
     
-    def create_output_folder(self):
-        desktop = Path.home() / "Desktop"
-        date_str = datetime.now().strftime("%d_%b_%Y")
-        folder_name = f"report_data_{date_str}"
-        folder_path = desktop / folder_name
-        
-        counter = 1
-        while folder_path.exists():
-            counter += 1
-            folder_path = desktop / f"{folder_name}_{counter}"
-        
-        folder_path.mkdir(parents=True, exist_ok=True)
-        return folder_path
+    options = {'cache_dir': str(cache.folder) if cache else None, 'layout': args.layout,
+               'template': args.template, 'fast_writer': args.fast_writer,
+               'results_db': None if args.no_results else str(args.results_db), 'class_name': args.class_name}
+    return options, cache
+
+
+def write_reports_zip(jobs, output, workers=None, cancel=None):
+    """
+    Generate reports straight into a .zip (path or binary file) instead of a
+    folder, without temporary files: workers return each report's bytes and
+    they are added to the archive as they arrive. Yields (job, result, error)
+    like run_batch.
+    """
+    store = ResultsStore.for_jobs(jobs)
+    try:
+        with zipfile.ZipFile(output, 'w') as archive:
+            for job, result, error in run_batch(jobs, workers, cancel, task=render_student):
+                if result:
+                    # Reports are .docx files, which are already compressed
+                    info = zipfile.ZipInfo(result['output_name'], date_time=datetime.now().timetuple()[:6])
+                    archive.writestr(info, result.pop('content'))
+                    if store:
+                        store.record(job, result.pop('grades'), f"{output}/{result['output_name']}")
+                yield job, result, error
+    finally:
+        if store:
+            store.close()
+
+
+DEFAULT_SERVE_PORT = 8765
+DEFAULT_MAX_REQUESTS = 4
+DEFAULT_MAX_UPLOAD_MB = 200
+METRICS_WINDOW = 200        # recent requests kept for /metrics
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+UPLOAD_FORM = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>AP English Rubric Guide</title></head>
+<body style="font-family: sans-serif; max-width: 40em; margin: 2em auto">
+<h1>AP English Rubric Guide</h1>
+<p>Choose the review PDFs and DOCX files (or a .zip of them). One pair gives its report;
+several give a .zip of reports.</p>
+<form method="post" action="/report" enctype="multipart/form-data">
+<p><input type="file" name="files" multiple accept=".pdf,.docx,.zip"></p>
+<p><label>Class (optional) <input type="text" name="class"></label></p>
+<p><button type="submit">Generate Reports</button></p>
+</form>
+</body></html>
+"""
+
+
+def warm_worker(template=None):
+    """Initializer of each server worker: import the parsers' libraries and load the report template."""
+    for module in ('fitz', 'lxml.etree', 'docx'):
+        importlib.import_module(module)
+    load_report_template(template)
+
+
+def parse_multipart(content_type, body):
+    """(field name, filename, bytes) for each part of a multipart/form-data body."""
+    from email.parser import BytesParser
+    from email.policy import HTTP
     
-    def create_report(self, student_name, essay_title, pdf_data, docx_data, output_path):
-        """Generate the formatted report document exactly as specified in info.md."""
-        doc = Document()
-        
-        # Set default font
-        style = doc.styles['Normal']
-        style.font.name = 'Calibri'
-        style.font.size = Pt(12)
-        
-        # Name line (student name from filename)
-        doc.add_paragraph(f"Name: {student_name}")
-        
-        # Essay line
-        doc.add_paragraph(f"Essay: {essay_title}")
-        
-        # Date line (format: 17 February 2026)
-        now = datetime.now()
-        date_str = f"{now.day} {now.strftime('%B')} {now.year}"
-        doc.add_paragraph(f"Date: {date_str}")
-        
-        # One blank line (CR)
-        doc.add_paragraph()
-        
-        # ===== ESSAY SECTION FIRST =====
-        # ESSAY heading (14pt)
-        p = doc.add_paragraph()
-        run = p.add_run("ESSAY")
-        run.font.size = Pt(14)
-        run.font.name = 'Calibri'
-        run.bold = True
-        
-        # Essay content (preserved exactly, paragraph by paragraph with soft return after each)
-        if docx_data.get('essay'):
-            for para_text in docx_data['essay']:
-                p = doc.add_paragraph()
-                run = p.add_run(para_text)
-                run.font.size = Pt(12)
-                run.font.name = 'Calibri'
-                # Add soft return (line break) after paragraph
-                run.add_break()
-        
-        # Two blank lines after essay
-        doc.add_paragraph()
-        doc.add_paragraph()
-        
-        # ===== TABLE SECTION =====
-        # AP Rubric heading (14pt) - keep with table using XML
-        from docx.oxml.ns import qn
-        from docx.oxml import OxmlElement
-        
-        p = doc.add_paragraph()
-        # Set keep_with_next via XML for better reliability
-        pPr = p._p.get_or_add_pPr()
-        keepNext = OxmlElement('w:keepNext')
-        keepLines = OxmlElement('w:keepLines')
-        pPr.append(keepNext)
-        pPr.append(keepLines)
-        
-        run = p.add_run("AP RUBRIC")
-        run.font.size = Pt(14)
-        run.font.name = 'Calibri'
-        run.bold = True
-        
-        # Table from DOCX (4 rows, 3 columns, 10pt font)
-        if docx_data.get('table_data'):
-            from docx.oxml.ns import nsdecls, qn
-            from docx.oxml import parse_xml, OxmlElement
-            
-            # Reorder table rows: Overall, Thesis, Evidence and Commentary, Sophistication
-            table_order = ['overall', 'thesis', 'evidence', 'sophistication']
-            original_data = docx_data['table_data']
-            table_data = []
-            
-            for order_key in table_order:
-                for row in original_data:
-                    if row and row[0].lower().startswith(order_key):
-                        table_data.append(row)
-                        break
-            
-            # Add any rows that didn't match (fallback)
-            for row in original_data:
-                if row not in table_data:
-                    table_data.append(row)
-            num_rows = len(table_data)
-            num_cols = 3
-            
-            table = doc.add_table(rows=num_rows, cols=num_cols)
-            table.style = 'Table Grid'
-            table.autofit = False
-            
-            # Set column widths: first two columns fit content, third gets remaining space
-            # Total page width ~6.5 inches (8.5 - 1" margins each side)
-            # First two columns: narrow (1.2 inches each), third: wide (4.1 inches)
-            col_widths = [Inches(1.2), Inches(1.2), Inches(4.1)]
-            
-            for i, row_data in enumerate(table_data):
-                row = table.rows[i]
-                
-                # Keep row together (prevents row from splitting across pages)
-                tr = row._tr
-                trPr = tr.get_or_add_trPr()
-                cantSplit = OxmlElement('w:cantSplit')
-                trPr.append(cantSplit)
-                
-                for j, cell_text in enumerate(row_data[:num_cols]):
-                    cell = row.cells[j]
-                    cell.width = col_widths[j]
-                    cell.text = cell_text
-                    for paragraph in cell.paragraphs:
-                        # Keep paragraph together and with next
-                        paragraph.paragraph_format.keep_together = True
-                        # Only set keep_with_next if not the last row
-                        if i < num_rows - 1:
-                            paragraph.paragraph_format.keep_with_next = True
-                        for run in paragraph.runs:
-                            run.font.size = Pt(10)
-                            run.font.name = 'Calibri'
+    message = BytesParser(policy=HTTP).parsebytes(b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n'
+                                                  + body)
+    if not message.is_multipart():
+        raise ValueError("Malformed multipart body")
+    return [(part.get_param('name', header='content-disposition'), part.get_filename(),
+             part.get_payload(decode=True) or b'') for part in message.iter_parts()]
+
+
+class ReportService:
+    """
+    The work behind `serve`, without the HTTP: an IsolatedPool of workers
+    started and warmed up once (see warm_worker), so requests don't pay for
+    starting workers or importing PyMuPDF and python-docx, and a report
+    that hangs (the options' timeout) or crashes its worker neither holds a
+    request forever nor breaks later ones; a limit on requests being
+    handled at once; and timing metrics for the requests handled.
+    """
+    
+    def __init__(self, options=None, workers=None, max_requests=DEFAULT_MAX_REQUESTS,
+                 max_upload=DEFAULT_MAX_UPLOAD_MB * 1024 * 1024):
+        self.options = dict(options or {})
+        self.workers = workers or os.cpu_count() or 1
+        self.max_upload = max_upload
+        self.slots = threading.BoundedSemaphore(max_requests)
+        self.pool = None
+        self.threads = None     # wait on the pool's workers on behalf of requests
+        self.store = None       # shared by all requests, behind self.lock
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'rejected': 0, 'failed': 0, 'reports': 0, 'report_errors': 0}
+        self.recent = deque(maxlen=METRICS_WINDOW)
+        self.started = time.time()
+    
+    def start(self):
+        self.pool = IsolatedPool(self.workers, render_student, self.options.get('timeout'),
+                                 self.options.get('memory_limit'), warm_worker, (self.options.get('template'),))
+        self.threads = ThreadPoolExecutor(self.workers)
+        if self.options.get('results_db'):
+            self.store = ResultsStore(self.options['results_db'], threads=True)
+    
+    def close(self):
+        if self.pool:
+            self.pool.close()
+        if self.threads:
+            self.threads.shutdown(wait=False, cancel_futures=True)
+        if self.store:
+            with self.lock:
+                self.store.close()
+                self.store = None
+    
+    def jobs_for(self, files, folder, class_name=None):
+        """
+        Save uploaded (filename, bytes) files into folder and match them like
+        a batch. A .zip is read as an archive; loose files go into an
+        "Uploads" folder, which names their class unless class_name is given.
+        Returns (jobs, warnings).
+        """
+        uploads = Path(folder) / "Uploads"
+        uploads.mkdir()
+        ep = EssayProcessor()
+        for filename, content in files:
+            # Browsers may send a client-side path; only the name is used
+            name = posixpath.basename((filename or '').replace('\\', '/'))
+            if not name.lower().endswith(('.pdf', '.docx', '.zip')):
+                continue
+            path = (Path(folder) if name.lower().endswith('.zip') else uploads) / name
+            path.write_bytes(content)
+            if path.suffix.lower() == '.zip':
+                ep.load_folder(path)
+        ep.load_folder(uploads)
         
-        # Two blank lines after table
-        doc.add_paragraph()
-        doc.add_paragraph()
+        options = dict(self.options)
+        if class_name:
+            options['class_name'] = class_name
+        return ep.build_jobs(Path(folder) / "Reports", options)
+    
+    def render(self, jobs):
+        """
+        Yield (job, result, error) as each report is built on the pool, in
+        completion order; results carry the .docx bytes. Only a couple of
+        jobs per worker are queued at a time, as in run_batch.
+        """
+        pending = iter(jobs)
+        running = {self.threads.submit(self.pool.run, job): job
+                   for job in itertools.islice(pending, self.workers * 2)}
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    result, error = future.result()
+                    with self.lock:
+                        # Committed per report, so requests never hold the database for each other
+                        if self.store and result:
+                            self.store.record(job, result.pop('grades'), result['output_name'])
+                            self.store.commit()
+                        self.counts['report_errors' if error else 'reports'] += 1
+                    yield job, result, error
+                    
+                    next_job = next(pending, None)
+                    if next_job is not None:
+                        running[self.threads.submit(self.pool.run, next_job)] = next_job
+        finally:
+            for future in running:
+                future.cancel()
+    
+    def record(self, path, status, seconds, reports=0, received=0):
+        with self.lock:
+            self.counts['requests'] += 1
+            if status == 503:
+                self.counts['rejected'] += 1
+            elif status >= 400:
+                self.counts['failed'] += 1
+            self.recent.append({'path': path, 'status': status, 'seconds': round(seconds, 4),
+                                'reports': reports, 'bytes_received': received,
+                                'time': datetime.now().isoformat(timespec='seconds')})
+    
+    def metrics(self):
+        """Request counts, and count/mean/median/95th percentile/max seconds of recent report requests."""
+        with self.lock:
+            recent = list(self.recent)
+            metrics = {'uptime_seconds': round(time.time() - self.started, 1), 'workers': self.workers,
+                       **self.counts}
+        times = sorted(r['seconds'] for r in recent if r['path'] == '/report' and r['status'] == 200)
+        if times:
+            metrics['report_seconds'] = {
+                'count': len(times), 'mean': round(sum(times) / len(times), 4), 'p50': times[len(times) // 2],
+                'p95': times[min(int(len(times) * 0.95), len(times) - 1)], 'max': times[-1]}
+        metrics['recent'] = recent[-20:]
+        return metrics
+
+
+def make_report_server(service, host='127.0.0.1', port=DEFAULT_SERVE_PORT):
+    """
+    An HTTP server for service (see ReportService); call serve_forever().
+        GET  /         upload form
+        GET  /metrics  request counts and timings as JSON
+        POST /report   multipart/form-data files (PDF/DOCX pairs or .zip), or
+                       a raw .zip body; returns the report for a single pair,
+                       otherwise streams a .zip of reports (add ?zip=1 to
+                       always get a .zip)
+    Requests over the service's concurrency limit get 503 with Retry-After.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+    
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "EssayProcessor"
+        timeout = 120       # seconds to wait on a stalled upload
+        headers_sent = False
         
-        # ===== QUOTES AND FEEDBACK SECTION =====
-        # Order: Overall, Thesis, Evidence and Commentary, Sophistication
-        section_order = ['Overall', 'Thesis', 'Evidence and Commentary', 'Sophistication']
+        def do_GET(self):
+            start = time.perf_counter()
+            path = urlsplit(self.path).path
+            if path == '/':
+                self._send(200, UPLOAD_FORM.encode(), 'text/html; charset=utf-8')
+            elif path == '/metrics':
+                self._send(200, json.dumps(service.metrics(), indent=1).encode(), 'application/json')
+            else:
+                self._send(404, b"Not found\n")
+            service.record(path, self.status, time.perf_counter() - start)
         
-        # Build a dict for easy lookup
-        sections_by_name = {}
-        for section in pdf_data.get('sections', []):
-            sections_by_name[section['name']] = section
-        
-        # Overall Grade section (14pt heading only - overview is in table)
-        if pdf_data.get('overall_grade'):
-            p = doc.add_paragraph()
-            run = p.add_run(f"OVERALL: {pdf_data['overall_grade']}")
-            run.font.size = Pt(14)
-            run.font.name = 'Calibri'
-            run.bold = True
-            
-            # Blank paragraph after overall section
-            doc.add_paragraph()
+        def do_POST(self):
+            start = time.perf_counter()
+            url = urlsplit(self.path)
+            self.status, self.reports, self.received = 500, 0, 0
+            if url.path != '/report':
+                self._send(404, b"Not found\n")
+            elif not service.slots.acquire(blocking=False):
+                self._send(503, b"Busy, try again shortly\n", headers={'Retry-After': '5'})
+            else:
+                try:
+                    self._report(parse_qs(url.query))
+                except Exception as e:
+                    self.log_error("Report request failed: %s", e)
+                    if not self.headers_sent:
+                        self._send(500, f"{e}\n".encode())
+                finally:
+                    service.slots.release()
+            service.record(url.path, self.status, time.perf_counter() - start, self.reports, self.received)
         
-        # Remaining sections in order: Thesis, Evidence and Commentary, Sophistication
-        for sec_name in section_order[1:]:  # Skip 'Overall' as it's handled above
-            section = sections_by_name.get(sec_name)
-            if not section:
-                continue
+        def _report(self, query):
+            length = int(self.headers.get('Content-Length') or -1)
+            if length < 0:
+                return self._send(411, b"Content-Length required\n")
+            if length > service.max_upload:
+                return self._send(413, f"Uploads are limited to {service.max_upload // 2 ** 20} MB\n".encode())
+            body = self.rfile.read(length)
+            self.received = len(body)
             
-            # Section heading with grade (14pt)
-            heading_para = doc.add_paragraph()
-            heading_para.paragraph_format.space_before = Pt(12)
-            heading_para.paragraph_format.space_after = Pt(0)
-            run = heading_para.add_run(f"{section['name']}: {section['grade']}")
-            run.font.size = Pt(14)
-            run.font.name = 'Calibri'
-            run.bold = True
+            content_type = self.headers.get('Content-Type', '')
+            class_name = (query.get('class') or [None])[0]
+            if content_type.startswith('multipart/form-data'):
+                parts = parse_multipart(content_type, body)
+                files = [(filename, content) for _, filename, content in parts if filename]
+                class_name = next((content.decode().strip() for name, filename, content in parts
+                                   if name == 'class' and not filename), class_name) or None
+            else:
+                files = [((query.get('name') or ['upload.zip'])[0], body)]
             
-            # Skip overview (redundant with table) - go straight to quotes and feedback
-            first_quote = True
-            for item in section.get('quotes', []):
-                # Quote paragraph
-                quote_para = doc.add_paragraph()
-                quote_para.paragraph_format.space_before = Pt(12) if not first_quote else Pt(6)
-                quote_para.paragraph_format.space_after = Pt(0)
-                first_quote = False
+            with tempfile.TemporaryDirectory(prefix="essay_upload_") as folder:
+                try:
+                    jobs, warnings = service.jobs_for(files, folder, class_name)
+                except zipfile.BadZipFile as e:
+                    return self._send(400, f"Could not read the .zip: {e}\n".encode())
+                if not jobs:
+                    return self._send(400, '\n'.join(["No review PDFs found in the upload", *warnings]).encode())
                 
-                # Quote in italics
-                if item.get('quote'):
-                    run = quote_para.add_run(item['quote'])
-                    run.italic = True
-                    run.font.name = 'Calibri'
-                    run.font.size = Pt(12)
+                if len(jobs) == 1 and 'zip' not in query:
+                    _, result, error = next(service.render(jobs))
+                    if error:
+                        return self._send(422, f"{error}\n".encode())
+                    self.reports = 1
+                    return self._send(200, result['content'], DOCX_MIME,
+                                      {'Content-Disposition': f'attachment; filename="{result["output_name"]}"'})
                 
-                # Feedback as indented block paragraph (tight spacing)
-                if item.get('feedback'):
-                    feedback_para = doc.add_paragraph()
-                    feedback_para.paragraph_format.left_indent = Inches(0.5)
-                    feedback_para.paragraph_format.space_before = Pt(2)
-                    feedback_para.paragraph_format.space_after = Pt(0)
-                    run = feedback_para.add_run(item['feedback'])
-                    run.font.size = Pt(12)
-                    run.font.name = 'Calibri'
-            
-            # Paragraph break between sections
-            doc.add_paragraph()
+                # Stream the .zip as reports finish; without a length the body ends when the connection closes
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/zip')
+                self.send_header('Content-Disposition', 'attachment; filename="reports.zip"')
+                self.end_headers()
+                self.headers_sent = True
+                self.status = 200
+                errors = list(warnings)
+                with zipfile.ZipFile(self.wfile, 'w') as archive:
+                    for _, result, error in service.render(jobs):
+                        if error:
+                            errors.append(error)
+                            continue
+                        info = zipfile.ZipInfo(result['output_name'], date_time=datetime.now().timetuple()[:6])
+                        archive.writestr(info, result['content'])
+                        self.reports += 1
+                    if errors:
+                        archive.writestr("errors.txt", '\n'.join(errors) + '\n')
         
-        doc.save(output_path)
+        def _send(self, status, body, content_type='text/plain; charset=utf-8', headers=None):
+            self.status = status
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.headers_sent = True
+            self.wfile.write(body)
     
-    def process_all(self):
-        if not self.pdf_files:
-            messagebox.showwarning("No Files", "Please load PDF files first.")
-            return
-        
-        self.output_folder = self.create_output_folder()
-        self.output_listbox.delete(0, tk.END)
-        self.output_files.clear()
-        
-        processed = 0
-        errors = []
-        
-        for pdf_name, pdf_path in self.pdf_files.items():
-            try:
-                student_name, essay_title = self.parse_filename(pdf_name)
-                
-                # Find matching DOCX
-                docx_path = None
-                for docx_name, path in self.docx_files.items():
-                    docx_student, _ = self.parse_filename(docx_name)
-                    if docx_student.lower() == student_name.lower():
-                        docx_path = path
-                        break
-                
-                pdf_data = self.parse_pdf_feedback(pdf_path)
-                
-                docx_data = {}
-                if docx_path:
-                    docx_data = self.parse_docx_content(docx_path)
-                else:
-                    errors.append(f"No matching DOCX for {student_name}")
-                
-                output_name = f"{student_name}_report.docx"
-                output_path = self.output_folder / output_name
-                
-                self.create_report(student_name, essay_title, pdf_data, docx_data, output_path)
-                
-                self.output_files[output_name] = str(output_path)
-                self.output_listbox.insert(tk.END, output_name)
-                
-                processed += 1
-                
-            except Exception as e:
-                errors.append(f"{pdf_name}: {str(e)}")
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def run_cli_batch(args):
+    """Headless batch: python essay_processor.py batch --pdf-dir ... --out ..."""
+    # The pipeline's stages overlap across files, so there are no per-file stage times to report
+    if args.pipeline and args.timing:
+        print("--timing can't be used with --pipeline", file=sys.stderr)
+        return 2
+
+    for source in (args.pdf_dir, args.docx_dir or args.pdf_dir):
+        if not os.path.isdir(source) and not zipfile.is_zipfile(source):
+            print(f"{source} is not a folder or a .zip archive", file=sys.stderr)
+            return 1
+    
+    ep = EssayProcessor()
+    ep.load_folder(args.pdf_dir, args.docx_dir)
+    if not ep.pdf_files:
+        print(f"No PDF files found in {args.pdf_dir}", file=sys.stderr)
+        return 1
+    
+    similarity = args.similarity is not None
+    if (args.incremental or args.retry_failures or similarity) and (args.combined or args.combined_pdf):
+        print("--incremental, --retry-failures and --similarity only apply to per-student reports, not --combined",
+              file=sys.stderr)
+        return 2
+    
+    # --out Reports.zip writes the reports into an archive instead of a folder
+    out_zip = bool(args.out) and args.out.lower().endswith('.zip')
+    if out_zip and (args.incremental or args.retry_failures or similarity or args.combined or args.combined_pdf
+                    or args.pipeline or args.timing):
+        print("--out .zip can't be used with --incremental, --retry-failures, --similarity, --combined, --pipeline "
+              "or --timing", file=sys.stderr)
+        return 2
+    
+    if out_zip:
+        output_folder = Path(args.out)
+        output_folder.parent.mkdir(parents=True, exist_ok=True)
+    elif args.out:
+        output_folder = Path(args.out)
+        output_folder.mkdir(parents=True, exist_ok=True)
+    elif args.incremental or args.retry_failures:
+        print("--incremental and --retry-failures need --out pointing at an existing report folder",
+              file=sys.stderr)
+        return 2
+    else:
+        output_folder = ep.create_output_folder()
+    
+    options, cache = cli_report_options(args)
+    options['timing'] = args.timing
+    # Profiling needs the reports built in this process, where limits can't be enforced
+    options['timeout'] = None if args.profile else args.timeout or None
+    options['memory_limit'] = None if args.profile else args.memory_limit or None
+    options['similarity'] = args.similarity
+    jobs, warnings = ep.build_jobs(output_folder, options)
+    for warning in warnings:
+        print(f"Warning: {warning}", file=sys.stderr)
+    
+    if args.retry_failures:
+        failed = {record['pdf_name'] for record in read_error_log(output_folder)}
+        jobs = [job for job in jobs if job['pdf_name'] in failed]
+        if not jobs:
+            print(f"No failed reports to retry in {output_folder / ERROR_LOG_NAME}")
+            return 0
+        print(f"Retrying {len(jobs)} failed report(s)")
+    
+    if args.combined or args.combined_pdf:
+        return run_cli_combined(args, jobs, output_folder, cache)
+    
+    # Profiling runs everything in this process so the stats cover all of it
+    workers = 1 if args.profile else args.workers
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    if out_zip:
+        results = write_reports_zip(jobs, output_folder, workers)
+    else:
+        results = generate_reports(jobs, output_folder, args.incremental, workers, pipeline=args.pipeline,
+                                   remove_orphans=not args.retry_failures)
+    
+    errors = []
+    timings = []
+    counts = defaultdict(int)
+    done = 0
+    for job, result, error in results:
+        if args.timing and job is not None:
+            timings.append(timing_record(job, result, error))
         
-        status = f"Processed {processed} file(s). Saved to {self.output_folder}"
-        self.status_var.set(status)
+        if error:
+            errors.append((job, error))
+            done += 1
+            print(f"[{done}/{len(jobs)}] Error: {error}", file=sys.stderr)
+            continue
         
-        msg = f"Generated {processed} report(s).\n\nSaved to:\n{self.output_folder}"
-        if errors:
-            msg += f"\n\nWarnings:\n" + "\n".join(errors[:5])
+        counts[result['status']] += 1
+        if result['status'] == 'removed':
+            print(f"Removed {result['output_name']}")
+        else:
+            done += 1
+            suffix = " (unchanged)" if result['status'] == 'unchanged' else ""
+            print(f"[{done}/{len(jobs)}] {result['output_name']}{suffix}")
+    
+    if profiler:
+        profiler.disable()
+        print(f"Profile saved to {write_profile(profiler, output_folder.parent if out_zip else output_folder)}")
+    
+    if timings:
+        print(f"Timing report saved to {write_timing_report(timings, output_folder)}")
+    
+    error_log = write_error_log(errors, output_folder.parent if out_zip else output_folder)
+    
+    if args.similarity is not None:
+        pairs, path = flag_similar_essays(output_folder, args.similarity)
+        print(f"{len(pairs)} pair(s) of essays at least {args.similarity:.0%} similar; listed in {path}")
+    
+    if cache:
+        cache.prune()
+    
+    summary = f"Generated {counts['written']} report(s)"
+    if args.incremental:
+        summary += f", {counts['unchanged']} unchanged, {counts['removed']} removed"
+    print(f"{summary}. Saved to {output_folder}")
+    if error_log:
+        print(f"{len(errors)} report(s) failed; details in {error_log}. Rerun with --retry-failures to redo "
+              f"only those.", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def timing_record(job, result, error):
+    """One row of the timing report for a generate_reports result."""
+    result = result or {}
+    return {
+        'pdf_name': job['pdf_name'],
+        'status': getattr(error, 'kind', 'error') if error else result['status'],
+        'error': error,
+        'seconds': result.get('seconds', 0.0),
+        'stages': result.get('stages', {}),
+    }
+
+
+def write_profile(profiler, output_folder, limit=40):
+    """Dump cProfile stats (batch_profile.prof) plus a readable top list by cumulative time."""
+    import pstats
+    
+    prof_path = Path(output_folder) / f"{PROFILE_NAME}.prof"
+    profiler.dump_stats(prof_path)
+    with open(Path(output_folder) / f"{PROFILE_NAME}.txt", 'w', encoding='utf-8') as f:
+        pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(limit)
+    return prof_path
+
+
+def run_cli_serve(args):
+    """Report server: python essay_processor.py serve [--host ...] [--port ...]"""
+    options, cache = cli_report_options(args)
+    options['timeout'] = args.timeout or None
+    options['memory_limit'] = args.memory_limit or None
+    service = ReportService(options, args.workers, args.max_requests, args.max_upload * 1024 * 1024)
+    print(f"Starting {service.workers} worker(s)...")
+    service.start()
+    server = make_report_server(service, args.host, args.port)
+    print(f"Serving reports on http://{args.host}:{server.server_port}/ (metrics at /metrics). "
+          f"Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        server.server_close()
+        service.close()
+        if cache:
+            cache.prune()
+    return 0
+
+
+def run_cli_grades(args):
+    """Grade statistics from the results database: python essay_processor.py grades [--class ...]"""
+    if not Path(args.results_db).exists():
+        print(f"No results database at {args.results_db}; run a batch first", file=sys.stderr)
+        return 1
+    
+    store = ResultsStore(args.results_db)
+    try:
+        if args.students:
+            rows = store.students(args.class_name, args.assignment)
+            if args.json:
+                print(json.dumps(rows, indent=1))
+            for row in [] if args.json else rows:
+                sections = ', '.join(f"{name} {row[name]}" for name in SECTION_NAMES if row[name])
+                print(f"{row['class_name']} / {row['assignment']} / {row['student']}: {row['grade'] or '-'}"
+                      + (f" ({sections})" if sections else ''))
+            return 0
         
-        messagebox.showinfo("Complete", msg)
+        statistics = store.statistics(args.section, args.class_name, args.assignment)
+        distribution = store.distribution(args.section, args.class_name, args.assignment)
+    finally:
+        store.close()
+    
+    if args.json:
+        print(json.dumps({'statistics': statistics, 'distribution': distribution}, indent=1))
+        return 0
+    
+    for stats in statistics:
+        summary = f"{stats['class_name']} / {stats['assignment']}: {stats['students']} student(s)"
+        if stats['mean'] is not None:
+            summary += (f", mean {stats['mean']:.2f} of {stats['out_of']:g} "
+                        f"(lowest {stats['min']:g}, highest {stats['max']:g})")
+        print(f"{summary}{f' [{args.section}]' if args.section else ''}")
+        for row in distribution:
+            if (row['class_name'], row['assignment']) == (stats['class_name'], stats['assignment']):
+                print(f"    {row['grade'] or '(none)':<8}{row['students']:>5}")
+    return 0
+
+
+def run_cli_watch(args):
+    """Watch mode: python essay_processor.py watch --pdf-dir ... --out ..."""
+    output_folder = Path(args.out) if args.out else EssayProcessor().create_output_folder()
+    output_folder.mkdir(parents=True, exist_ok=True)
+    options, cache = cli_report_options(args)
+    options['timeout'] = args.timeout or None
+    options['memory_limit'] = args.memory_limit or None
+    options['similarity'] = args.similarity
+    
+    watcher = FolderWatcher(args.pdf_dir, args.docx_dir, args.settle)
+    print(f"Watching {args.pdf_dir} for new reviews; reports go to {output_folder}. Press Ctrl+C to stop.")
+    
+    written = 0
+    try:
+        for job, result, error in watch_folders(watcher, output_folder, options, args.interval, args.workers):
+            if error:
+                print(f"Error: {error}", file=sys.stderr)
+            elif result['status'] == 'written':
+                written += 1
+                print(f"{datetime.now():%H:%M:%S} {result['output_name']}")
+            elif result['status'] == 'removed':
+                print(f"{datetime.now():%H:%M:%S} Removed {result['output_name']}")
+    except KeyboardInterrupt:
+        pass
+    
+    if cache:
+        cache.prune()
+    print(f"Stopped. Generated {written} report(s) in {output_folder}")
+    return 0
+
+
+def run_cli_combined(args, jobs, output_folder, cache):
+    """batch --combined: one class document instead of a report per student."""
+    pdf_dir = Path(args.pdf_dir).resolve()
+    class_name = pdf_dir.stem if pdf_dir.is_file() else pdf_dir.name
+    docx_path = output_folder / f"{class_name}_class_report.docx"
+    pdf_path = docx_path.with_suffix('.pdf') if args.combined_pdf else None
+    
+    errors = []
+    done = 0
+    
+    def progress(job, error):
+        nonlocal done
+        done += 1
+        if error:
+            errors.append((job, error))
+            print(f"[{done}/{len(jobs)}] Error: {error}", file=sys.stderr)
+        else:
+            print(f"[{done}/{len(jobs)}] {job['student_name']}")
+    
+    written = write_class_report(jobs, docx_path, pdf_path, args.workers, template=args.template,
+                                 on_result=progress)
+    error_log = write_error_log(errors, output_folder)
+    
+    if cache:
+        cache.prune()
+    
+    saved = f"{docx_path} and {pdf_path}" if pdf_path else str(docx_path)
+    print(f"Combined {written} report(s). Saved to {saved}")
+    if error_log:
+        print(f"{len(errors)} student(s) left out; details in {error_log}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def similarity_threshold(value):
+    """argparse type for --similarity: a fraction above 0 and at most 1."""
+    try:
+        threshold = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid threshold: {value!r}") from None
+    if not 0 < threshold <= 1:
+        raise argparse.ArgumentTypeError(f"threshold must be above 0 and at most 1, not {value}")
+    return threshold
+
+
+def add_report_arguments(command, archives=False, folders=True):
+    """Input, output and report options shared by the batch, watch and (without folders) serve commands."""
+    zip_note = ", or a .zip of them" if archives else ""
+    if folders:
+        command.add_argument('--pdf-dir', required=True, help=f"Folder containing the feedback PDFs{zip_note}")
+        command.add_argument('--docx-dir', help=f"Folder containing the DOCX files{zip_note} (default: --pdf-dir)")
+        command.add_argument('--out', help="Output folder" + (" or .zip file" if archives else "")
+                                           + " (default: a new report_data folder on the Desktop)")
+        command.add_argument('--similarity', type=similarity_threshold, nargs='?', const=DEFAULT_SIMILARITY_THRESHOLD,
+                             metavar='THRESHOLD',
+                             help=f"Flag pairs of essays in the output folder at least this similar (0-1, default "
+                                  f"{DEFAULT_SIMILARITY_THRESHOLD:g}) in {SIMILARITY_REPORT_NAME}.csv")
+    command.add_argument('--workers', type=int, default=None,
+                         help="Number of worker processes (default: one per CPU)")
+    command.add_argument('--timeout', type=float, default=DEFAULT_JOB_TIMEOUT,
+                         help=f"Seconds a student's report may take before it is stopped and logged as "
+                              f"failed (default: {DEFAULT_JOB_TIMEOUT}; 0 for no limit)")
+    command.add_argument('--memory-limit', type=int, default=DEFAULT_MEMORY_LIMIT_MB,
+                         help=f"Memory each worker process may use, in MB (default: {DEFAULT_MEMORY_LIMIT_MB}; "
+                              f"0 for no limit; not enforced on Windows)")
+    command.add_argument('--layout', action='store_true',
+                         help="Parse PDFs from their layout (fonts, italics, text blocks) instead of plain text; "
+                              "more reliable for quotes spanning pages or containing inner quotes")
+    command.add_argument('--template', help="Report template .docx (see write-template); default: built-in")
+    command.add_argument('--fast-writer', action='store_true',
+                         help="Write report XML directly instead of through python-docx (same layout, faster "
+                              "for large batches)")
+    command.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                         help=f"Parse cache folder (default: {DEFAULT_CACHE_DIR})")
+    command.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                         help="Maximum parse cache size in MB; least recently used entries are evicted")
+    command.add_argument('--no-cache', action='store_true', help="Parse every file, ignoring the cache")
+    command.add_argument('--results-db', default=DEFAULT_RESULTS_DB,
+                         help=f"Database the grades of every report are saved to (default: {DEFAULT_RESULTS_DB})")
+    command.add_argument('--no-results', action='store_true', help="Don't save grades to the results database")
+    command.add_argument('--class', dest='class_name',
+                         help="Class name grades are saved under (default: the name of the PDF folder or .zip)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Combine PDF feedback and DOCX grading data into formatted reports. "
+                    "Run without a command to open the desktop app.")
+    commands = parser.add_subparsers(dest='command')
+    
+    batch = commands.add_parser('batch', help="Generate reports headlessly from input folders")
+    add_report_arguments(batch, archives=True)
+    batch.add_argument('--combined', action='store_true',
+                       help="Write one class document (<pdf folder name>_class_report.docx) with every "
+                            "student's report on new pages, instead of one file per student")
+    batch.add_argument('--combined-pdf', action='store_true',
+                       help="Like --combined, and also render the class document as a PDF")
+    batch.add_argument('--incremental', action='store_true',
+                       help="Update an existing --out folder: only rebuild reports whose inputs or format "
+                            "changed, and delete reports whose inputs are gone")
+    batch.add_argument('--retry-failures', action='store_true',
+                       help=f"Only redo the reports listed in the {ERROR_LOG_NAME} of an existing --out folder")
+    batch.add_argument('--pipeline', action='store_true',
+                       help="Overlap reading, parsing, building and writing reports in a staged pipeline "
+                            "(helps most when the input or output folders are on a network share)")
+    batch.add_argument('--timing', action='store_true',
+                       help=f"Record per-file, per-stage time and peak memory into {TIMING_REPORT_NAME}.json "
+                            f"and .csv in the output folder (slower while on)")
+    batch.add_argument('--profile', action='store_true',
+                       help=f"Run in a single process under cProfile and save the stats to "
+                            f"{PROFILE_NAME}.prof (and a summary in {PROFILE_NAME}.txt) in the output folder")
+    
+    watch = commands.add_parser('watch', help="Keep watching input folders and generate each report as soon "
+                                              "as both its PDF and DOCX have arrived")
+    add_report_arguments(watch)
+    watch.add_argument('--interval', type=float, default=DEFAULT_WATCH_INTERVAL,
+                       help=f"Seconds between folder scans (default: {DEFAULT_WATCH_INTERVAL:g})")
+    watch.add_argument('--settle', type=float, default=DEFAULT_SETTLE_TIME,
+                       help=f"Seconds a file must stay unchanged before it is read, so partly copied files "
+                            f"are skipped (default: {DEFAULT_SETTLE_TIME:g})")
+    
+    template = commands.add_parser('write-template', help="Save the built-in report template for editing in Word")
+    template.add_argument('path', nargs='?', default='report_template.docx', help="Where to save it")
+    
+    clear = commands.add_parser('clear-cache', help="Delete all cached parse results")
+    clear.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Parse cache folder")
+    
+    serve = commands.add_parser('serve', help="Run a local HTTP server that turns uploaded PDF/DOCX files "
+                                              "into reports")
+    add_report_arguments(serve, folders=False)
+    serve.add_argument('--host', default='127.0.0.1',
+                       help="Address to listen on (default: 127.0.0.1; use 0.0.0.0 to serve the lab network)")
+    serve.add_argument('--port', type=int, default=DEFAULT_SERVE_PORT, help=f"Port (default: {DEFAULT_SERVE_PORT})")
+    serve.add_argument('--max-requests', type=int, default=DEFAULT_MAX_REQUESTS,
+                       help=f"Uploads handled at once; more get a 503 to retry (default: {DEFAULT_MAX_REQUESTS})")
+    serve.add_argument('--max-upload', type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                       help=f"Largest upload accepted, in MB (default: {DEFAULT_MAX_UPLOAD_MB})")
+    
+    grades = commands.add_parser('grades', help="Show grade statistics and distributions from the results database")
+    grades.add_argument('--results-db', default=DEFAULT_RESULTS_DB,
+                        help=f"Results database (default: {DEFAULT_RESULTS_DB})")
+    grades.add_argument('--class', dest='class_name', help="Only this class")
+    grades.add_argument('--assignment', help="Only this assignment (essay title)")
+    grades.add_argument('--section', choices=SECTION_NAMES, help="A section's grades instead of the overall grade")
+    grades.add_argument('--students', action='store_true', help="List every student's grades instead")
+    grades.add_argument('--json', action='store_true', help="Print the results as JSON")
+    
+    return parser.parse_args(argv)
 
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'batch':
+        return run_cli_batch(args)
+    if args.command == 'watch':
+        return run_cli_watch(args)
+    if args.command == 'write-template':
+        build_default_template().save(args.path)
+        print(f"Saved report template to {args.path}. Edit its Report * styles or the rubric "
+              f"table in Word, then pass it with --template.")
+        return 0
+    if args.command == 'serve':
+        return run_cli_serve(args)
+    if args.command == 'grades':
+        return run_cli_grades(args)
+    if args.command == 'clear-cache':
+        removed = ParseCache(args.cache_dir).clear()
+        print(f"Removed {removed} cached parse result(s) from {args.cache_dir}")
+        return 0
+    
+    load_tk()
     root = tk.Tk()
     app = EssayProcessor(root)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import io
+import zipfile
+
+from essay_processor import ArchiveMember, EssayProcessor, write_reports_zip
+
+
+def test_parsers_accept_bytes_file_objects_and_archive_members(tmp_path, write_inputs):
+    write_inputs(tmp_path, 'Jones')
+    pdf, docx = tmp_path / 'Jones_ Essay_review.pdf', tmp_path / 'Jones_ Essay_review.docx'
+    archive = tmp_path / 'inputs.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.write(pdf, 'class/' + pdf.name)
+        z.write(docx, 'class/' + docx.name)
+    ep = EssayProcessor()
+
+    def sources(path):
+        """Fresh sources each time, since reading a file object uses it up."""
+        return [path.read_bytes(), io.BytesIO(path.read_bytes()), ArchiveMember(str(archive), 'class/' + path.name)]
+
+    for layout in (False, True):
+        expected = ep.parse_pdf_feedback(str(pdf), layout=layout)
+        assert all(ep.parse_pdf_feedback(source, layout=layout) == expected for source in sources(pdf))
+    expected = ep.parse_docx_content(str(docx))
+    assert all(ep.parse_docx_content(source) == expected for source in sources(docx))
+
+
+def test_zip_in_zip_out(tmp_path, write_inputs):
+    for student in ('Jones', 'Smith'):
+        write_inputs(tmp_path, student)
+    archive = tmp_path / 'download.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        for path in tmp_path.glob('*_review.*'):
+            z.write(path, path.name)
+        z.writestr('__MACOSX/._Jones_ Essay_review.pdf', b'not a pdf')
+
+    ep = EssayProcessor()
+    ep.load_folder(str(archive))
+    jobs, warnings = ep.build_jobs(tmp_path / 'reports.zip')
+    assert warnings == [] and all(isinstance(job['pdf_path'], ArchiveMember) for job in jobs)
+
+    output = io.BytesIO()
+    results = list(write_reports_zip(jobs, output, workers=1))
+
+    assert [error for _, _, error in results] == [None, None]
+    with zipfile.ZipFile(output) as z:
+        assert sorted(z.namelist()) == ['Jones_report.docx', 'Smith_report.docx']
+        from docx import Document
+        texts = [p.text for p in Document(io.BytesIO(z.read('Smith_report.docx'))).paragraphs]
+    assert 'Name: Smith' in texts and 'Essay by Smith.\n' in texts
+
+
+def test_batch_reports_inputs_that_are_not_folders_or_zips(tmp_path, capsys):
+    from essay_processor import main
+
+    not_zip = tmp_path / 'reviews.pdf'
+    not_zip.write_bytes(b'%PDF-1.7')
+
+    assert main(['batch', '--pdf-dir', str(not_zip)]) == 1
+    assert main(['batch', '--pdf-dir', str(tmp_path / 'missing')]) == 1
+    assert capsys.readouterr().err.splitlines() == [f"{not_zip} is not a folder or a .zip archive",
+                                                    f"{tmp_path / 'missing'} is not a folder or a .zip archive"]
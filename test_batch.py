@@ -0,0 +1,30 @@
+import json
+import shutil
+
+from essay_processor import main
+
+
+def test_batch_cli_names_reports_and_logs_bad_pairs(tmp_path, capsys, write_inputs):
+    pdfs, docx, out = tmp_path / 'pdfs', tmp_path / 'docx', tmp_path / 'out'
+    pdfs.mkdir()
+    docx.mkdir()
+    write_inputs(pdfs, 'Young')
+    for path in pdfs.glob('Young_*'):
+        path.rename(pdfs / path.name.replace('Essay', 'Light pollution'))
+    for student in ('Jones', 'Smith', 'Young'):
+        write_inputs(pdfs, student)
+    (pdfs / 'Smith_ Essay_review.docx').write_bytes(b'not a docx')
+    for path in pdfs.glob('*.docx'):
+        shutil.move(path, docx / path.name)
+
+    assert main(['batch', '--pdf-dir', str(pdfs), '--docx-dir', str(docx), '--out', str(out), '--workers', '2',
+                 '--no-cache', '--no-results']) == 1
+
+    assert sorted(path.name for path in out.glob('*.docx')) == [
+        'Jones_report.docx', 'Young_Essay_report.docx', 'Young_Light Pollution_report.docx']
+    log = json.loads((out / 'error_log.json').read_text())
+    assert log['failed'] == 1
+    assert [(f['pdf_name'], f['kind']) for f in log['failures']] == [('Smith_ Essay_review.pdf', 'error')]
+    captured = capsys.readouterr()
+    assert 'Generated 3 report(s)' in captured.out
+    assert 'Smith_ Essay_review.pdf' in captured.err and '1 report(s) failed' in captured.err
@@ -0,0 +1,37 @@
+from benchmark import generate_corpus, run_benchmark, student_names
+from essay_processor import EssayProcessor
+
+
+def test_corpus_parses_back_to_its_structure(tmp_path):
+    generate_corpus(tmp_path, 2, quotes=4, appendix_pages=2)
+    ep = EssayProcessor()
+
+    for pdf in sorted(tmp_path.glob('*.pdf')):
+        for layout in (False, True):
+            data = ep.parse_pdf_feedback(str(pdf), layout=layout)
+            assert data.overall_grade.endswith('/6')
+            assert [len(section.quotes) for section in data.sections] == [4, 4, 4]
+            assert all(q.quote.startswith('"') and q.quote.endswith('"') and q.feedback
+                       for section in data.sections for q in section.quotes)
+
+    docx = ep.parse_docx_content(str(sorted(tmp_path.glob('*.docx'))[0]))
+    assert [row.category for row in docx.rubric] == ['Overall', 'Evidence and Commentary', 'Sophistication', 'Thesis']
+    assert len(docx.essay) == 5
+
+
+def test_corpus_is_reproducible(tmp_path):
+    assert len(set(student_names(1000))) == 1000
+    generate_corpus(tmp_path / 'a', 1)
+    generate_corpus(tmp_path / 'b', 1)
+    pdf_a, pdf_b = sorted((tmp_path / 'a').glob('*.pdf')) + sorted((tmp_path / 'b').glob('*.pdf'))
+    ep = EssayProcessor()
+    assert ep.parse_pdf_feedback(str(pdf_a)) == ep.parse_pdf_feedback(str(pdf_b))
+
+
+def test_benchmark_reports_every_stage(tmp_path):
+    results = run_benchmark([1, 2], tmp_path, quotes=1, appendix_pages=1, workers=1)
+
+    assert [result['students'] for result in results] == [1, 2]
+    assert set(results[-1]['seconds']) == {'parse_pdf_feedback', 'parse_docx_content', 'create_report', 'batch'}
+    assert all(kb > 0 for kb in results[-1]['peak_kb_per_file'].values())
+    assert set(results[-1]['parsed_kb']) == {'records', 'dicts'} and all(results[-1]['json_kb'].values())
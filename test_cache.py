@@ -0,0 +1,57 @@
+import os
+
+import essay_processor
+from essay_processor import ParseCache, main
+
+
+def _counting_parser(calls):
+    def parse(path):
+        calls.append(path)
+        return {'text': open(path).read()}
+    return parse
+
+
+def test_cache_is_keyed_by_contents_and_parser_version(tmp_path, monkeypatch):
+    cache = ParseCache(tmp_path / 'cache')
+    calls = []
+    parse = _counting_parser(calls)
+    original, copy = tmp_path / 'a.pdf', tmp_path / 'b.pdf'
+    original.write_text('feedback')
+    copy.write_text('feedback')
+
+    assert cache.parse('pdf', str(original), parse) == {'text': 'feedback'}
+    os.utime(original, (1, 1))
+    assert cache.parse('pdf', str(original), parse) == {'text': 'feedback'}
+    assert cache.parse('pdf', str(copy), parse) == {'text': 'feedback'}
+    assert calls == [str(original)]
+
+    original.write_text('regraded')
+    assert cache.parse('pdf', str(original), parse) == {'text': 'regraded'}
+    monkeypatch.setattr(essay_processor, 'PARSER_VERSION', essay_processor.PARSER_VERSION + 1)
+    assert cache.parse('pdf', str(copy), parse) == {'text': 'feedback'}
+    assert calls == [str(original), str(original), str(copy)]
+
+
+def test_prune_evicts_least_recently_used_entries(tmp_path):
+    cache = ParseCache(tmp_path / 'cache')
+    for i, name in enumerate(('old', 'read', 'new')):
+        cache.put('pdf', name, {'text': 'x' * 100})
+        os.utime(cache._entry('pdf', name), (i, i))
+    assert cache.get('pdf', 'read') is not None
+    entry_size = cache._entry('pdf', 'old').stat().st_size
+
+    cache.max_bytes = entry_size * 2
+    cache.prune()
+
+    assert [cache.get('pdf', name) is not None for name in ('old', 'read', 'new')] == [False, True, True]
+
+
+def test_clear_cache_command_empties_the_cache(tmp_path, capsys):
+    cache = ParseCache(tmp_path / 'cache')
+    for name in ('a', 'b'):
+        cache.put('docx', name, {'essay': []})
+
+    assert main(['clear-cache', '--cache-dir', str(cache.folder)]) == 0
+
+    assert 'Removed 2 cached parse result(s)' in capsys.readouterr().out
+    assert list(cache.folder.iterdir()) == []
@@ -0,0 +1,79 @@
+import copy
+
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.oxml import OxmlElement
+
+from essay_processor import EssayProcessor, RubricRow
+
+
+def _reference_parse(path):
+    """The python-docx based parser the streaming one replaced."""
+    doc = Document(path)
+    table_data = [[cell.text.strip() for cell in row.cells] for row in doc.tables[0].rows[1:]]
+    essay, in_content_review = [], False
+    for para in doc.paragraphs:
+        text = para.text.strip()
+        if any(marker.lower() in text.lower()
+               for marker in ['Grammar and Spelling Review', 'Scan Results', 'AI Detection']):
+            break
+        if 'content review' in text.lower():
+            in_content_review = True
+            continue
+        if in_content_review and text:
+            essay.append(para.text)
+    return {'table_data': table_data, 'essay': essay}
+
+
+def _write_review_docx(path):
+    doc = Document()
+    doc.add_paragraph('Taylor_ Light pollution_review')
+    table = doc.add_table(rows=4, cols=3)
+    for r, row in enumerate([['Category', 'Score', 'Comment'], ['Thesis', '1', ' Defensible '],
+                             ['Overall', '4', 'Line one'], ['Sophistication', '0', '']]):
+        for c, text in enumerate(row):
+            table.cell(r, c).text = text
+    table.cell(2, 2).add_paragraph('line two')
+    table.cell(3, 1).merge(table.cell(3, 2))
+    table.cell(1, 0).merge(table.cell(2, 0))
+
+    doc.add_paragraph('Content Review')
+    doc.add_paragraph('  First paragraph\twith a tab. ')
+    doc.add_paragraph('')
+    para = doc.add_paragraph('Second ')
+    para.add_run('line').add_break()
+    para.add_run('break').add_break(WD_BREAK.PAGE)
+    hyperlink = OxmlElement('w:hyperlink')
+    hyperlink.append(copy.deepcopy(para.runs[0]._r))
+    para._p.append(hyperlink)
+    doc.add_paragraph('Scan Results')
+    doc.add_paragraph('Not part of the essay.')
+    doc.add_table(rows=1, cols=1).cell(0, 0).text = 'Later table'
+    doc.save(path)
+
+
+def test_streaming_parser_matches_python_docx(tmp_path):
+    path = tmp_path / 'review.docx'
+    _write_review_docx(path)
+
+    data = EssayProcessor().parse_docx_content(str(path))
+
+    assert data.to_dict() == _reference_parse(path)
+    assert data.rubric[1] == RubricRow('Thesis\nOverall', '4', 'Line one\nline two')
+    assert data.essay[-1] == 'Second line\nbreakSecond '
+
+
+def test_table_after_stop_marker_is_still_found(tmp_path):
+    path = tmp_path / 'review.docx'
+    doc = Document()
+    doc.add_paragraph('Content Review')
+    doc.add_paragraph('Essay text.')
+    doc.add_paragraph('AI Detection')
+    table = doc.add_table(rows=2, cols=3)
+    table.cell(1, 0).text = 'Thesis'
+    doc.save(path)
+
+    data = EssayProcessor().parse_docx_content(str(path))
+
+    assert data.to_dict() == _reference_parse(path)
+    assert data.essay == ('Essay text.',) and data.rubric == (RubricRow('Thesis'),)
@@ -0,0 +1,140 @@
+from essay_processor import (EssayProcessor, FeedbackParser, QuoteFeedback, Section, join_lines,
+                             parse_feedback_lines)
+
+SAMPLE = '''Taylor_  Light pollution_review
+Page 1 of 3
+Grading
+4/6
+The essay makes a clear argu-
+ment about light pollution.
+Thesis
+1/1
+The thesis is defensible.
+"Light pollution harms
+ecosystems."
+A clear, arguable claim.
+Evidence and Commentary
+3/4
+Evidence is relevant.
+"Birds lose their way."
+Explain how this supports
+the thesis.
+"Stars vanish."
+Page 2 of 3
+Good detail.
+Sophistication
+0/1
+Not yet earned.
+Document Review
+"Ignored quote."
+'''
+
+
+def test_parses_overall_and_sections():
+    data = parse_feedback_lines(SAMPLE.split('Document Review')[0].splitlines())
+
+    assert data.overall_grade == '4/6'
+    assert data.overall_overview == 'The essay makes a clear argument about light pollution.'
+    assert [(s.name, s.grade) for s in data.sections] == [
+        ('Thesis', '1/1'), ('Evidence and Commentary', '3/4'), ('Sophistication', '0/1')]
+
+    evidence = data.sections[1]
+    assert evidence.overview == 'Evidence is relevant.'
+    assert evidence.quotes == (
+        QuoteFeedback('"Birds lose their way."', 'Explain how this supports the thesis.'),
+        QuoteFeedback('"Stars vanish."', 'Good detail.'),
+    )
+    assert data.sections[0].quotes == (
+        QuoteFeedback('"Light pollution harms ecosystems."', 'A clear, arguable claim.'),)
+    assert data.sections[2].quotes == ()
+
+
+def test_incremental_feed_matches_batch_parse():
+    lines = SAMPLE.split('Document Review')[0].splitlines()
+    parser = FeedbackParser()
+    for line in lines:
+        parser.feed(line)
+    assert parser.result() == parse_feedback_lines(lines)
+
+
+def test_missing_grading_and_empty_sections():
+    data = parse_feedback_lines(['Thesis', 'Sophistication', '1/1'])
+    assert data.overall_grade == ''
+    assert data.sections == (Section('Sophistication', '1/1', '', ()),)
+
+
+def test_join_lines_dehyphenates_lowercase_continuations():
+    assert join_lines(['well-', 'known']) == 'wellknown'
+    assert join_lines(['AP-', 'English']) == 'AP- English'
+    assert join_lines([]) == ''
+
+
+def _write_styled_pdf(path):
+    """Bold headings, italic quotes; the second quote breaks across pages."""
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    y = 60
+    for text, font, size in [
+            ("Grading", "hebo", 14), ("4/6", "helv", 11), ("Clear argument.", "helv", 11),
+            ("Thesis", "hebo", 14), ("1/1", "helv", 11), ("Defensible.", "helv", 11),
+            ('"The sign said "stop" and we', "heit", 11), ('did not."', "heit", 11),
+            ("Inner quotes are kept.", "helv", 11),
+            ('"A quote that starts on one page', "heit", 11), (None, None, None),
+            ('and ends on the next."', "heit", 11), ("Feedback after the break.", "helv", 11),
+            ("Document Review", "hebo", 14), ('"Ignored."', "heit", 11)]:
+        if text is None:
+            page = doc.new_page()
+            y = 60
+            continue
+        page.insert_text((72, y), text, fontname=font, fontsize=size)
+        y += 24
+    doc.save(path)
+
+
+def test_layout_parsing_uses_fonts_for_quotes(tmp_path):
+    path = tmp_path / "Taylor_ Light pollution_review.pdf"
+    _write_styled_pdf(path)
+
+    data = EssayProcessor().parse_pdf_feedback(str(path), layout=True)
+
+    assert data.overall_grade == '4/6'
+    assert data.overall_overview == 'Clear argument.'
+    assert len(data.sections) == 1
+    assert data.sections[0].quotes == (
+        QuoteFeedback('"The sign said "stop" and we did not."', 'Inner quotes are kept.'),
+        QuoteFeedback('"A quote that starts on one page and ends on the next."', 'Feedback after the break.'),
+    )
+
+
+def test_pdf_lines_stop_at_document_review_without_reading_later_pages(tmp_path, monkeypatch):
+    import fitz
+
+    from essay_processor import PDF_STOP_RE
+
+    path = tmp_path / 'Taylor_ Light pollution_review.pdf'
+    body, review = SAMPLE.split('Document Review')
+    first, second = body.split('Page 2 of 3')
+    pdf = fitz.open()
+    for text in (first, 'Page 2 of 3' + second + 'Document Review' + review, 'Appendix', 'More appendix'):
+        page = pdf.new_page()
+        for i, line in enumerate(text.strip('\n').split('\n')):
+            page.insert_text((72, 72 + 20 * i), line)
+    pdf.save(path)
+    ep = EssayProcessor()
+
+    text = ep.extract_pdf_text(str(path))
+    read = []
+    get_text = fitz.Page.get_text
+
+    def recording_get_text(page, *args, **kwargs):
+        read.append(page.number)
+        return get_text(page, *args, **kwargs)
+
+    monkeypatch.setattr(fitz.Page, 'get_text', recording_get_text)
+
+    lines = list(ep.iter_pdf_lines(str(path)))
+
+    assert read == [0, 1]
+    assert lines == text[:PDF_STOP_RE.search(text).start()].split('\n')
+    assert ep.parse_pdf_feedback(str(path)) == parse_feedback_lines(body.splitlines())
@@ -0,0 +1,42 @@
+import json
+import time
+
+from essay_processor import main, run_batch
+
+
+def test_hung_and_crashing_jobs_fail_alone(tmp_path, misbehaving_task):
+    names = ['ok1.pdf', 'hang.pdf', 'crash.pdf', 'raise.pdf', 'ok2.pdf']
+    jobs = [{'pdf_name': name, 'options': {'timeout': 1}} for name in names]
+
+    start = time.monotonic()
+    results = list(run_batch(jobs, workers=2, task=misbehaving_task, ordered=True))
+
+    assert time.monotonic() - start < 10
+    assert [job['pdf_name'] for job, _, _ in results] == names
+    errors = {job['pdf_name']: error for job, _, error in results if error}
+    assert sorted(errors) == ['crash.pdf', 'hang.pdf', 'raise.pdf']
+    assert (errors['hang.pdf'].kind, errors['crash.pdf'].kind, errors['raise.pdf'].kind) == \
+           ('timeout', 'crashed', 'error')
+    assert errors['hang.pdf'] == 'hang.pdf: timed out after 1 s during start' and errors['hang.pdf'].seconds >= 1
+    assert errors['raise.pdf'] == 'raise.pdf: bad xref' and 'ValueError' in errors['raise.pdf'].details
+
+
+def test_batch_logs_failures_and_retries_only_those(tmp_path, capsys, write_inputs):
+    inputs, out = tmp_path / 'inputs', tmp_path / 'out'
+    inputs.mkdir()
+    for student in ('Jones', 'Smith'):
+        write_inputs(inputs, student)
+    (inputs / 'Smith_ Essay_review.docx').write_bytes(b'not a docx')
+    args = ['batch', '--pdf-dir', str(inputs), '--out', str(out), '--no-cache', '--no-results']
+
+    assert main(args) == 1
+    log = json.loads((out / 'error_log.json').read_text())
+    assert [(f['pdf_name'], f['kind'], f['stage']) for f in log['failures']] == \
+           [('Smith_ Essay_review.pdf', 'error', 'parse_docx_content')]
+
+    write_inputs(inputs, 'Smith')
+    (out / 'Jones_report.docx').unlink()
+    assert main(args + ['--retry-failures']) == 0
+    assert 'Retrying 1 failed report(s)' in capsys.readouterr().out
+    assert sorted(path.name for path in out.glob('*.docx')) == ['Smith_report.docx']
+    assert not (out / 'error_log.json').exists()
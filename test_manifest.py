@@ -0,0 +1,46 @@
+from docx import Document
+
+import essay_processor
+from essay_processor import EssayProcessor, generate_reports
+
+
+def _update(inputs, out):
+    """Run an incremental update of out; returns {report name: status}."""
+    ep = EssayProcessor()
+    ep.load_folder(str(inputs))
+    jobs, _ = ep.build_jobs(out)
+    return {result['output_name']: result['status']
+            for _, result, _ in generate_reports(jobs, out, incremental=True, workers=1)}
+
+
+def test_incremental_update_rebuilds_only_changed_reports(tmp_path, monkeypatch, write_inputs):
+    import fitz
+
+    inputs, out = tmp_path / 'inputs', tmp_path / 'out'
+    inputs.mkdir()
+    out.mkdir()
+    for student in ('Jones', 'Smith', 'Young'):
+        write_inputs(inputs, student)
+
+    assert _update(inputs, out) == {'Jones_report.docx': 'written', 'Smith_report.docx': 'written',
+                                    'Young_report.docx': 'written'}
+    assert _update(inputs, out) == {'Jones_report.docx': 'unchanged', 'Smith_report.docx': 'unchanged',
+                                    'Young_report.docx': 'unchanged'}
+
+    pdf = fitz.open(inputs / 'Jones_ Essay_review.pdf')
+    pdf.set_metadata({'title': 'Regraded'})
+    pdf.save(inputs / 'Jones_ Essay_review.pdf', incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+    pdf.close()
+    doc = Document(inputs / 'Smith_ Essay_review.docx')
+    doc.add_paragraph('A revised ending.')
+    doc.save(inputs / 'Smith_ Essay_review.docx')
+    for path in inputs.glob('Young_*'):
+        path.unlink()
+
+    assert _update(inputs, out) == {'Jones_report.docx': 'written', 'Smith_report.docx': 'written',
+                                    'Young_report.docx': 'removed'}
+    assert sorted(path.name for path in out.glob('*.docx')) == ['Jones_report.docx', 'Smith_report.docx']
+    assert any('A revised ending.' in p.text for p in Document(out / 'Smith_report.docx').paragraphs)
+
+    monkeypatch.setattr(essay_processor, 'REPORT_FORMAT_VERSION', essay_processor.REPORT_FORMAT_VERSION + 1)
+    assert _update(inputs, out) == {'Jones_report.docx': 'written', 'Smith_report.docx': 'written'}
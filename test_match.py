@@ -0,0 +1,67 @@
+import random
+
+from essay_processor import EssayProcessor, MatchIndex
+
+
+def _index(pdfs, docx):
+    ep = EssayProcessor()
+    index = MatchIndex()
+    for name in pdfs:
+        index.add_pdf(name, name, *ep.parse_filename(name))
+    for name in docx:
+        index.add_docx(name, name, *ep.parse_filename(name))
+    return index
+
+
+def test_match_pairs_by_name_then_title_and_reports_the_rest():
+    index = _index(['Jones_ Essay_review.pdf', 'SMITH _ Essay_review.pdf', 'Lee_ Poetry_review.pdf',
+                    'Young_ Memoir_review.pdf', 'Brown_ Essay_review.pdf'],
+                   ['Jones_ Essay_review.docx', 'smith_ Essay_review.docx', 'Lee_ Essay_review.docx',
+                    'Lee_ poetry_review.docx', 'Young_ Essay_review.docx', 'Young_ Poetry_review.docx',
+                    'Green_ Essay_review.docx'])
+
+    match = index.match()
+
+    assert dict(match['pairs']) == {
+        'Jones_ Essay_review.pdf': 'Jones_ Essay_review.docx',
+        'SMITH _ Essay_review.pdf': 'smith_ Essay_review.docx',
+        'Lee_ Poetry_review.pdf': 'Lee_ poetry_review.docx',
+        'Young_ Memoir_review.pdf': None,
+        'Brown_ Essay_review.pdf': None,
+    }
+    assert match['ambiguous'] == {'Young_ Memoir_review.pdf': ['Young_ Essay_review.docx',
+                                                               'Young_ Poetry_review.docx']}
+    assert match['unmatched_pdfs'] == ['Brown_ Essay_review.pdf']
+    assert match['unmatched_docx'] == ['Green_ Essay_review.docx', 'Lee_ Essay_review.docx']
+    assert index.warnings(match) == [
+        'No matching DOCX for Brown',
+        'Several DOCX files for Young (Young_ Essay_review.docx, Young_ Poetry_review.docx); none used',
+        'No matching PDF for Green_ Essay_review.docx',
+        'No matching PDF for Lee_ Essay_review.docx',
+    ]
+
+
+def test_build_jobs_pairs_like_the_name_scan_it_replaced(tmp_path):
+    rng = random.Random(3)
+    students = [f"Student{i}" for i in range(300)]
+    for student in students:
+        (tmp_path / f"{student}_ Essay_review.pdf").touch()
+        if rng.random() < 0.9:
+            docx_student = student.upper() if rng.random() < 0.5 else student
+            (tmp_path / f"{docx_student}_ Essay_review.docx").touch()
+    ep = EssayProcessor()
+    ep.load_folder(str(tmp_path))
+
+    def scan(pdf_name):
+        """The original matcher: the first DOCX whose student name matches, ignoring case."""
+        student_name, _ = ep.parse_filename(pdf_name)
+        for docx_name, path in ep.docx_files.items():
+            if ep.parse_filename(docx_name)[0].lower() == student_name.lower():
+                return path
+        return None
+
+    jobs, _ = ep.build_jobs(tmp_path / 'out')
+
+    assert len(jobs) == len(students)
+    assert [job['docx_path'] for job in jobs] == [scan(job['pdf_name']) for job in jobs]
+    assert sum(job['docx_path'] is None for job in jobs) > 0
@@ -12,9 +12,9 @@ pdf_path = r'C:\Users\Kingry\Documents\Essay Processor\Taylor_  Light pollution_
 data = ep.parse_pdf_feedback(pdf_path)
 
 print('=== OVERALL GRADE ===')
-print(f'Grade: {data["overall_grade"]}')
-print(f'Overview: {data["overall_overview"][:200]}...')
+print(f'Grade: {data.overall_grade}')
+print(f'Overview: {data.overall_overview[:200]}...')
 
-print(f'\nNumber of sections: {len(data["sections"])}')
-for sec in data['sections']:
-    print(f'  - {sec["name"]}: {sec["grade"]} ({len(sec["quotes"])} quotes)')
+print(f'\nNumber of sections: {len(data.sections)}')
+for sec in data.sections:
+    print(f'  - {sec.name}: {sec.grade} ({len(sec.quotes)} quotes)')
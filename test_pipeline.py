@@ -0,0 +1,56 @@
+import time
+import zipfile
+
+import essay_processor
+from essay_processor import EssayProcessor, file_hash, run_batch, run_pipeline
+
+_parse_student = essay_processor.parse_student
+
+
+def _jobs(folder, output_folder):
+    ep = EssayProcessor()
+    ep.load_folder(folder)
+    return ep.build_jobs(output_folder)[0]
+
+
+def test_pipeline_writes_the_same_reports_as_run_batch(tmp_path, write_inputs):
+    for student in ('Jones', 'Smith', 'Taylor'):
+        write_inputs(tmp_path, student)
+    (tmp_path / 'batch').mkdir()
+    (tmp_path / 'pipeline').mkdir()
+    list(run_batch(_jobs(tmp_path, tmp_path / 'batch'), workers=1))
+
+    jobs = _jobs(tmp_path, tmp_path / 'pipeline')
+    jobs[0]['pdf_path'] = str(tmp_path / 'missing.pdf')
+    results = list(run_pipeline(jobs, workers=2, queue_size=1))
+
+    assert sorted(job['student_name'] for job, _, _ in results) == ['Jones', 'Smith', 'Taylor']
+    errors = [error for _, _, error in results if error]
+    assert len(errors) == 1 and 'missing.pdf' in errors[0]
+    for job in jobs[1:]:
+        assert job['pdf_hash'] == file_hash(job['pdf_path'])
+        with zipfile.ZipFile(job['output_path']) as new, \
+                zipfile.ZipFile(tmp_path / 'batch' / job['output_name']) as old:
+            assert new.read('word/document.xml') == old.read('word/document.xml')
+
+
+def _parse_or_hang(job, timer=None, pdf_bytes=None, docx_bytes=None):
+    if job['student_name'] == 'Smith':
+        time.sleep(60)
+    return _parse_student(job, timer, pdf_bytes, docx_bytes)
+
+
+def test_pipeline_holds_jobs_to_the_timeout(tmp_path, monkeypatch, write_inputs):
+    for student in ('Jones', 'Smith'):
+        write_inputs(tmp_path, student)
+    jobs = _jobs(tmp_path, tmp_path)
+    for job in jobs:
+        job['options'] = {'timeout': 1}
+    monkeypatch.setattr(essay_processor, 'parse_student', _parse_or_hang)
+
+    start = time.monotonic()
+    results = {job['student_name']: error for job, _, error in run_pipeline(jobs, workers=2)}
+
+    assert time.monotonic() - start < 10
+    assert results['Jones'] is None
+    assert results['Smith'].kind == 'timeout' and 'timed out after 1 s' in results['Smith']
@@ -0,0 +1,75 @@
+import zipfile
+
+from essay_processor import ArchiveMember, LRUCache, preview_key, render_preview
+
+
+def test_pdf_preview_is_first_page_image(tmp_path, write_inputs):
+    write_inputs(tmp_path, 'Taylor')
+
+    kind, png, caption = render_preview(tmp_path / 'Taylor_ Essay_review.pdf', width=200)
+
+    assert kind == 'image' and png.startswith(b'\x89PNG') and caption == 'Page 1 of 1'
+
+
+def test_docx_preview_reads_archive_members(tmp_path, write_inputs):
+    write_inputs(tmp_path, 'Taylor')
+    with zipfile.ZipFile(tmp_path / 'class.zip', 'w') as archive:
+        archive.write(tmp_path / 'Taylor_ Essay_review.docx', 'Taylor_ Essay_review.docx')
+    member = ArchiveMember(str(tmp_path / 'class.zip'), 'Taylor_ Essay_review.docx')
+
+    kind, text, caption = render_preview(member)
+
+    assert kind == 'text' and text.split('\n') == [' |  | ', 'Thesis |  | ', 'Content Review', 'Essay by Taylor.']
+    assert preview_key(member)[1] is not None
+
+
+def test_lru_cache_forgets_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+
+class FakeFrame:
+    """Stands in for the pane's Tk frame, holding the callbacks after() schedules."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+
+class FakeVar:
+    def set(self, value):
+        self.value = value
+
+
+def test_preview_keeps_a_single_poll_loop(tmp_path, write_inputs):
+    import queue
+    import time
+
+    from essay_processor import PreviewPane
+
+    for student in ('Jones', 'Smith', 'Young'):
+        write_inputs(tmp_path, student)
+    pane = PreviewPane.__new__(PreviewPane)
+    pane.frame, pane.caption_var = FakeFrame(), FakeVar()
+    pane.cache, pane.requests, pane.results = LRUCache(8), queue.Queue(), queue.Queue()
+    pane.current, pane.worker, pane.polling = None, None, False
+    shown = []
+    pane._display = shown.append
+
+    for student in ('Jones', 'Smith', 'Young'):
+        pane.show(tmp_path / f"{student}_ Essay_review.docx")
+    deadline = time.monotonic() + 10
+    while pane.frame.scheduled and time.monotonic() < deadline:
+        assert len(pane.frame.scheduled) == 1
+        pane.frame.scheduled.pop()()
+        time.sleep(0.01)
+
+    assert pane.frame.scheduled == [] and not pane.polling
+    assert shown[-1][1].endswith('Essay by Young.')
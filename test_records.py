@@ -0,0 +1,38 @@
+import json
+import pickle
+
+from essay_processor import EssayProcessor, EssayReview, ParseCache, RubricRow, StudentFeedback
+
+
+def test_records_round_trip_through_compact_json(pdf_data, docx_data):
+    pdf_json, docx_json = json.dumps(pdf_data), json.dumps(docx_data)
+
+    assert StudentFeedback.from_json(json.loads(pdf_json)) == pdf_data
+    assert EssayReview.from_json(json.loads(docx_json)) == docx_data
+    assert pickle.loads(pickle.dumps(pdf_data)) == pdf_data
+    assert len(pdf_json) < len(json.dumps(pdf_data.to_dict()))
+    assert pdf_data.to_dict()['sections'][1] == {
+        'name': 'Thesis', 'grade': '1/1', 'overview': 'Defensible.',
+        'quotes': [{'quote': '"Light pollution\tharms."', 'feedback': 'Good.'}]}
+
+
+def test_rubric_rows_always_have_three_cells():
+    assert RubricRow.from_cells(['Thesis']) == ('Thesis', '', '')
+    assert RubricRow.from_cells(['Thesis', '1', 'Good', 'extra']) == ('Thesis', '1', 'Good')
+
+
+def test_cache_returns_records(tmp_path, write_inputs):
+    write_inputs(tmp_path, 'Taylor')
+    path = str(tmp_path / 'Taylor_ Essay_review.docx')
+    cache = ParseCache(tmp_path / 'cache')
+    calls = []
+
+    def parse(source):
+        calls.append(source)
+        return EssayProcessor().parse_docx_content(source)
+
+    first = cache.parse('docx', path, parse, record=EssayReview)
+    second = cache.parse('docx', path, parse, record=EssayReview)
+
+    assert len(calls) == 1 and isinstance(second, EssayReview) and second == first
+    assert second.essay == ('Essay by Taylor.',)
@@ -0,0 +1,44 @@
+from docx import Document
+
+from essay_processor import EssayProcessor, write_report_xml
+
+
+def test_fast_writer_matches_python_docx_report(tmp_path, pdf_data, docx_data, describe_report):
+    EssayProcessor().create_report('Taylor', 'Light Pollution', pdf_data, docx_data, tmp_path / 'docx.docx')
+    write_report_xml('Taylor', 'Light Pollution', pdf_data, docx_data, tmp_path / 'xml.docx')
+
+    assert describe_report(tmp_path / 'xml.docx') == describe_report(tmp_path / 'docx.docx')
+
+
+def test_fast_writer_output_is_byte_stable(tmp_path, pdf_data, docx_data):
+    for name in ('a.docx', 'b.docx'):
+        write_report_xml('Taylor', 'Light Pollution', pdf_data, docx_data, tmp_path / name,
+                         date='17 February 2026')
+
+    assert (tmp_path / 'a.docx').read_bytes() == (tmp_path / 'b.docx').read_bytes()
+
+
+def test_class_report_has_every_student_on_new_pages(tmp_path, write_inputs):
+    import fitz
+    from essay_processor import write_class_report
+
+    for student in ('Jones', 'Smith'):
+        write_inputs(tmp_path, student)
+    ep = EssayProcessor()
+    ep.load_folder(tmp_path)
+    jobs, _ = ep.build_jobs(tmp_path)
+
+    added = []
+    written = write_class_report(jobs, tmp_path / 'class.docx', tmp_path / 'class.pdf', workers=1,
+                                 on_result=lambda job, error: added.append((job['student_name'], error)))
+
+    assert written == 2 and added == [('Jones', None), ('Smith', None)]
+    doc = Document(tmp_path / 'class.docx')
+    texts = [p.text for p in doc.paragraphs]
+    assert [t for t in texts if t.startswith('Name:')] == ['Name: Jones', 'Name: Smith']
+    assert 'Essay by Smith.\n' in texts and len(doc.tables) == 2
+    assert sum('w:type="page"' in p._p.xml for p in doc.paragraphs) == 1
+
+    pdf = fitz.open(tmp_path / 'class.pdf')
+    assert pdf.page_count == 2
+    assert 'Name: Jones' in pdf[0].get_text() and 'Name: Smith' in pdf[1].get_text()
@@ -0,0 +1,50 @@
+from essay_processor import EssayProcessor, ResultsStore, generate_reports
+
+
+def _grades(overall, thesis, quotes=1):
+    return {'overall_grade': overall, 'sections': [('Thesis', thesis, quotes)],
+            'rubric': [('Overall', overall.split('/')[0], 'Comment'), ('Thesis', thesis.split('/')[0], '')]}
+
+
+def _job(student, title='Light Pollution', class_name='Period 3'):
+    return {'student_name': student, 'essay_title': title, 'output_path': f'{student}.docx',
+            'options': {'class_name': class_name}}
+
+
+def test_distributions_are_grouped_by_class_and_assignment(tmp_path):
+    store = ResultsStore(tmp_path / 'results.sqlite3')
+    store.record(_job('Jones'), _grades('4/6', '1/1'))
+    store.record(_job('Smith'), _grades('2/6', '0/1'))
+    store.record(_job('Smith'), _grades('5/6', '1/1'))     # regraded: replaces the first row
+    store.record(_job('Lee', class_name='Period 5'), _grades('3/6', '0/1'))
+    store.close()
+
+    store = ResultsStore(tmp_path / 'results.sqlite3')
+    assert store.statistics(class_name='Period 3') == [
+        {'class_name': 'Period 3', 'assignment': 'Light Pollution', 'students': 2, 'mean': 4.5, 'min': 4.0,
+         'max': 5.0, 'out_of': 6.0}]
+    assert [(row['class_name'], row['grade'], row['students']) for row in store.distribution(section='Thesis')] == [
+        ('Period 3', '1/1', 2), ('Period 5', '0/1', 1)]
+    assert store.students(assignment='Light Pollution')[1] == {
+        'class_name': 'Period 3', 'assignment': 'Light Pollution', 'student': 'Smith', 'grade': '5/6',
+        'Evidence and Commentary': None, 'Sophistication': None, 'Thesis': '1/1'}
+    assert store.db.execute('SELECT COUNT(*) FROM rubric_rows').fetchone()[0] == 6
+    store.close()
+
+
+def test_batches_save_grades_under_the_pdf_folder_name(tmp_path, write_inputs):
+    folder = tmp_path / 'Period 2'
+    folder.mkdir()
+    for student in ('Jones', 'Smith'):
+        write_inputs(folder, student)
+    ep = EssayProcessor()
+    ep.load_folder(folder)
+    jobs, _ = ep.build_jobs(tmp_path, {'results_db': str(tmp_path / 'results.sqlite3')})
+
+    results = [result for _, result, error in generate_reports(jobs, tmp_path, workers=1) if not error]
+
+    assert len(results) == 2 and not any('grades' in result for result in results)
+    store = ResultsStore(tmp_path / 'results.sqlite3')
+    assert store.distribution() == [
+        {'class_name': 'Period 2', 'assignment': 'Essay', 'points': 4.0, 'grade': '4/6', 'students': 2}]
+    store.close()
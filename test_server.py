@@ -0,0 +1,120 @@
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+
+from docx import Document
+
+from essay_processor import IsolatedPool, ReportService, ResultsStore, make_report_server
+
+
+def _multipart(files):
+    boundary = 'essayboundary'
+    body = b''.join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n\r\n'.encode()
+        + content + b'\r\n' for name, content in files)
+    return body + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+def _post(url, body, content_type):
+    request = urllib.request.Request(url, body, {'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_server_returns_a_report_or_a_zip_and_limits_concurrency(tmp_path, write_inputs):
+    for student in ('Jones', 'Smith'):
+        write_inputs(tmp_path, student)
+    service = ReportService(workers=1, max_requests=1)
+    service.start()
+    server = make_report_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}'
+    try:
+        jones = [(path.name, path.read_bytes()) for path in sorted(tmp_path.glob('Jones_*'))]
+        status, headers, body = _post(f'{url}/report', *_multipart(jones))
+        assert status == 200 and 'Jones_report.docx' in headers['Content-Disposition']
+        assert 'Name: Jones' in [p.text for p in Document(io.BytesIO(body)).paragraphs]
+
+        inputs = io.BytesIO()
+        with zipfile.ZipFile(inputs, 'w') as archive:
+            for path in sorted(tmp_path.glob('*_review.*')):
+                archive.write(path, path.name)
+        status, _, body = _post(f'{url}/report?name=class.zip', inputs.getvalue(), 'application/zip')
+        assert status == 200
+        assert zipfile.ZipFile(io.BytesIO(body)).namelist() == ['Jones_report.docx', 'Smith_report.docx']
+
+        service.slots.acquire()     # as if another upload were being handled
+        status, headers, _ = _post(f'{url}/report', *_multipart(jones))
+        service.slots.release()
+        assert status == 503 and headers['Retry-After']
+
+        # Requests are counted once their response is sent, just after the client has it
+        for _ in range(50):
+            with urllib.request.urlopen(f'{url}/metrics') as response:
+                metrics = json.load(response)
+            if metrics['rejected']:
+                break
+            time.sleep(0.02)
+        assert (metrics['rejected'], metrics['reports']) == (1, 3)
+        assert metrics['report_seconds']['count'] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+def test_pool_replaces_killed_and_hung_workers(misbehaving_task):
+    pool = IsolatedPool(1, misbehaving_task, timeout=0.5)
+    try:
+        dead = pool.idle.queue[0].process
+        dead.kill()
+        dead.join()
+        assert pool.run({'pdf_name': 'a.pdf'}) == ({'status': 'written', 'output_name': 'a.pdf'}, None)
+
+        result, error = pool.run({'pdf_name': 'hang.pdf'})
+        assert result is None and error.kind == 'timeout'
+        assert pool.run({'pdf_name': 'b.pdf'}) == ({'status': 'written', 'output_name': 'b.pdf'}, None)
+    finally:
+        pool.close()
+
+
+def test_concurrent_uploads_share_the_results_database(tmp_path, write_inputs):
+    for student in ('Jones', 'Smith'):
+        write_inputs(tmp_path, student)
+    inputs = io.BytesIO()
+    with zipfile.ZipFile(inputs, 'w') as archive:
+        for path in sorted(tmp_path.glob('*_review.*')):
+            archive.write(path, path.name)
+    service = ReportService({'results_db': str(tmp_path / 'results.sqlite3')}, workers=2, max_requests=2)
+    service.start()
+    server = make_report_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/report'
+    try:
+        responses = []
+        uploads = [threading.Thread(target=lambda name=name: responses.append(
+            _post(f'{url}?name=class.zip&class={name}', inputs.getvalue(), 'application/zip')))
+                   for name in ('A', 'B')]
+        for upload in uploads:
+            upload.start()
+        for upload in uploads:
+            upload.join()
+
+        assert [status for status, _, _ in responses] == [200, 200]
+        assert all(len(zipfile.ZipFile(io.BytesIO(body)).namelist()) == 2 for _, _, body in responses)
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+    store = ResultsStore(tmp_path / 'results.sqlite3')
+    assert [(row['class_name'], row['student']) for row in store.students()] == \
+           [('A', 'Jones'), ('A', 'Smith'), ('B', 'Jones'), ('B', 'Smith')]
+    store.close()
@@ -0,0 +1,60 @@
+import csv
+import random
+
+import pytest
+from docx import Document
+
+from essay_processor import essay_shingles, essay_signature, find_similar_essays, main
+
+WORDS = ('light pollution birds stars night sky cities energy migration darkness health sleep lamps '
+         'astronomers streets policy wildlife glare insects ocean turtles hatchlings').split()
+
+
+def _essay(seed, paragraphs=4, words=80):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(words)) for _ in range(paragraphs)]
+
+
+def test_signatures_estimate_similarity_and_only_close_pairs_are_flagged():
+    original = _essay(1)
+    edited = [original[0].upper() + '!', original[1], original[2], _essay(2)[3]]
+    essays = [({'output_name': f'{seed}.docx'}, essay_signature(_essay(seed))) for seed in range(3, 40)]
+    essays += [({'output_name': 'original.docx'}, essay_signature(original)),
+               ({'output_name': 'edited.docx'}, essay_signature(edited)),
+               ({'output_name': 'empty.docx'}, essay_signature([]))]
+
+    pairs = find_similar_essays(essays, 0.5)
+
+    a, b = essay_shingles(original), essay_shingles(edited)
+    assert [(pair[1]['output_name'], pair[2]['output_name']) for pair in pairs] == [('edited.docx', 'original.docx')]
+    assert abs(pairs[0][0] - len(a & b) / len(a | b)) < 0.1
+    assert essay_signature([]) == b''
+
+
+def test_batch_writes_similarity_report_including_kept_reports(tmp_path, write_inputs):
+    inputs, out = tmp_path / 'inputs', tmp_path / 'out'
+    inputs.mkdir()
+    for student, seed in (('Jones', 1), ('Smith', 2), ('Young', 1)):
+        write_inputs(inputs, student)
+        doc = Document()
+        doc.add_paragraph('Content Review')
+        for paragraph in _essay(seed):
+            doc.add_paragraph(paragraph)
+        doc.save(inputs / f"{student}_ Essay_review.docx")
+    args = ['batch', '--pdf-dir', str(inputs), '--out', str(out), '--no-cache', '--no-results', '--similarity']
+
+    assert main(args) == 0
+    assert main(args + ['--incremental']) == 0
+
+    with open(out / 'similar_essays.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['student_a'], row['student_b'], row['similarity']) for row in rows] == [('Jones', 'Young', '1.0')]
+
+
+def test_similarity_threshold_must_be_a_fraction(tmp_path, capsys):
+    assert main(['batch', '--pdf-dir', str(tmp_path), '--similarity', '1']) == 1
+    for threshold in ('0', '-0.2', '1.5', 'half'):
+        with pytest.raises(SystemExit) as exit_info:
+            main(['batch', '--pdf-dir', str(tmp_path), '--similarity', threshold])
+        assert exit_info.value.code == 2
+        assert 'argument --similarity' in capsys.readouterr().err
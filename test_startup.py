@@ -0,0 +1,42 @@
+import json
+import subprocess
+import sys
+
+# Cold `import essay_processor`, best of three runs. Loading PyMuPDF alone
+# takes well over this, so a heavy import creeping back to the top fails it.
+IMPORT_BUDGET_MS = 200
+HEAVY = ['tkinter', 'fitz', 'docx', 'lxml', 'asyncio']
+
+
+def _run(code):
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, check=True)
+
+
+def _loaded(code):
+    """Heavy modules in sys.modules after running code in a fresh interpreter."""
+    result = _run(code + f"\nimport json, sys; print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_is_fast_and_loads_no_heavy_dependencies():
+    timings = []
+    for _ in range(3):
+        lines = _run('import essay_processor').stderr.splitlines()
+        modules = {line.split('|')[-1].strip() for line in lines[1:]}
+        assert not modules & set(HEAVY)
+        timings.append(int(lines[-1].split('|')[1]) / 1000)
+
+    assert min(timings) < IMPORT_BUDGET_MS
+
+
+def test_entry_points_load_only_what_they_use(tmp_path, write_inputs):
+    write_inputs(tmp_path, 'Taylor')
+    pdf, docx = (str(tmp_path / f'Taylor_ Essay_review.{ext}') for ext in ('pdf', 'docx'))
+    parse = (f"from essay_processor import EssayProcessor\nep = EssayProcessor()\n"
+             f"pdf_data = ep.parse_pdf_feedback({pdf!r})\ndocx_data = ep.parse_docx_content({docx!r})")
+
+    report = f"\nep.create_report('Taylor', 'Essay', pdf_data, docx_data, {str(tmp_path / 'r.docx')!r})"
+
+    assert _loaded(parse) == ['fitz', 'lxml']
+    assert _loaded(parse + report) == ['fitz', 'docx', 'lxml']
@@ -0,0 +1,64 @@
+import pytest
+from docx import Document
+from docx.shared import Pt
+
+from essay_processor import STYLE_FEEDBACK, STYLE_QUOTE, EssayProcessor, load_report_template, main, write_report_xml
+
+
+def _edit_template(path, **sizes):
+    """Save the built-in template to path with the given style sizes in points."""
+    assert main(['write-template', str(path)]) == 0
+    doc = Document(path)
+    for style, size in sizes.items():
+        doc.styles[style].font.size = Pt(size)
+    doc.save(path)
+
+
+def test_reports_take_their_styles_from_a_custom_template(tmp_path, pdf_data, docx_data, describe_report):
+    template = tmp_path / 'template.docx'
+    _edit_template(template, **{STYLE_QUOTE: 15})
+
+    EssayProcessor().create_report('Taylor', 'Light Pollution', pdf_data, docx_data, tmp_path / 'docx.docx',
+                                   template=str(template))
+    write_report_xml('Taylor', 'Light Pollution', pdf_data, docx_data, tmp_path / 'xml.docx',
+                     template=str(template))
+
+    assert describe_report(tmp_path / 'xml.docx') == describe_report(tmp_path / 'docx.docx')
+    for name in ('docx.docx', 'xml.docx'):
+        doc = Document(tmp_path / name)
+        assert doc.styles[STYLE_QUOTE].font.size == Pt(15)
+        assert any(p.style.name == STYLE_QUOTE for p in doc.paragraphs)
+
+
+def test_template_missing_a_report_style_is_rejected(tmp_path):
+    template = tmp_path / 'template.docx'
+    _edit_template(template)
+    doc = Document(template)
+    doc.styles[STYLE_FEEDBACK].delete()
+    doc.save(template)
+
+    with pytest.raises(ValueError, match=f'missing styles: {STYLE_FEEDBACK}'):
+        load_report_template(str(template))
+
+
+def test_changing_the_template_rebuilds_incremental_reports(tmp_path, capsys, write_inputs):
+    inputs, out, template = tmp_path / 'inputs', tmp_path / 'out', tmp_path / 'template.docx'
+    inputs.mkdir()
+    write_inputs(inputs, 'Jones')
+    _edit_template(template)
+    args = ['batch', '--pdf-dir', str(inputs), '--out', str(out), '--no-cache', '--no-results',
+            '--template', str(template), '--incremental']
+
+    out.mkdir()
+    assert main(args) == 0
+    assert main(args) == 0
+    _edit_template(template, **{STYLE_QUOTE: 15})
+    assert main(args) == 0
+
+    summaries = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Generated')]
+    assert [line.split('.')[0] for line in summaries] == [
+        'Generated 1 report(s), 0 unchanged, 0 removed',
+        'Generated 0 report(s), 1 unchanged, 0 removed',
+        'Generated 1 report(s), 0 unchanged, 0 removed',
+    ]
+    assert Document(out / 'Jones_report.docx').styles[STYLE_QUOTE].font.size == Pt(15)
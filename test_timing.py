@@ -0,0 +1,69 @@
+import csv
+import json
+import tracemalloc
+
+from essay_processor import StageTimer, write_timing_report
+
+
+def test_stage_timer_nests_and_adds_up_repeats():
+    timer = StageTimer()
+    tracemalloc.start()
+    try:
+        with timer.stage('parse_pdf_feedback'):
+            lines = list(timer.iterate('extract_pdf_text', ['a', 'b', 'c']))
+            with timer.stage('parse_pdf_feedback_inner'):
+                blob = bytearray(512 * 1024)
+            del blob
+    finally:
+        tracemalloc.stop()
+
+    summary = timer.summary()
+    assert lines == ['a', 'b', 'c']
+    assert summary['parse_pdf_feedback']['seconds'] >= summary['extract_pdf_text']['seconds'] > 0
+    assert summary['parse_pdf_feedback']['peak_kb'] >= summary['parse_pdf_feedback_inner']['peak_kb'] >= 512
+
+
+def test_timing_report_lists_slowest_files_first(tmp_path):
+    records = [
+        {'pdf_name': 'fast.pdf', 'status': 'written', 'error': None, 'seconds': 0.1,
+         'stages': {'parse_pdf_feedback': {'seconds': 0.05, 'peak_kb': 10}}},
+        {'pdf_name': 'slow.pdf', 'status': 'written', 'error': None, 'seconds': 4.0,
+         'stages': {'parse_pdf_feedback': {'seconds': 3.9, 'peak_kb': 900}}},
+        {'pdf_name': 'broken.pdf', 'status': 'error', 'error': 'broken.pdf: bad xref', 'seconds': 0.0, 'stages': {}},
+    ]
+
+    report = json.loads(write_timing_report(records, tmp_path).read_text())
+
+    assert [item['pdf_name'] for item in report['slowest']] == ['slow.pdf', 'fast.pdf', 'broken.pdf']
+    assert report['errors'] == 1
+    assert report['stages']['parse_pdf_feedback'] == {'files': 2, 'seconds': 3.95, 'max_peak_kb': 900}
+    with open(tmp_path / 'timing_report.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]['pdf_name'] == 'slow.pdf' and rows[0]['parse_pdf_feedback_peak_kb'] == '900'
+
+
+def test_batch_rejects_timing_a_pipeline(tmp_path, capsys):
+    from essay_processor import main
+
+    assert main(['batch', '--pdf-dir', str(tmp_path), '--pipeline', '--timing']) == 2
+    assert "--timing can't be used with --pipeline" in capsys.readouterr().err
+
+
+def test_timed_jobs_stop_the_tracing_they_started(tmp_path, write_inputs):
+    from essay_processor import EssayProcessor, process_student
+
+    write_inputs(tmp_path, 'Jones')
+    ep = EssayProcessor()
+    ep.load_folder(tmp_path)
+    jobs, _ = ep.build_jobs(tmp_path, {'timing': True})
+
+    result = process_student(jobs[0])
+    assert not tracemalloc.is_tracing()
+    assert result['stages']['parse_pdf_feedback']['seconds'] > 0
+
+    tracemalloc.start()
+    try:
+        process_student(jobs[0])
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,76 @@
+import shutil
+
+from essay_processor import FolderWatcher
+
+
+def test_pairs_are_ready_once_both_files_have_settled(tmp_path, write_inputs):
+    inputs, watched = tmp_path / 'inputs', tmp_path / 'watched'
+    inputs.mkdir()
+    watched.mkdir()
+    write_inputs(inputs, 'Jones')
+    watcher = FolderWatcher(watched, settle=5)
+
+    shutil.copy(inputs / 'Jones_ Essay_review.pdf', watched)
+    assert watcher.ready_jobs(tmp_path, now=0) == ([], [], [])
+    assert watcher.ready_jobs(tmp_path, now=6) == ([], ['Jones_ Essay_review.pdf'], [])
+
+    # A DOCX still being written is left alone until it stops changing
+    (watched / 'Jones_ Essay_review.docx').write_bytes(b'PK partial')
+    watcher.ready_jobs(tmp_path, now=7)
+    shutil.copy(inputs / 'Jones_ Essay_review.docx', watched)
+    assert watcher.ready_jobs(tmp_path, now=11)[0] == []
+
+    assert watcher.ready_jobs(tmp_path, now=13)[0] == []
+    jobs, waiting, _ = watcher.ready_jobs(tmp_path, now=16)
+    assert [job['output_name'] for job in jobs] == ['Jones_report.docx'] and waiting == []
+    assert jobs[0]['docx_path'].endswith('Jones_ Essay_review.docx')
+
+    # Handed out once; again only after one of its files changes
+    assert watcher.ready_jobs(tmp_path, now=20)[0] == []
+    (watched / 'Jones_ Essay_review.docx').write_bytes((inputs / 'Jones_ Essay_review.docx').read_bytes() + b'\0')
+    watcher.ready_jobs(tmp_path, now=21)
+    assert len(watcher.ready_jobs(tmp_path, now=27)[0]) == 1
+
+
+class OneScan:
+    """A stop event for watch_folders that ends the watch after one scan."""
+
+    def is_set(self):
+        return False
+
+    def wait(self, timeout):
+        return True
+
+
+def test_reports_named_by_files_that_are_gone_are_removed(tmp_path, write_inputs):
+    from essay_processor import watch_folders
+
+    watched, out = tmp_path / 'watched', tmp_path / 'out'
+    watched.mkdir()
+    out.mkdir()
+    write_inputs(watched, 'Jones')
+    watcher = FolderWatcher(watched, settle=0)
+
+    def scan():
+        return sorted((result['status'], result['output_name'])
+                      for _, result, _ in watch_folders(watcher, out, workers=1, stop=OneScan()))
+
+    watcher.scan()
+    assert scan() == [('written', 'Jones_report.docx')]
+
+    # A second assignment for the same student: both reports are named by title
+    write_inputs(watched, 'Jones')
+    for path in watched.glob('Jones_ Essay_review.*'):
+        path.rename(watched / path.name.replace('Essay', 'Memoir'))
+    write_inputs(watched, 'Jones')
+    watcher.scan()
+    assert scan() == [('removed', 'Jones_report.docx'), ('written', 'Jones_Essay_report.docx'),
+                      ('written', 'Jones_Memoir_report.docx')]
+
+    # A misnamed student's files are corrected
+    for path in watched.glob('Jones_ Memoir_review.*'):
+        path.rename(watched / path.name.replace('Jones', 'Jonas'))
+    watcher.scan()
+    assert scan() == [('removed', 'Jones_Essay_report.docx'), ('removed', 'Jones_Memoir_report.docx'),
+                      ('written', 'Jonas_report.docx'), ('written', 'Jones_report.docx')]
+    assert sorted(path.name for path in out.glob('*.docx')) == ['Jonas_report.docx', 'Jones_report.docx']